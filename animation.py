@@ -0,0 +1,134 @@
+import hashlib
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+from PIL import Image
+
+from atomic import write_atomic
+from instrumentation import span
+
+# Encoded GIF/WebP exports, keyed by frame content + settings
+ANIMATION_CACHE_DIR = os.path.join("cache", "animations")
+
+DELIVERY_WIDTH = 720   # frames are resized to this width before encoding
+# The WebP stays lossless; for lossless, method 6 is barely smaller and ~10x slower than 4
+WEBP_METHOD = 4
+
+
+def _prepare_frames(images: List[Image.Image], width: int) -> List[Image.Image]:
+    # All frames share the first frame's delivery size
+    first = images[0]
+    if first.width > width:
+        size = (width, max(1, round(first.height * width / first.width)))
+    else:
+        size = first.size
+
+    frames = []
+    for img in images:
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        if img.size != size:
+            img = img.resize(size, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        frames.append(img)
+    return frames
+
+
+def _cache_key(images: List[Image.Image], duration: int, width: int) -> str:
+    # Keyed on the source frames, so a cache hit skips the resize
+    digest = hashlib.sha1(f"{duration}:{width}:lossless:{WEBP_METHOD}".encode())
+    for img in images:
+        digest.update(f"{img.mode}:{img.size}".encode())
+        digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def _shared_palette(frames: List[Image.Image]) -> Image.Image:
+    """One adaptive 256-colour palette built from a downsampled strip of all frames."""
+    samples = [f.reduce(4) if min(f.size) >= 64 else f for f in frames]
+    strip = Image.new('RGB', (sum(s.width for s in samples), max(s.height for s in samples)))
+    x = 0
+    for s in samples:
+        strip.paste(s, (x, 0))
+        x += s.width
+    return strip.quantize(colors=256, method=Image.Quantize.MEDIANCUT)
+
+
+def _encode_gif(frames: List[Image.Image], duration: int) -> bytes:
+    palette = _shared_palette(frames)
+    paletted = [f.quantize(palette=palette, dither=Image.Dither.FLOYDSTEINBERG) for f in frames]
+    return _to_bytes(
+        paletted,
+        format='GIF',
+        duration=duration,
+        loop=0,
+        optimize=False,
+        disposal=2
+    )
+
+
+def _encode_webp(frames: List[Image.Image], duration: int) -> bytes:
+    return _to_bytes(
+        frames,
+        format='WebP',
+        duration=duration,
+        loop=0,
+        lossless=True,
+        quality=100,
+        method=WEBP_METHOD
+    )
+
+
+def _to_bytes(frames: List[Image.Image], **save_kwargs) -> bytes:
+    buffer = io.BytesIO()
+    frames[0].save(buffer, append_images=frames[1:], save_all=True, **save_kwargs)
+    return buffer.getvalue()
+
+
+def export_animations(
+    images: List[Image.Image],
+    duration: int = 1000,
+    width: int = DELIVERY_WIDTH,
+) -> Dict[str, str]:
+    """
+    Export frames as an animated GIF and WebP at delivery size.
+
+    Args:
+        images: List of PIL Image objects
+        duration: Duration of each frame in milliseconds
+        width: Target frame width in pixels (frames are never upscaled)
+
+    Returns:
+        dict: {"gif": path, "webp": path} of the cached files, or {} without frames
+    """
+    if not images:
+        return {}
+
+    key = _cache_key(images, duration, width)
+    paths = {
+        "gif": os.path.join(ANIMATION_CACHE_DIR, f"{key}.gif"),
+        "webp": os.path.join(ANIMATION_CACHE_DIR, f"{key}.webp"),
+    }
+    if all(os.path.exists(p) for p in paths.values()):
+        return paths
+
+    with span("animation: prepare frames", frames=len(images)):
+        frames = _prepare_frames(images, width)
+    os.makedirs(ANIMATION_CACHE_DIR, exist_ok=True)
+    # Both encoders release the GIL, so GIF and WebP are built side by side
+    with span("animation: encode gif+webp", frames=len(frames)), ThreadPoolExecutor(max_workers=2) as pool:
+        gif_future = pool.submit(_encode_gif, frames, duration)
+        webp_future = pool.submit(_encode_webp, frames, duration)
+        write_atomic(paths["gif"], gif_future.result())
+        write_atomic(paths["webp"], webp_future.result())
+    return paths
+
+
+def read_animation(images: List[Image.Image], kind: str, duration: int = 1000) -> Optional[bytes]:
+    """Bytes of the cached "gif" or "webp" export for these frames, or None."""
+    paths = export_animations(images, duration=duration)
+    if not paths:
+        return None
+    with open(paths[kind], 'rb') as f:
+        return f.read()
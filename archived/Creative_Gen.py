@@ -1,66 +1,29 @@
 # main.py
 
-import io
 from typing import List, Optional
 
 import streamlit as st
 from PIL import Image
 
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 load_dotenv()
-import zipfile
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import animation
+import bundle
+from generation import describe_inspiration_image, generate_image_with_inputs, get_gemini_client
 
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
 
-@st.cache_resource
-def get_gemini_client():
-    """
-    Create a single Gemini client for the app.
-    Uses GEMINI_API_KEY from environment by default.
-    """
-    return genai.Client()
-
-def describe_inspiration_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> str:
-    """
-    Use Gemini text model to describe the inspiration image.
-    Focus on background, lighting, and atmosphere ONLY - NOT clothing or model.
-    """
-    client = get_gemini_client()
-
-    img_part = types.Part.from_bytes(
-        data=image_bytes,
-        mime_type=mime_type,
-    )
-
-    stylist_prompt = (
-        "You are a fashion photography director analyzing the environment and mood of this image. "
-        "Describe ONLY the following elements:\n\n"
-        "1. BACKGROUND & SETTING: The physical environment, location, textures (e.g., concrete wall, studio, outdoor park, urban street)\n"
-        "2. LIGHTING: The type and quality of light (e.g., soft natural daylight, dramatic side lighting, golden hour, studio lighting)\n"
-        "3. MOOD & ATMOSPHERE: The overall feeling and vibe (e.g., minimalist, moody, elegant, energetic, serene)\n"
-        "4. COLOR PALETTE: Background colors and tones (e.g., cool grays, warm earth tones, vibrant neon)\n"
-        "5. COMPOSITION: Camera angle, framing, depth of field if relevant to the environment\n\n"
-        "CRITICAL: Do NOT describe the person, their clothing, outfit details, accessories, or what they're wearing. "
-        "Completely ignore all garments and fashion items. Focus ONLY on the photographic environment, "
-        "setting, lighting conditions, and aesthetic atmosphere.\n\n"
-        "Keep your description to 3-4 concise sentences suitable for an AI image generator."
-    )
-
-    resp = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[stylist_prompt, img_part],
-    )
-
-    return (resp.text or "").strip()
-
-
 def create_animated_gif(images: List[Image.Image], duration: int = 1000) -> bytes:
     """
-    Create a high-quality animated GIF from a list of PIL Images.
+    Create an animated GIF from a list of PIL Images.
+    Frames are resized to delivery size and share one adaptive palette;
+    the GIF and WebP are encoded together and cached (see animation.py).
     
     Args:
         images: List of PIL Image objects
@@ -72,104 +35,45 @@ def create_animated_gif(images: List[Image.Image], duration: int = 1000) -> byte
     if not images or len(images) == 0:
         return None
     
-    # Convert all images to RGB mode to prevent color quantization issues
-    # This significantly improves quality by avoiding palette limitations
-    rgb_images = []
-    for img in images:
-        # Convert to RGB if not already
-        if img.mode != 'RGB':
-            rgb_images.append(img.convert('RGB'))
-        else:
-            rgb_images.append(img)
-    
-    # Create a BytesIO object to store the GIF
-    gif_bytes = io.BytesIO()
-    
-    # Save with optimal quality settings
-    rgb_images[0].save(
-        gif_bytes,
-        format='GIF',
-        append_images=rgb_images[1:],
-        save_all=True,
-        duration=duration,
-        loop=0,  # Loop forever
-        optimize=False,  # Don't optimize - better quality
-        disposal=2  # Clear frame before rendering next (smoother transitions)
-    )
-    
-    gif_bytes.seek(0)
-    return gif_bytes.getvalue()
+    return animation.read_animation(images, "gif", duration=duration)
 
 
 def create_animated_webp(images: List[Image.Image], duration: int = 1000) -> bytes:
     """
-    Create a high-quality animated WebP (much better than GIF).
-    WebP has no color limitations and supports lossless compression.
+    Create an animated WebP (much better than GIF).
+    Shares the cached export with create_animated_gif.
     """
     if not images or len(images) == 0:
         return None
     
-    webp_bytes = io.BytesIO()
-    
-    images[0].save(
-        webp_bytes,
-        format='WebP',
-        append_images=images[1:],
-        save_all=True,
-        duration=duration,
-        loop=0,
-        lossless=True,  # Lossless = perfect quality
-        quality=100,
-        method=6  # Best compression (0=fast, 6=best)
-    )
-    
-    webp_bytes.seek(0)
-    return webp_bytes.getvalue()
-
+    return animation.read_animation(images, "webp", duration=duration)
 
 
 def create_zip_bundle(
     main_image: Image.Image,
     pose_image: Image.Image,
     closeup_image: Image.Image,
-    gif_data: bytes = None,
-    webp_data: bytes = None
-) -> bytes:
+    gif_data=None,
+    webp_data=None
+) -> str:
     """
     Create a zip file containing all generated images and animations.
+    Animations can be passed as bytes or as file paths.
     
     Returns:
-        bytes: Zip file as bytes for download
+        str: Path of the (cached) zip file for download
     """
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        # Save the three main images as PNGs
-        if main_image:
-            img_buffer = io.BytesIO()
-            main_image.save(img_buffer, format='PNG')
-            zip_file.writestr('01_main_image.png', img_buffer.getvalue())
-        
-        if pose_image:
-            img_buffer = io.BytesIO()
-            pose_image.save(img_buffer, format='PNG')
-            zip_file.writestr('02_different_pose.png', img_buffer.getvalue())
-        
-        if closeup_image:
-            img_buffer = io.BytesIO()
-            closeup_image.save(img_buffer, format='PNG')
-            zip_file.writestr('03_closeup.png', img_buffer.getvalue())
-        
-        # Add GIF if provided
-        if gif_data:
-            zip_file.writestr('04_animation.gif', gif_data)
-        
-        # Add WebP if provided
-        if webp_data:
-            zip_file.writestr('05_animation.webp', webp_data)
-    
-    zip_buffer.seek(0)
-    return zip_buffer.getvalue()
+    return bundle.build_image_bundle(
+        [
+            ('01_main_image', main_image),
+            ('02_different_pose', pose_image),
+            ('03_closeup', closeup_image),
+        ],
+        extra_files=[
+            ('04_animation.gif', gif_data),
+            ('05_animation.webp', webp_data),
+        ]
+    )
 
 
 def build_main_prompt(
@@ -214,55 +118,6 @@ def build_main_prompt(
 
     return base_prompt
 
-def generate_image_with_inputs(
-    prompt: str,
-    input_images: List,  # list of PIL Images or UploadedFiles
-    model_name: str = "gemini-3-pro-image-preview",
-) -> Optional[Image.Image]:
-    """
-    Generate an image using Nano Banana with text prompt + input images.
-    Returns a PIL Image or None.
-    """
-    client = get_gemini_client()
-
-    contents: List = [prompt]
-
-    # Add all input images as Parts
-    for img_input in input_images:
-        if isinstance(img_input, Image.Image):
-            # Convert PIL Image to bytes
-            img_bytes_io = io.BytesIO()
-            img_input.save(img_bytes_io, format='PNG')
-            img_bytes = img_bytes_io.getvalue()
-            mime_type = "image/png"
-        else:
-            # Assume UploadedFile
-            img_bytes = img_input.getvalue()
-            mime_type = img_input.type or "image/jpeg"
-
-        contents.append(
-            types.Part.from_bytes(
-                data=img_bytes,
-                mime_type=mime_type,
-            )
-        )
-
-    resp = client.models.generate_content(
-        model=model_name,
-        contents=contents,
-    )
-
-    # Extract the first image from the response
-    for part in resp.parts:
-        if part.inline_data is not None:
-            image_bytes = part.inline_data.data
-            img = Image.open(io.BytesIO(image_bytes))
-            if img.format is None:
-                img.format = 'PNG'
-            return img
-
-    return None
-
 # -----------------------------------------------------------------------------
 # Streamlit UI
 # -----------------------------------------------------------------------------
@@ -420,7 +275,10 @@ if generate_btn:
         with col_gif:
             st.markdown("**GIF Animation**")
             with st.spinner("Creating GIF..."):
-                gif_data = create_animated_gif(all_images, duration=500)
+                # GIF and WebP are exported together; keep the cached file paths
+                # so the ZIP below can stream them instead of holding the bytes
+                animation_paths = animation.export_animations(all_images, duration=500)
+                gif_data = animation_paths.get("gif")
             
             # if gif_data:
             #     st.download_button(
@@ -434,7 +292,7 @@ if generate_btn:
         with col_webp:
             st.markdown("**WebP Animation** (Higher Quality)")
             with st.spinner("Creating WebP..."):
-                webp_data = create_animated_webp(all_images, duration=500)
+                webp_data = animation_paths.get("webp")
             
             # if webp_data:
             #     st.download_button(
@@ -452,7 +310,7 @@ if generate_btn:
     st.subheader("📦 Download Everything")
     
     with st.spinner("Creating ZIP bundle..."):
-        zip_data = create_zip_bundle(
+        zip_path = create_zip_bundle(
             main_image,
             pose_image,
             closeup_image,
@@ -460,15 +318,16 @@ if generate_btn:
             webp_data
         )
     
-    if zip_data:
-        st.download_button(
-            label="📥 Download Complete Package (ZIP)",
-            data=zip_data,
-            file_name="fashion_photoshoot_complete.zip",
-            mime="application/zip",
-            type="primary",
-            use_container_width=True
-        )
+    if zip_path:
+        with open(zip_path, "rb") as zip_file:
+            st.download_button(
+                label="📥 Download Complete Package (ZIP)",
+                data=zip_file,
+                file_name="fashion_photoshoot_complete.zip",
+                mime="application/zip",
+                type="primary",
+                use_container_width=True
+            )
         
         # Show what's included
         with st.expander("📋 Package contents"):
@@ -0,0 +1,354 @@
+"""
+Atelier production report: open order line items still to be made outside AU.
+
+Rows come from the local order mirror (see order_mirror.py), a single
+GraphQL bulk export (see shopify_bulk.py) or REST (orders.json paging + one
+fulfillment_orders call per order). All produce the same row frame, which
+build_tables turns into the two report tabs.
+
+Each refresh is saved as a timestamped snapshot under cache/atelier/ that is
+never rewritten; the Inventory App page loads the newest one instead of
+fetching live. start_scheduler (or `python cli.py atelier --every N`) keeps
+snapshots coming on an interval.
+"""
+import datetime
+import glob
+import json
+import os
+import threading
+import time
+import zoneinfo
+
+import numpy as np
+import pandas as pd
+import requests
+
+import order_mirror
+import shopify_bulk
+from atomic import atomic_open
+from instrumentation import span
+
+SHOPIFY_API_BASE = os.getenv("SHOPIFY_API_BASE", "https://luxmii.com")
+
+# How long "Update the Data" waits on a bulk export before paging over REST instead;
+# the scheduler and CLI wait the full shopify_bulk.POLL_TIMEOUT
+PAGE_BULK_TIMEOUT = int(os.getenv("ATELIER_PAGE_BULK_TIMEOUT", "45"))
+
+# Report snapshots, one file per refresh
+SNAPSHOT_DIR = os.path.join("cache", "atelier")
+# The scheduler refreshes when the newest snapshot is this old
+REFRESH_SECONDS = int(os.getenv("ATELIER_REFRESH_SECONDS", "600"))
+# "Update the Data" only goes to Shopify when the newest snapshot is older than this
+SNAPSHOT_MAX_AGE = int(os.getenv("ATELIER_SNAPSHOT_MAX_AGE", "900"))
+# Older snapshots past this many are deleted
+SNAPSHOT_KEEP = int(os.getenv("ATELIER_SNAPSHOT_KEEP", "48"))
+# Opt-in: every refresh is a bulk export (or a full REST pass) against the shop
+SCHEDULE_ENABLED = os.getenv("ATELIER_SCHEDULE") == "1"
+
+_apply_lock = threading.Lock()
+_scheduler_lock = threading.Lock()
+_scheduler_started = False
+
+# One row per (order line item, assigned fulfillment location)
+ROW_COLUMNS = ['name', 'id', 'created_at', 'product_name', 'item_id', 'quantity', 'location']
+
+
+def get_all_orders(key):
+    last=0
+    orders=pd.DataFrame()
+    while True:
+
+        url = f"{SHOPIFY_API_BASE}/admin/api/2024-04/orders.json?limit=250&fulfillment_status=unfulfilled&since_id={last}"
+
+        payload={}
+        headers = {
+          'Content-Type': 'application/json',
+          'X-Shopify-Access-Token': key
+        }
+
+        response = requests.request("GET", url, headers=headers, data=payload,verify=False)
+
+
+
+        df=pd.DataFrame(response.json()['orders'])
+        orders=pd.concat([orders,df])
+        if len(df)<250:
+            break
+        last=df['id'].iloc[-1]
+    return(orders)
+
+
+def get_item_location(order_id, key):
+    url = f"{SHOPIFY_API_BASE}/admin/api/2024-04/orders/{order_id}/fulfillment_orders.json"
+
+    payload={}
+    headers = {
+      'Content-Type': 'application/json',
+      'X-Shopify-Access-Token': key
+    }
+
+    response = requests.request("GET", url, headers=headers, data=payload,verify=False)
+
+    z=pd.DataFrame((response.json()['fulfillment_orders']))
+
+    z['list_items']=z['line_items'].apply(lambda x:[ i['line_item_id'] for i in x])
+    z['location']=z['assigned_location'].apply(lambda x: x['country_code'])
+    z=z[['list_items','location']].explode('list_items')
+    z.columns=['item_id','location']
+    z=z.drop_duplicates().reset_index(drop=True)
+    return(z)
+
+
+def rest_rows(key):
+    """Rows via REST. Returns (rows, ids of line items already fulfilled)."""
+    df=get_all_orders(key)
+    if df.empty:
+        return pd.DataFrame(columns=ROW_COLUMNS), []
+    with span("inventory: explode line items", rows=len(df)):
+        df['list_items']=df['line_items'].apply(lambda x:[{'name':i['name'],'id':i['id'],'quantity':i['quantity']} for i in x] )
+        s=df[['name','id','list_items','created_at']].explode('list_items')
+        s.reset_index(inplace=True,drop=True)
+        s['product_name']=s['list_items'].apply(lambda x:x['name'])
+        s['item_id']=s['list_items'].apply(lambda x:x['id'])
+        s['quantity']=s['list_items'].apply(lambda x:x['quantity'])
+        s.drop('list_items',axis=1,inplace=True)
+
+    locs=pd.DataFrame()
+    for order_id in list(s['id'].unique()):
+        locs=pd.concat([locs,get_item_location(order_id, key)])
+
+    data=s.merge(locs,on='item_id',how='left')
+
+    #remove_fullfiled items
+    d=df[df['fulfillments'].apply(lambda x: len(x)>0)]
+    ff=list(d['fulfillments'].apply(lambda x: [[z['id'] for z in i['line_items']] for i in x]).explode().explode())
+    return data[ROW_COLUMNS], ff
+
+
+def bulk_rows(key, timeout=shopify_bulk.POLL_TIMEOUT):
+    """
+    Rows via one GraphQL bulk export. Returns (rows, ids of line items already fulfilled).
+    A line item counts as fulfilled when nothing is left to fulfil on it.
+    """
+    with span("inventory: bulk export", service="shopify"):
+        tz = shopify_bulk.shop_timezone(key, base_url=SHOPIFY_API_BASE)
+        url = shopify_bulk.run_bulk_query(shopify_bulk.UNFULFILLED_ORDERS_QUERY, key, base_url=SHOPIFY_API_BASE,
+                                          timeout=timeout)
+
+    rows = []
+    fulfilled = []
+    with span("inventory: parse bulk jsonl") as info:
+        for order in shopify_bulk.iter_bulk_objects(url):
+            children = order.get("children", {})
+            locations = {}
+            for fulfillment_order in children.get("FulfillmentOrder", []):
+                country = (fulfillment_order.get("assignedLocation") or {}).get("countryCode")
+                for fo_item in fulfillment_order.get("children", {}).get("FulfillmentOrderLineItem", []):
+                    locations.setdefault(shopify_bulk.legacy_id(fo_item["lineItem"]["id"]), set()).add(country)
+
+            order_id = shopify_bulk.legacy_id(order["id"])
+            # createdAt is UTC; the report shows REST's shop-local time (dates differ before 10am AEST)
+            created_at = shopify_bulk.rest_timestamp(order["createdAt"], tz)
+            for line_item in children.get("LineItem", []):
+                item_id = shopify_bulk.legacy_id(line_item["id"])
+                if line_item.get("unfulfilledQuantity") == 0:
+                    fulfilled.append(item_id)
+                for location in sorted(locations.get(item_id) or [None], key=str):
+                    rows.append((order["name"], order_id, created_at, line_item["name"],
+                                 item_id, line_item["quantity"], location))
+        info["rows"] = len(rows)
+    return pd.DataFrame(rows, columns=ROW_COLUMNS), fulfilled
+
+
+def mirror_rows(key, conn=None):
+    """
+    Rows from the local order mirror. Fulfillment orders are cached there
+    until their order changes, so a repeat refresh makes no API calls.
+    """
+    conn = conn or order_mirror.get_shared_connection()
+    rows = []
+    fulfilled = []
+    for order in order_mirror.open_unfulfilled_orders(conn):
+        locations = {}
+        for fulfillment_order in order_mirror.get_fulfillment_orders(conn, order['id'], key, base_url=SHOPIFY_API_BASE):
+            for fo_item in fulfillment_order['line_items']:
+                locations.setdefault(fo_item['line_item_id'], set()).add(fulfillment_order['assigned_location']['country_code'])
+        for fulfillment in order.get('fulfillments') or []:
+            fulfilled.extend(i['id'] for i in fulfillment['line_items'])
+        for line_item in order['line_items']:
+            for location in sorted(locations.get(line_item['id']) or [None], key=str):
+                rows.append((order['name'], order['id'], order['created_at'], line_item['name'],
+                             line_item['id'], line_item['quantity'], location))
+    return pd.DataFrame(rows, columns=ROW_COLUMNS), fulfilled
+
+
+def build_tables(data, fulfilled):
+    """Turn rows into the 'All Data' and 'Aggregated Items' tabs."""
+    with span("inventory: merge and group", rows=len(data)):
+        data=data[data['location']!='AU']
+        data=data[~data['item_id'].isin(fulfilled)]
+
+        tab1=data.sort_values('name')
+        tab2=data.groupby('product_name').agg({'quantity':'sum','name':list})
+        tab2['name']=tab2['name'].apply(lambda x: ', '.join(x))
+        tab2=tab2.rename(columns={'name':'order_numbers'})
+        tab2['check']=False
+        tab2['notes']=np.nan
+        tab1['check']=False
+        tab1['notes']=np.nan
+        tab1=tab1.drop(['id','item_id','location'],axis=1)
+        tab1=tab1[['name', 'product_name', 'quantity','check','notes','created_at']]
+        tab1=tab1.rename(columns={'name':'order'})
+    return(tab1, tab2)
+
+
+def get_the_data(key, use_bulk=True, use_mirror=True, bulk_timeout=shopify_bulk.POLL_TIMEOUT):
+    """
+    Build the report tables. A backfilled order mirror is read first, then
+    the bulk export is tried; if it fails or takes longer than bulk_timeout
+    seconds (e.g. another bulk query is already running) the REST path is used.
+    """
+    if use_mirror and order_mirror.is_ready(order_mirror.get_shared_connection()):
+        with span("inventory: read order mirror"):
+            return build_tables(*mirror_rows(key))
+    if use_bulk:
+        try:
+            return build_tables(*bulk_rows(key, timeout=bulk_timeout))
+        # Besides API errors: an unexpected payload (KeyError, TypeError), an unknown
+        # shop time zone or a JSONL line that doesn't parse (ValueError)
+        except (shopify_bulk.BulkOperationError, requests.exceptions.RequestException,
+                KeyError, TypeError, ValueError, zoneinfo.ZoneInfoNotFoundError) as e:
+            print(f"Bulk export failed, falling back to REST: {e}")
+    return build_tables(*rest_rows(key))
+
+
+def write_snapshot(key, use_bulk=True, use_mirror=True, snapshot_dir=SNAPSHOT_DIR, bulk_timeout=shopify_bulk.POLL_TIMEOUT):
+    """Build the report and save it as a new snapshot; returns its path."""
+    a,b=get_the_data(key, use_bulk=use_bulk, use_mirror=use_mirror, bulk_timeout=bulk_timeout)
+    created=datetime.datetime.now(datetime.timezone.utc)
+    snapshot={
+        'created_at': created.isoformat(),
+        'tab1': a.to_dict(orient='split', index=False),
+        'tab2': b.reset_index().to_dict(orient='split', index=False),
+    }
+    os.makedirs(snapshot_dir, exist_ok=True)
+    path=os.path.join(snapshot_dir, f"report-{created:%Y%m%dT%H%M%S%fZ}.json")
+    # Written aside and renamed, so a reader never sees half a snapshot
+    with atomic_open(path, 'w') as f:
+        json.dump(snapshot, f)
+    for old in sorted(glob.glob(os.path.join(snapshot_dir, 'report-*.json')))[:-SNAPSHOT_KEEP]:
+        os.remove(old)
+    return path
+
+
+def latest_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """Path of the newest snapshot, or None."""
+    paths=sorted(glob.glob(os.path.join(snapshot_dir, 'report-*.json')))
+    return paths[-1] if paths else None
+
+
+def snapshot_time(path):
+    """When a snapshot was taken (UTC), from its file name."""
+    stamp=os.path.basename(path)[len('report-'):-len('.json')]
+    return datetime.datetime.strptime(stamp, '%Y%m%dT%H%M%S%fZ').replace(tzinfo=datetime.timezone.utc)
+
+
+def snapshot_age(snapshot_dir=SNAPSHOT_DIR):
+    """Seconds since the newest snapshot; None when there is none."""
+    path=latest_snapshot(snapshot_dir)
+    if path is None:
+        return None
+    return (datetime.datetime.now(datetime.timezone.utc)-snapshot_time(path)).total_seconds()
+
+
+def is_stale(max_age=SNAPSHOT_MAX_AGE, snapshot_dir=SNAPSHOT_DIR):
+    age=snapshot_age(snapshot_dir)
+    return age is None or age>max_age
+
+
+def merge_notes(a, b, tab1_path='tab1.csv', tab2_path='tab2.csv'):
+    """
+    Write fresh report tables over tab1/tab2, keeping the notes and check
+    ticks staff saved against each order line / product. Returns (tab1, tab2).
+    """
+    df1=pd.read_csv(tab1_path,dtype={'notes':str})
+    df2=pd.read_csv(tab2_path,dtype={'notes':str})
+
+    # One saved note / tick per order line: an order with the same product twice would otherwise gain rows on every refresh
+    saved1=df1[['order','product_name','check','notes']].drop_duplicates(['order','product_name'])
+    df1=a.merge(saved1,on=['order','product_name'],how='left')
+    df1['notes']=df1['notes_y'].combine_first(df1['notes_x'])
+    df1['check']=df1['check_y'].combine_first(df1['check_x']).astype(bool)
+    df1=df1[['order', 'product_name', 'quantity', 'check',  'notes', 'created_at']]
+
+    df2=b.merge(df2[['product_name','check','notes']].drop_duplicates('product_name'),on='product_name',how='left')
+    df2['notes']=df2['notes_y'].combine_first(df2['notes_x'])
+    df2['check']=df2['check_y'].combine_first(df2['check_x']).astype(bool)
+    df2=df2[['product_name','quantity','order_numbers','check','notes']]
+
+    df1.to_csv(tab1_path,index=False)
+    df2.to_csv(tab2_path,index=False)
+    return df1, df2
+
+
+def applied_snapshot(snapshot_dir=SNAPSHOT_DIR):
+    """Time of the snapshot tab1/tab2 were last brought up to, or None."""
+    marker=os.path.join(snapshot_dir, 'applied')
+    if not os.path.exists(marker):
+        return None
+    return snapshot_time(open(marker).read().strip())
+
+
+def load_snapshot(tab1_path='tab1.csv', tab2_path='tab2.csv', snapshot_dir=SNAPSHOT_DIR):
+    """
+    Bring tab1/tab2 up to the newest snapshot if they aren't on it yet (a local
+    read and merge, no API calls). Returns the snapshot's time, or None when there is none.
+    """
+    with _apply_lock:
+        path=latest_snapshot(snapshot_dir)
+        if path is None:
+            return None
+        marker=os.path.join(snapshot_dir, 'applied')
+        applied=open(marker).read().strip() if os.path.exists(marker) else None
+        if applied!=os.path.basename(path):
+            with open(path) as f:
+                snapshot=json.load(f)
+            merge_notes(pd.DataFrame(**snapshot['tab1']), pd.DataFrame(**snapshot['tab2']), tab1_path, tab2_path)
+            with open(marker,'w') as f:
+                f.write(os.path.basename(path))
+        return snapshot_time(path)
+
+
+def refresh_report(key, use_bulk=True, use_mirror=True, tab1_path='tab1.csv', tab2_path='tab2.csv', snapshot_dir=SNAPSHOT_DIR):
+    """Take a new snapshot now and write it over tab1/tab2. Returns the snapshot's time."""
+    write_snapshot(key, use_bulk=use_bulk, use_mirror=use_mirror, snapshot_dir=snapshot_dir)
+    return load_snapshot(tab1_path, tab2_path, snapshot_dir)
+
+
+def run_schedule(key, interval=REFRESH_SECONDS, use_bulk=True, use_mirror=True, snapshot_dir=SNAPSHOT_DIR):
+    """Take a snapshot whenever the newest one is `interval` seconds old; runs forever."""
+    while True:
+        age=snapshot_age(snapshot_dir)
+        if age is None or age>=interval:
+            try:
+                path=write_snapshot(key, use_bulk=use_bulk, use_mirror=use_mirror, snapshot_dir=snapshot_dir)
+                print(f"Atelier snapshot written: {path}")
+            except Exception as e:
+                print(f"Atelier snapshot failed: {e}")
+            age=0
+        # A manual refresh in between pushes the next scheduled one back
+        time.sleep(max(interval-age, 30))
+
+
+def start_scheduler(key, interval=REFRESH_SECONDS, use_bulk=True, use_mirror=True):
+    """
+    Run run_schedule on one daemon thread per process, only with ATELIER_SCHEDULE=1;
+    later calls are no-ops.
+    """
+    global _scheduler_started
+    with _scheduler_lock:
+        if _scheduler_started or not key or not SCHEDULE_ENABLED:
+            return
+        _scheduler_started = True
+    threading.Thread(target=run_schedule, args=(key, interval, use_bulk, use_mirror),
+                     daemon=True, name="atelier-snapshots").start()
@@ -0,0 +1,27 @@
+import contextlib
+import os
+import tempfile
+
+
+@contextlib.contextmanager
+def atomic_open(path, mode='wb'):
+    """
+    Open a uniquely named temp file next to `path` for writing. It replaces `path`
+    only when the block finishes without error, so readers and concurrent writers
+    never see a partial file; on error it is removed.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', prefix=f"{os.path.basename(path)}.", suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        with contextlib.suppress(OSError):
+            os.remove(tmp_path)
+        raise
+
+
+def write_atomic(path, data):
+    """Write bytes or text to `path` atomically."""
+    with atomic_open(path, 'wb' if isinstance(data, (bytes, bytearray)) else 'w') as f:
+        f.write(data)
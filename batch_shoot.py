@@ -0,0 +1,158 @@
+import contextvars
+import datetime
+import json
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import image_cache
+import product_catalog
+from atomic import atomic_open
+from bundle import image_payload
+from generation import build_main_prompt, generate_image_with_inputs
+from throttle import RateLimiter
+
+# One folder per run, one sub-folder per product
+BATCH_OUTPUT_DIR = os.path.join("output", "batch")
+PROGRESS_FILE = "progress.json"
+
+
+def resolve_products(conn, identifiers):
+    """
+    Map product ids or SKUs (one per entry) to catalog product ids.
+    Returns (product_ids, unknown_identifiers), de-duplicated in input order.
+    """
+    product_ids, unknown = [], []
+    for ident in identifiers:
+        ident = ident.strip()
+        if not ident:
+            continue
+        product_id = None
+        if ident.isdigit() and product_catalog.get_product(conn, int(ident)):
+            product_id = int(ident)
+        else:
+            product_id = product_catalog.find_product_by_sku(conn, ident)
+        if product_id is None:
+            unknown.append(ident)
+        elif product_id not in product_ids:
+            product_ids.append(product_id)
+    return product_ids, unknown
+
+
+def default_run_name():
+    return datetime.datetime.now().strftime("%Y%m%d-%H%M")
+
+
+def _slug(text):
+    return re.sub(r'[^A-Za-z0-9]+', '-', text).strip('-')[:60]
+
+
+def _load_progress(run_dir):
+    path = os.path.join(run_dir, PROGRESS_FILE)
+    if os.path.exists(path):
+        with open(path, 'r') as f:
+            return json.load(f)
+    return {"products": {}}
+
+
+def _save_progress(run_dir, progress):
+    path = os.path.join(run_dir, PROGRESS_FILE)
+    with atomic_open(path, 'w') as f:
+        json.dump(progress, f, indent=2)
+
+
+def _shoot_product(conn, product_id, reference_payloads, prompt, run_dir, limiter, image_index, max_retries):
+    product = product_catalog.get_product(conn, product_id)
+    images = product_catalog.get_product_images(conn, product_id)
+    if not images:
+        raise ValueError("Product has no images")
+    outfit = image_cache.get_image_bytes(images[min(image_index, len(images) - 1)])
+
+    for attempt in range(max_retries + 1):
+        limiter.acquire()
+        try:
+            result = generate_image_with_inputs(prompt, list(reference_payloads) + [outfit])
+            if result is None:
+                raise ValueError("No image returned")
+            break
+        except Exception:
+            if attempt == max_retries:
+                raise
+            time.sleep(2 ** attempt)
+
+    product_dir = os.path.join(run_dir, f"{product_id}-{_slug(product['title'])}")
+    os.makedirs(product_dir, exist_ok=True)
+    data, ext = image_payload(result)
+    path = os.path.join(product_dir, f"main{ext}")
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def run_batch(
+    conn,
+    product_ids,
+    reference_payloads,
+    user_description=None,
+    inspiration_desc=None,
+    run_name=None,
+    concurrency=4,
+    requests_per_minute=20,
+    image_index=0,
+    max_retries=2,
+    on_progress=None,
+):
+    """
+    Generate one on-model image per product with the same model and style.
+
+    The prompt and the encoded model references are built once and reused.
+    Products already marked done in the run's progress.json are skipped, so
+    re-running with the same `run_name` resumes an interrupted batch.
+    `on_progress(done, total, product_id, status)` is called from the calling thread.
+
+    Returns the run's progress dict:
+    {"run_dir": ..., "products": {id: {"status", "path"|"error"}}, "settings": {...}}
+    """
+    run_dir = os.path.join(BATCH_OUTPUT_DIR, run_name or default_run_name())
+    os.makedirs(run_dir, exist_ok=True)
+
+    progress = _load_progress(run_dir)
+    progress["run_dir"] = run_dir
+    progress["settings"] = {
+        "user_description": user_description,
+        "inspiration_desc": inspiration_desc,
+        "image_index": image_index,
+    }
+    todo = [pid for pid in product_ids
+            if progress["products"].get(str(pid), {}).get("status") != "done"]
+
+    prompt = build_main_prompt(
+        num_model_images=len(reference_payloads),
+        has_outfit=True,
+        user_description=user_description,
+        inspiration_desc=inspiration_desc,
+    )
+    limiter = RateLimiter(requests_per_minute, per=60.0)
+    done = len(product_ids) - len(todo)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {
+            # Copied context so generation spans land in the caller's timing run
+            pool.submit(contextvars.copy_context().run, _shoot_product, conn, pid, reference_payloads, prompt,
+                        run_dir, limiter, image_index, max_retries): pid
+            for pid in todo
+        }
+        for future in as_completed(futures):
+            pid = futures[future]
+            try:
+                entry = {"status": "done", "path": future.result()}
+            except Exception as e:
+                entry = {"status": "failed", "error": str(e)}
+            progress["products"][str(pid)] = entry
+            _save_progress(run_dir, progress)
+            done += 1
+            if on_progress:
+                on_progress(done, len(product_ids), pid, entry["status"])
+
+    return progress
@@ -0,0 +1,156 @@
+"""
+Throughput benchmark for the bulk invoice paths, run against local stand-ins.
+
+    python benchmarks/bench_invoicing.py --orders 50 --latency 0.2 --rate-limit 100 --cold-start 5
+
+Starts shopify_simulator.py and invoicing_simulator.py in-process, points
+functions.py at them and replays the Invoice Express page loop
+(create_invoice + update_client per order) and the Jasmin page loop. The
+invoicexpress-export scenario builds the orders from a Shopify orders export
+first (invoice_export.py) and passes the exchange rate in, like the page does.
+Reports orders/minute, p50/p95 per order and how failures were classified.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from dotenv import load_dotenv
+load_dotenv()
+# The stand-in only checks that a key is sent; one from the environment or .env is used as is
+os.environ.setdefault("INVOICEEXPRESS_KEY", "bench")
+
+import pandas as pd
+import requests
+
+import functions
+import invoice_export
+import invoicing_simulator
+import shopify_simulator
+
+
+def invoicexpress_order(functions, order_id, order=None, rate=None):
+    """Same steps and failure buckets as pages/Invoice_Express.process_orders."""
+    try:
+        invoice_response = functions.create_invoice(order_id, order=order, rate=rate)
+    except Exception:
+        return "failed_invoices"
+    try:
+        functions.update_client(json.loads(invoice_response))
+        return "successful"
+    except Exception:
+        return "failed_clients"
+
+
+def jasmin_order(base, order_id):
+    """Same request as pages/Jasmin.process_orders, which only fails on exceptions."""
+    try:
+        response = requests.get(f"{base}/?orderid={order_id}&extra_disc=70")
+        return "successful" if response.ok else "failed_status"
+    except Exception:
+        return "failed_invoices"
+
+
+def run(scenario, work, order_ids, concurrency, pause):
+    def timed(order_id):
+        start = time.perf_counter()
+        outcome = work(order_id)
+        elapsed = time.perf_counter() - start
+        time.sleep(pause)
+        return elapsed, outcome
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(timed, order_ids))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(r[0] for r in results)
+    outcomes = [r[1] for r in results]
+    return {
+        "scenario": scenario,
+        "concurrency": concurrency,
+        "orders": len(order_ids),
+        "orders_per_min": 60 * len(order_ids) / wall,
+        "p50_s": statistics.median(latencies),
+        "p95_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "first_s": results[0][0],
+        "ok": outcomes.count("successful"),
+        "failed": len(outcomes) - outcomes.count("successful"),
+        "failed_as": ",".join(sorted(set(o for o in outcomes if o != "successful"))) or "-",
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=50, help="Orders invoiced per scenario")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4])
+    parser.add_argument("--pause", type=float, default=0.0, help="Sleep after each order (the pages use 1-2s)")
+    parser.add_argument("--latency", type=float, default=0.1, help="InvoiceXpress/Jasmin latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate-limit", type=int, default=0, help="Invoicing calls allowed per --rate-window")
+    parser.add_argument("--rate-window", type=float, default=60.0)
+    parser.add_argument("--cold-start", type=float, default=0.0, help="Spin-up delay of an idle service (s)")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--shopify-latency", type=float, default=0.02)
+    parser.add_argument("--scenarios", nargs="+", default=["invoicexpress", "invoicexpress-export", "jasmin"],
+                        choices=["invoicexpress", "invoicexpress-export", "jasmin"])
+    args = parser.parse_args()
+
+    store = shopify_simulator.SyntheticStore(max(1000, args.orders * 3))
+    order_ids = [o["id"] for o in store.orders.values() if o["fulfillment_status"] is None][:args.orders]
+    shopify, shopify_base = shopify_simulator.start_in_background(
+        store, port=0, latency=args.shopify_latency, bucket_size=10_000, leak_rate=10_000
+    )
+
+    # The upload the export scenario starts from
+    export = io.StringIO()
+    names = {store.orders[order_id]["name"] for order_id in order_ids}
+    export_rows = [r for r in shopify_simulator.orders_export_rows(store) if r["Name"] in names]
+    writer = csv.DictWriter(export, fieldnames=list(export_rows[0]))
+    writer.writeheader()
+    writer.writerows(export_rows)
+
+    rows = []
+    for scenario in args.scenarios:
+        for concurrency in args.concurrency:
+            # Fresh stand-in per run so each one starts cold with an empty rate window
+            state = invoicing_simulator.ServiceState(
+                args.latency, args.jitter, args.rate_limit, args.rate_window,
+                args.cold_start, error_rate=args.error_rate,
+            )
+            server, base = invoicing_simulator.start_in_background(state)
+            # Same as setting SHOPIFY_API_BASE / INVOICEXPRESS_BASE_URL / EXCHANGE_RATE_API_BASE
+            functions.SHOPIFY_API_BASE = shopify_base
+            functions.INVOICEXPRESS_BASE_URL = base
+            functions.EXCHANGE_RATE_API_BASE = base
+
+            if scenario == "invoicexpress":
+                work = lambda oid: invoicexpress_order(functions, oid)
+            elif scenario == "invoicexpress-export":
+                export.seek(0)
+                exported = invoice_export.orders_from_export(pd.read_csv(export, dtype=str))
+                rate = functions.get_exchange_rate()
+                work = lambda oid: invoicexpress_order(functions, oid, exported.get(str(oid)), rate)
+            else:
+                work = lambda oid: jasmin_order(base, oid)
+            try:
+                rows.append(run(scenario, work, order_ids, concurrency, args.pause))
+            finally:
+                server.shutdown()
+                server.server_close()
+    shopify.shutdown()
+
+    columns = list(rows[0].keys())
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{row[c]:>14.3f}" if isinstance(row[c], float) else f"{row[c]:>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Load benchmark for the Shopify request patterns, run against shopify_simulator.py.
+
+    python benchmarks/bench_shopify.py --orders 2000 20000 --latency 0.05 --concurrency 1 8
+
+Replays the call patterns of the inventory refresh (unfulfilled orders by
+since_id, then fulfillment_orders per order), returns lookups (order,
+fulfillment_orders, customer, variants) and invoicing (one order fetch per
+invoice), and reports wall time, p50/p95 per call, calls, 429s and calls that
+stayed throttled after all retries.
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import requests
+
+from shopify_simulator import SyntheticStore, start_in_background
+
+HEADERS = {"X-Shopify-Access-Token": "bench", "Content-Type": "application/json"}
+
+
+class Client:
+    """
+    requests.Session that paces itself on X-Shopify-Shop-Api-Call-Limit, retries 429s
+    with backoff and records per-call latency. Calls that stay throttled count as failed.
+    """
+
+    def __init__(self, base, leak_rate=2.0, reserve=4):
+        self.base = base
+        self.session = requests.Session()
+        self.leak_rate = leak_rate
+        self.reserve = reserve  # calls kept free in the bucket for other workers
+        self.latencies = []
+        self.throttled = 0
+        self.failed = 0
+        self._lock = threading.Lock()
+
+    def _pace(self, response):
+        # "32/40": wait until the bucket has drained back below max - reserve
+        used, limit = (int(x) for x in response.headers.get("X-Shopify-Shop-Api-Call-Limit", "0/40").split("/"))
+        excess = used - (limit - self.reserve)
+        if excess > 0:
+            time.sleep(excess / self.leak_rate)
+
+    def get(self, path, max_retries=5):
+        for attempt in range(max_retries + 1):
+            start = time.perf_counter()
+            response = self.session.get(f"{self.base}{path}", headers=HEADERS)
+            with self._lock:
+                self.latencies.append(time.perf_counter() - start)
+            if response.status_code != 429:
+                response.raise_for_status()
+                self._pace(response)
+                return response.json()
+            with self._lock:
+                self.throttled += 1
+            # Full bucket: Retry-After, doubled per attempt, jittered so workers don't retry in lockstep
+            retry_after = float(response.headers.get("Retry-After", 1))
+            time.sleep(retry_after * 2 ** attempt * random.uniform(0.5, 1.5))
+        with self._lock:
+            self.failed += 1
+        return None
+
+
+def inventory_refresh(client, concurrency, limit):
+    last = 0
+    order_ids = []
+    while True:
+        page = client.get(f"/admin/api/2024-04/orders.json?limit=250&fulfillment_status=unfulfilled&since_id={last}")
+        orders = page["orders"] if page else []
+        if not orders:
+            break
+        order_ids.extend(o["id"] for o in orders)
+        last = orders[-1]["id"]
+    order_ids = order_ids[:limit]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda oid: client.get(f"/admin/api/2024-04/orders/{oid}/fulfillment_orders.json"), order_ids))
+
+
+def returns_lookup(client, order_id):
+    data = client.get(f"/admin/api/2024-10/orders/{order_id}.json")
+    if data is None:
+        return
+    order = data["order"]
+    client.get(f"/admin/api/2024-04/orders/{order_id}/fulfillment_orders.json")
+    client.get(f"/admin/api/2024-04/customers/{order['customer']['id']}.json")
+    for item in order["line_items"]:
+        client.get(f"/admin/api/2024-04/variants/{item['variant_id']}.json")
+
+
+def invoice_fetch(client, order_id):
+    client.get(f"/admin/api/2024-10/orders/{order_id}.json")
+
+
+def run(scenario, base, store, concurrency, lookups, leak_rate):
+    client = Client(base, leak_rate)
+    order_ids = sorted(store.orders)[-lookups:]
+    start = time.perf_counter()
+    if scenario == "inventory":
+        inventory_refresh(client, concurrency, lookups)
+    else:
+        work = returns_lookup if scenario == "returns" else invoice_fetch
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(lambda oid: work(client, oid), order_ids))
+    wall = time.perf_counter() - start
+
+    latencies = sorted(client.latencies)
+    return {
+        "scenario": scenario,
+        "orders": len(store.orders),
+        "concurrency": concurrency,
+        "wall_s": wall,
+        "p50_ms": 1000 * statistics.median(latencies),
+        "p95_ms": 1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "calls": len(latencies),
+        "throttled": client.throttled,
+        "failed": client.failed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, nargs="+", default=[2000, 20000], help="Store sizes to test")
+    parser.add_argument("--lookups", type=int, default=100, help="Orders looked up per scenario")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--latency", type=float, default=0.02)
+    parser.add_argument("--jitter", type=float, default=0.01)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--bucket-size", type=int, default=40)
+    parser.add_argument("--leak-rate", type=float, default=2.0)
+    parser.add_argument("--scenarios", nargs="+", default=["inventory", "returns", "invoices"],
+                        choices=["inventory", "returns", "invoices"])
+    args = parser.parse_args()
+
+    rows = []
+    for num_orders in args.orders:
+        store = SyntheticStore(num_orders)
+        for scenario in args.scenarios:
+            for concurrency in args.concurrency:
+                # Fresh server per run so every scenario starts with an empty call-limit bucket
+                server, base = start_in_background(
+                    store, port=0, latency=args.latency, jitter=args.jitter,
+                    throttle_rate=args.throttle_rate, bucket_size=args.bucket_size, leak_rate=args.leak_rate,
+                )
+                try:
+                    rows.append(run(scenario, base, store, concurrency, args.lookups, args.leak_rate))
+                finally:
+                    server.shutdown()
+                    server.server_close()
+
+    columns = list(rows[0].keys())
+    print("  ".join(f"{c:>12}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{row[c]:>12.3f}" if isinstance(row[c], float) else f"{row[c]:>12}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
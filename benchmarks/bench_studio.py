@@ -0,0 +1,127 @@
+"""
+Latency benchmark for the studio generation flows, run against the offline Gemini fake.
+
+    python benchmarks/bench_studio.py --latency 0.5 --concurrency 1 4 8
+
+Reports end-to-end time, input encode time, request payload bytes and
+peak Python memory for the main-image and variation flows, with inputs
+as pre-encoded payloads (current pages) or raw PIL images (legacy path).
+"""
+import argparse
+import io
+import os
+import statistics
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from PIL import Image
+
+import generation
+from fake_gemini import FakeGeminiClient
+
+
+def _synthetic_photo(seed, size):
+    # Smooth gradients with light grain, roughly photo-like to the encoders
+    gradient = Image.linear_gradient('L').resize(size)
+    channels = [gradient.rotate(90 * ((seed + i) % 4)).resize(size) for i in range(3)]
+    photo = Image.merge('RGB', channels)
+    grain = Image.effect_noise(size, 24).convert('RGB')
+    return Image.blend(photo, grain, 0.08)
+
+
+def make_inputs(mode, num_refs, ref_size):
+    """Model references + outfit, either as JPEG payloads or decoded PIL images."""
+    images = [_synthetic_photo(i, ref_size) for i in range(num_refs + 1)]
+    if mode == "pil":
+        return images
+    payloads = []
+    for img in images:
+        buffer = io.BytesIO()
+        img.save(buffer, format='JPEG', quality=90)
+        payloads.append((buffer.getvalue(), "image/jpeg"))
+    return payloads
+
+
+def run_flow(flow, inputs, main_image):
+    """One request; returns (seconds, encode_seconds, payload_bytes, ok)."""
+    if flow == "main":
+        prompt = generation.build_main_prompt(len(inputs) - 1, True, "Catalogue Clean", "Concrete wall, soft daylight")
+        request_inputs = inputs
+    else:
+        prompt = "Same outfit but sitting on a bench"
+        request_inputs = [main_image] + list(inputs)
+
+    start = time.perf_counter()
+    encoded = [generation.encode_input_image(i) for i in request_inputs]
+    encode_seconds = time.perf_counter() - start
+    payload_bytes = len(prompt.encode()) + sum(len(data) for data, _ in encoded)
+
+    start = time.perf_counter()
+    try:
+        ok = generation.generate_image_with_inputs(prompt, request_inputs) is not None
+    except Exception:
+        ok = False
+    return time.perf_counter() - start, encode_seconds, payload_bytes, ok
+
+
+def bench(flow, mode, concurrency, requests, inputs, main_image):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(lambda _: run_flow(flow, inputs, main_image), range(requests)))
+    wall = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = sorted(r[0] for r in results)
+    return {
+        "flow": flow,
+        "inputs": mode,
+        "concurrency": concurrency,
+        "requests": requests,
+        "p50_s": statistics.median(latencies),
+        "p95_s": latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))],
+        "encode_ms": 1000 * statistics.mean(r[1] for r in results),
+        "payload_kb": statistics.mean(r[2] for r in results) / 1024,
+        "throughput_rps": requests / wall,
+        "errors": sum(1 for r in results if not r[3]),
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency", type=float, default=0.2, help="Fake Gemini latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--requests", type=int, default=8, help="Requests per scenario")
+    parser.add_argument("--refs", type=int, default=5, help="Model reference images")
+    parser.add_argument("--ref-size", type=int, nargs=2, default=[1024, 1365])
+    parser.add_argument("--modes", nargs="+", default=["payload", "pil"], choices=["payload", "pil"])
+    args = parser.parse_args()
+
+    generation.set_gemini_client(FakeGeminiClient(
+        latency=args.latency, jitter=args.jitter, error_rate=args.error_rate
+    ))
+    main_image = generation.generate_image_with_inputs("warm-up", [])
+
+    rows = []
+    for mode in args.modes:
+        inputs = make_inputs(mode, args.refs, tuple(args.ref_size))
+        for flow in ("main", "variation"):
+            for concurrency in args.concurrency:
+                rows.append(bench(flow, mode, concurrency, args.requests, inputs, main_image))
+
+    columns = list(rows[0].keys())
+    print("  ".join(f"{c:>14}" for c in columns))
+    for row in rows:
+        print("  ".join(f"{row[c]:>14.3f}" if isinstance(row[c], float) else f"{row[c]:>14}" for c in columns))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Throughput and golden-output check for functions.transform_orders (batch) against
+functions.transform_to_second_format (one order at a time).
+
+    python benchmarks/bench_transform.py --orders 10000 --rate 0.61
+
+Builds synthetic orders with shopify_simulator.SyntheticStore, times both paths
+(and the batch path straight from a Shopify export DataFrame), then compares
+every payload field by field. Money fields may differ by one cent where the
+float version rounds a half-cent tie the other way; anything else is a
+mismatch and the script exits with status 1.
+"""
+import argparse
+import csv
+import io
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pandas as pd
+
+import functions
+import shopify_simulator
+
+MONEY_FIELDS = ("unit_price", "discount_amount", "discount")
+
+
+def compare(expected, actual):
+    """(mismatches, cent differences) between two payloads."""
+    mismatches, cents = [], 0
+    a, b = expected["invoice"], actual["invoice"]
+    for key in a:
+        if key != "items" and a[key] != b[key]:
+            mismatches.append(key)
+    if len(a["items"]) != len(b["items"]):
+        return mismatches + ["items"], cents
+    for x, y in zip(a["items"], b["items"]):
+        for key in x:
+            if x[key] == y[key]:
+                continue
+            # discount is a percentage derived from the two rounded amounts, so a cent moves it slightly more
+            tolerance = 0.5 if key == "discount" else 0.011
+            if key in MONEY_FIELDS and x[key] is not None and y[key] is not None and abs(x[key] - y[key]) <= tolerance:
+                cents += 1
+            else:
+                mismatches.append(f"items.{key}")
+    return mismatches, cents
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--orders", type=int, default=10000)
+    parser.add_argument("--rate", type=float, default=0.6137)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    store = shopify_simulator.SyntheticStore(args.orders, seed=args.seed)
+    orders = list(store.orders.values())
+    export = io.StringIO()
+    rows = list(shopify_simulator.orders_export_rows(store))
+    writer = csv.DictWriter(export, fieldnames=list(rows[0]))
+    writer.writeheader()
+    writer.writerows(rows)
+    export.seek(0)
+    df = pd.read_csv(export, dtype=str)
+
+    start = time.perf_counter()
+    expected = {order["id"]: functions.transform_to_second_format(order, args.rate) for order in orders}
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    actual = functions.transform_orders(orders, args.rate)
+    batch = time.perf_counter() - start
+
+    start = time.perf_counter()
+    from_export = functions.transform_orders(df, args.rate)
+    batch_export = time.perf_counter() - start
+
+    mismatched, cents = 0, 0
+    # Orders paid in another currency (and other ones the export can't describe) are fetched instead
+    refetched = sum(payload is None for payload in from_export.values())
+    for order_id, payload in expected.items():
+        for other in (actual[order_id], from_export[str(order_id)]):
+            if other is None:
+                continue
+            problems, diff = compare(payload, other)
+            cents += diff
+            if problems:
+                mismatched += 1
+                if mismatched <= 5:
+                    print(f"order {order_id}: {', '.join(problems)}")
+
+    items = sum(len(p["invoice"]["items"]) for p in expected.values())
+    print(f"{len(orders)} orders, {items} invoice items")
+    print(f"  transform_to_second_format  {single:8.3f}s  {len(orders) / single:10.0f} orders/s")
+    print(f"  transform_orders            {batch:8.3f}s  {len(orders) / batch:10.0f} orders/s")
+    print(f"  transform_orders (export)   {batch_export:8.3f}s  {len(orders) / batch_export:10.0f} orders/s")
+    print(f"  left to fetch from Shopify (export): {refetched}")
+    print(f"  money fields a cent apart: {cents}, mismatched payloads: {mismatched}")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+import hashlib
+import io
+import os
+import shutil
+import zipfile
+from typing import List, Tuple, Union
+
+from PIL import Image
+
+from atomic import atomic_open
+from instrumentation import span
+
+# Finished photoshoot ZIPs, keyed by the content of their members
+BUNDLE_CACHE_DIR = os.path.join("cache", "bundles")
+
+# Already-compressed formats are stored as-is; deflating them only costs CPU
+STORED_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.gif', '.webp', '.zip', '.pdf')
+CHUNK_SIZE = 1024 * 1024
+
+Member = Tuple[str, Union[bytes, str]]  # (name in archive, bytes or file path)
+
+
+def image_payload(img: Image.Image) -> Tuple[bytes, str]:
+    """
+    Encoded bytes and file extension for a generated image.
+    Reuses the bytes the image was decoded from when available,
+    otherwise encodes it to PNG once.
+    """
+    data = getattr(img, "encoded_bytes", None)
+    if data:
+        ext = {'JPEG': '.jpg', 'WEBP': '.webp'}.get(img.format, '.png')
+        return data, ext
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue(), '.png'
+
+
+def _bundle_key(members: List[Member]) -> str:
+    digest = hashlib.sha1()
+    for name, source in members:
+        digest.update(name.encode())
+        if isinstance(source, (bytes, bytearray)):
+            digest.update(hashlib.sha1(source).digest())
+        else:
+            stat = os.stat(source)
+            digest.update(f"{os.path.abspath(source)}:{stat.st_size}:{stat.st_mtime_ns}".encode())
+    return digest.hexdigest()
+
+
+def build_zip_bundle(members: List[Member]) -> str:
+    """
+    Write members into a ZIP on disk and return its path.
+    Files are streamed in chunks, images are stored uncompressed and
+    the same set of members always maps to the same cached archive.
+    """
+    key = _bundle_key(members)
+    path = os.path.join(BUNDLE_CACHE_DIR, f"{key}.zip")
+    if os.path.exists(path):
+        return path
+
+    os.makedirs(BUNDLE_CACHE_DIR, exist_ok=True)
+    with span("bundle: write zip", members=len(members)), atomic_open(path) as f, zipfile.ZipFile(f, 'w') as zip_file:
+        for name, source in members:
+            info = zipfile.ZipInfo(name)
+            info.compress_type = (
+                zipfile.ZIP_STORED if name.lower().endswith(STORED_EXTENSIONS) else zipfile.ZIP_DEFLATED
+            )
+            with zip_file.open(info, 'w', force_zip64=True) as dest:
+                if isinstance(source, (bytes, bytearray)):
+                    dest.write(source)
+                else:
+                    with open(source, 'rb') as src:
+                        shutil.copyfileobj(src, dest, CHUNK_SIZE)
+    return path
+
+
+def build_image_bundle(named_images: List[Tuple[str, Image.Image]], extra_files: List[Member] = ()) -> str:
+    """
+    ZIP of generated images plus extra files (e.g. animation paths).
+    `named_images` holds (name without extension, image); None images are skipped.
+    """
+    members = []
+    for name, img in named_images:
+        if img is not None:
+            data, ext = image_payload(img)
+            members.append((f"{name}{ext}", data))
+    members.extend((name, source) for name, source in extra_files if source)
+    return build_zip_bundle(members)
@@ -0,0 +1,250 @@
+"""
+Headless runner for the batch jobs behind the pages, for cron or a shell.
+
+    python cli.py invoicexpress orders_export.csv --concurrency 4 --rate 30 --out results.csv
+    python cli.py jasmin orders.csv --account production --concurrency 4 --out results.json
+    python cli.py atelier --no-bulk
+    python cli.py atelier --every 600
+    python cli.py mail-report --to atelier@luxmii.com
+    python cli.py rename invoices.zip --out renamed.zip
+    python cli.py invoice-pdfs --from 2025-01-01 --to 2025-01-31 --out invoices.zip
+
+Drives the same functions as Invoice Express (create_invoice + update_client),
+Jasmin, Inventory App (atelier snapshots) and Rename Invoices, with a worker
+pool (--concurrency), a cap on calls per minute (--rate, 0 for none), a progress
+line per order on stderr and per-order results written as CSV or JSON depending
+on the --out extension. Exits 1 when any order failed.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from dotenv import load_dotenv
+load_dotenv()
+
+import pandas as pd
+import requests
+
+import atelier
+import functions
+import invoice_index
+import invoice_pdfs
+import report_mailer
+from invoice_export import orders_from_export, read_order_ids
+from throttle import RateLimiter
+
+JASMIN_BASE_URL = os.getenv("JASMIN_BASE_URL", "https://luxmii-jasmin.onrender.com")
+
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
+
+
+def run_batch(order_ids, work, concurrency, rate):
+    """work(order_id) -> (status, error) for every order; one result row per order, in input order."""
+    limiter = RateLimiter(rate, per=60.0)
+
+    def one(order_id):
+        limiter.acquire()
+        start = time.perf_counter()
+        try:
+            status, error = work(order_id)
+        except Exception as e:
+            status, error = "failed", str(e)
+        return {"order_id": order_id, "status": status, "error": error,
+                "seconds": round(time.perf_counter() - start, 3)}
+
+    results = {}
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = [pool.submit(one, order_id) for order_id in order_ids]
+        for done, future in enumerate(as_completed(futures), 1):
+            row = future.result()
+            results[row["order_id"]] = row
+            log(f"[{done}/{len(order_ids)}] {row['order_id']} {row['status']} {row['error']}".rstrip())
+    wall = time.perf_counter() - started
+    log(f"{len(order_ids)} orders in {wall:.1f}s ({60 * len(order_ids) / max(wall, 1e-9):.0f}/min)")
+    return [results[order_id] for order_id in order_ids]
+
+
+def write_results(rows, path):
+    if path is None:
+        return
+    if path.endswith(".json"):
+        with open(path, "w") as f:
+            json.dump(rows, f, indent=2)
+    else:
+        pd.DataFrame(rows, columns=["order_id", "status", "error", "seconds"]).to_csv(path, index=False)
+    log(f"Results written to {path}")
+
+
+def summarize(rows):
+    counts = pd.Series([r["status"] for r in rows]).value_counts().to_dict() if rows else {}
+    print(json.dumps(counts))
+    return 0 if all(r["status"] == "successful" for r in rows) else 1
+
+
+def read_ids(path, column):
+    order_ids, counts = read_order_ids(path, column)
+    log(f"{len(order_ids)} orders ({counts['rows']} rows, {counts['duplicates']} repeated ids, "
+        f"{counts['blank']} blank, {len(counts['invalid'])} invalid skipped)")
+    return order_ids
+
+
+def cmd_invoicexpress(args):
+    order_ids = read_ids(args.file, args.column)
+    exported = {}
+    if not args.ids_only:
+        df = pd.read_csv(args.file, dtype=str)
+        if "Name" in df.columns:
+            exported = orders_from_export(df)
+            refetch = sum(exported.get(order_id) is None for order_id in order_ids)
+            log(f"{len(order_ids) - refetch} built from the export, {refetch} fetched from Shopify")
+    rate = functions.get_exchange_rate()
+    if rate is None:
+        log("Exchange rate unavailable; each invoice will try to fetch it again")
+
+    def work(order_id):
+        # Same steps and failure buckets as pages/Invoice_Express.process_orders
+        try:
+            invoice_response = functions.create_invoice(order_id, order=exported.get(order_id), rate=rate)
+        except Exception as e:
+            return "failed_invoice", str(e)
+        try:
+            functions.update_client(json.loads(invoice_response))
+        except Exception as e:
+            return "failed_client", str(e)
+        return "successful", ""
+
+    rows = run_batch(order_ids, work, args.concurrency, args.rate)
+    write_results(rows, args.out)
+    return summarize(rows)
+
+
+def cmd_jasmin(args):
+    order_ids = read_ids(args.file, args.column)
+    path = "/production" if args.account == "production" else "/"
+
+    def work(order_id):
+        response = requests.get(f"{JASMIN_BASE_URL}{path}?orderid={order_id}&extra_disc=70")
+        if response.ok:
+            return "successful", ""
+        return "failed_status", f"{response.status_code} {response.text[:200]}"
+
+    rows = run_batch(order_ids, work, args.concurrency, args.rate)
+    write_results(rows, args.out)
+    return summarize(rows)
+
+
+def cmd_atelier(args):
+    key = os.getenv("shopify_key")
+    if args.every:
+        # Same loop start_scheduler runs inside the app; the page picks each snapshot up on load
+        atelier.run_schedule(key, args.every, use_bulk=not args.no_bulk, use_mirror=not args.no_mirror)
+    if args.if_stale and not atelier.is_stale():
+        print(f"Snapshot is {atelier.snapshot_age():.0f}s old, nothing to do")
+        return 0
+    start = time.perf_counter()
+    as_of = atelier.refresh_report(key, use_bulk=not args.no_bulk, use_mirror=not args.no_mirror)
+    print(f"Snapshot of {as_of:%Y-%m-%d %H:%M:%S} UTC written to tab1.csv / tab2.csv in {time.perf_counter() - start:.1f}s")
+    return 0
+
+
+def cmd_mail_report(args):
+    as_of = atelier.load_snapshot()
+    df1 = pd.read_csv("tab1.csv", dtype={"notes": str})
+    df2 = pd.read_csv("tab2.csv", dtype={"notes": str})
+    mailer = report_mailer.ReportMailer()
+    try:
+        sent = mailer.send_report(df1, df2, args.to, as_of=as_of.astimezone() if as_of else None)
+        print(f"Report emailed to {sent.result()}")
+    finally:
+        mailer.close()
+    return 0
+
+
+def cmd_rename(args):
+    conn = invoice_index.get_shared_connection()
+    try:
+        invoice_index.refresh_if_stale(conn)
+    except Exception as e:
+        log(f"Could not refresh the invoice index, using what it has: {e}")
+    orders, from_index = invoice_pdfs.rename_zip(args.file, args.out, invoice_index.Resolver(conn))
+    print(f"{len(orders)} renamed ({from_index} from the invoice index, {len(orders) - from_index} from the PDF text) into {args.out}")
+    return 0
+
+
+def cmd_invoice_pdfs(args):
+    invoices = invoice_pdfs.list_invoices(args.date_from, args.date_to, sequence=args.sequence or None)
+    invoice_index.record_invoices(invoice_index.get_shared_connection(), invoices)
+    log(f"{len(invoices)} invoices listed")
+    written, failed = invoice_pdfs.export_zip(
+        invoices, args.out, concurrency=args.concurrency, rate=args.rate,
+        progress=lambda done, total: log(f"[{done}/{total}]"),
+    )
+    for invoice, error in failed:
+        log(f"{invoice.get('sequence_number') or invoice['id']}: {error}")
+    print(f"{len(written)} PDFs written to {args.out}, {len(failed)} failed")
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def batch_parser(name, help, rate):
+        p = commands.add_parser(name, help=help)
+        p.add_argument("file", help="CSV with an order id column (a raw Shopify orders export works)")
+        p.add_argument("--column", default="Id")
+        p.add_argument("--concurrency", type=int, default=4)
+        p.add_argument("--rate", type=float, default=rate, help="Orders started per minute (0 = no cap)")
+        p.add_argument("--out", help="Per-order results, .csv or .json")
+        return p
+
+    # Each order is three InvoiceXpress calls: create the invoice, update and re-read its client
+    p = batch_parser("invoicexpress", "Create InvoiceXpress invoices and update their clients",
+                     invoice_pdfs.INVOICE_PDF_RATE // 3)
+    p.add_argument("--ids-only", action="store_true", help="Fetch every order from Shopify instead of using the export")
+    p.set_defaults(func=cmd_invoicexpress)
+
+    p = batch_parser("jasmin", "Send orders to the Jasmin invoicing service", 60)
+    p.add_argument("--account", choices=["test", "production"], default="test")
+    p.set_defaults(func=cmd_jasmin)
+
+    p = commands.add_parser("atelier", help="Snapshot the Atelier production report into tab1.csv / tab2.csv")
+    p.add_argument("--if-stale", action="store_true",
+                   help=f"Only when the newest snapshot is older than {atelier.SNAPSHOT_MAX_AGE}s (ATELIER_SNAPSHOT_MAX_AGE)")
+    p.add_argument("--every", type=int, metavar="SECONDS", help="Keep taking snapshots on this interval")
+    p.add_argument("--no-bulk", action="store_true", help="Page orders over REST instead of a bulk export")
+    p.add_argument("--no-mirror", action="store_true", help="Don't read from the local order mirror")
+    p.set_defaults(func=cmd_atelier)
+
+    p = commands.add_parser("mail-report", help="Email tab1.csv / tab2.csv (newest snapshot) as the production report")
+    p.add_argument("--to", action="append", help="Recipient; repeat for more (default REPORT_RECIPIENTS)")
+    p.set_defaults(func=cmd_mail_report)
+
+    p = commands.add_parser("rename", help="Rename the PDFs in an InvoiceXpress ZIP to {order number}.pdf")
+    p.add_argument("file")
+    p.add_argument("--out", default="output.zip")
+    p.set_defaults(func=cmd_rename)
+
+    p = commands.add_parser("invoice-pdfs", help="Download invoice PDFs from InvoiceXpress into a ZIP")
+    p.add_argument("--from", dest="date_from", type=datetime.date.fromisoformat,
+                   default=datetime.date.today() - datetime.timedelta(days=7))
+    p.add_argument("--to", dest="date_to", type=datetime.date.fromisoformat, default=datetime.date.today())
+    p.add_argument("--sequence", default="LuxmiiSequence")
+    p.add_argument("--concurrency", type=int, default=4)
+    p.add_argument("--rate", type=float, default=invoice_pdfs.INVOICE_PDF_RATE)
+    p.add_argument("--out", default="invoices.zip")
+    p.set_defaults(func=cmd_invoice_pdfs)
+
+    args = parser.parse_args()
+    sys.exit(args.func(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+import functools
+import hashlib
+import io
+import os
+import random
+import threading
+import time
+from types import SimpleNamespace
+
+from PIL import Image, ImageDraw
+
+# Offline stand-in for genai.Client, for benchmarks and load tests.
+# Enable in the app with STUDIO_BACKEND=fake; tune with the FAKE_GEMINI_* variables.
+
+
+class FakeGeminiError(Exception):
+    """Injected failure, raised at the configured error rate."""
+
+
+@functools.lru_cache(maxsize=64)
+def _render_image(key: str, size) -> bytes:
+    # Deterministic per prompt + inputs: colours and blocks derived from the hash
+    digest = hashlib.sha256(key.encode()).digest()
+    img = Image.new('RGB', size, tuple(digest[0:3]))
+    draw = ImageDraw.Draw(img)
+    for i in range(8):
+        x0, y0 = digest[3 + i] * size[0] // 256, digest[11 + i] * size[1] // 256
+        draw.rectangle(
+            [x0, y0, x0 + size[0] // 4, y0 + size[1] // 6],
+            fill=tuple(digest[19 + i:22 + i])
+        )
+    buffer = io.BytesIO()
+    img.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class _FakeModels:
+    def __init__(self, client):
+        self._client = client
+
+    def generate_content(self, model, contents):
+        client = self._client
+        client._sleep_and_maybe_fail()
+
+        prompt = next((c for c in contents if isinstance(c, str)), "")
+        inputs = [c for c in contents if not isinstance(c, str)]
+        key = hashlib.sha1(prompt.encode())
+        for part in inputs:
+            data = getattr(getattr(part, "inline_data", None), "data", None) or b""
+            key.update(hashlib.sha1(data).digest())
+
+        if "image" not in model:
+            # Text model: the inspiration description
+            text = f"Fake style description {key.hexdigest()[:8]}: soft daylight, concrete wall, muted tones."
+            return SimpleNamespace(text=text, parts=[])
+
+        data = _render_image(f"{model}:{key.hexdigest()}", client.image_size)
+        part = SimpleNamespace(inline_data=SimpleNamespace(data=data, mime_type="image/png"))
+        return SimpleNamespace(text=None, parts=[part])
+
+
+class FakeGeminiClient:
+    """
+    Mimics the `client.models.generate_content` surface used by generation.py.
+    Returns deterministic PNGs after `latency` (+/- `jitter`) seconds and
+    raises FakeGeminiError for a fraction `error_rate` of calls.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, image_size=(896, 1200), seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.image_size = tuple(image_size)
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.models = _FakeModels(self)
+
+    def _sleep_and_maybe_fail(self):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency + self._random.uniform(-self.jitter, self.jitter))
+            fail = self._random.random() < self.error_rate
+        time.sleep(delay)
+        if fail:
+            raise FakeGeminiError("Injected Gemini failure")
+
+
+def client_from_env():
+    """FakeGeminiClient configured from FAKE_GEMINI_LATENCY / _JITTER / _ERROR_RATE / _SEED."""
+    return FakeGeminiClient(
+        latency=float(os.getenv("FAKE_GEMINI_LATENCY", "0")),
+        jitter=float(os.getenv("FAKE_GEMINI_JITTER", "0")),
+        error_rate=float(os.getenv("FAKE_GEMINI_ERROR_RATE", "0")),
+        seed=int(os.getenv("FAKE_GEMINI_SEED", "0")),
+    )
@@ -1,31 +1,41 @@
 import requests
 import re
-import http.client
 import json
 import datetime
 import time
+from decimal import Decimal, ROUND_HALF_UP
 import pandas as pd
 from dotenv import load_dotenv
 import os
 
+import invoice_index
+import order_mirror
+from instrumentation import span
+from invoice_export import orders_from_export
+
 # Load .env file
 load_dotenv()
 
 # Accessing keys from .env
 SHOPIFY_TOKEN = os.getenv("SHOPIFY_TOKEN")
+# Override to point at a local stand-in, e.g. http://localhost:8800 (see shopify_simulator.py)
+SHOPIFY_API_BASE = os.getenv("SHOPIFY_API_BASE", "https://luxmii.com")
 INVOICEEXPRESS_KEY = os.getenv("INVOICEEXPRESS_KEY")
+# Same for InvoiceXpress and the exchange rate API (see invoicing_simulator.py)
+INVOICEXPRESS_BASE_URL = os.getenv("INVOICEXPRESS_BASE_URL", "https://intervwovenunipes.app.invoicexpress.com")
+EXCHANGE_RATE_API_BASE = os.getenv("EXCHANGE_RATE_API_BASE", "https://v6.exchangerate-api.com")
 
 EXCHANGE_RATE_API_KEY = os.getenv("EXCHANGE_RATE_API_KEY")  # Consider moving to .env
 
 def get_exchange_rate():
     """Fetch the current AUD to EUR exchange rate."""
     try:
-        response = requests.get(f'https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/latest/AUD')
+        response = requests.get(f'{EXCHANGE_RATE_API_BASE}/v6/{EXCHANGE_RATE_API_KEY}/latest/AUD')
         response.raise_for_status()  # Raise exception for non-200 responses
         rate = response.json()['conversion_rates']['EUR']
         return rate
     except Exception as e:
-        st.error(f"Failed to fetch exchange rate: {str(e)}")
+        print(f"Failed to fetch exchange rate: {str(e)}")
         return None
 
 def transform_datetime_obs(input_datetime):
@@ -65,10 +75,11 @@ import copy
 import re
 
 
-def transform_to_second_format(first_json):
-
+def transform_to_second_format(first_json, rate=None):
 
-    rate = get_exchange_rate()
+    # Bulk runs fetch the rate once and pass it in
+    if rate is None:
+        rate = get_exchange_rate()
 
 
 
@@ -156,13 +167,118 @@ def transform_to_second_format(first_json):
 
 
 
-def create_invoice(order_id):
+CENT = Decimal("0.01")
+
+
+def _money(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def transform_orders(orders, rate=None):
+    """
+    transform_to_second_format for many orders in one pass: {order id: payload}.
+
+    orders is a list of order JSON or a Shopify orders export DataFrame (orders the
+    export can't describe map to None). Money is computed in Decimal and rounded half
+    up once, so a price can differ from the float version by a cent on half-cent ties.
+    """
+    if isinstance(orders, pd.DataFrame):
+        orders = orders_from_export(orders)
+    else:
+        orders = {order["id"]: order for order in orders}
+    if rate is None:
+        rate = get_exchange_rate()
+    factor = Decimal(str(rate)) * Decimal("0.3")
+
+    # Same for every invoice in the batch
+    today = datetime.datetime.today()
+    date = today.strftime('%d/%m/%Y')
+    uk_observations = f'Product origin: Portugal\nThe exporter of the products covered by this document declares that, except where otherwise clearly indicated, these products are of Portuguese preferential origin.\nLisbon, {today.strftime("%d %B %Y")}, Hanse Pty Ltd'
+    unit_prices = {}  # price string -> unit price; most orders share a few price points
+
+    payloads = {}
+    for order_id, order in orders.items():
+        if order is None:
+            payloads[order_id] = None
+            continue
+        shipping = order['shipping_address']
+        uk = shipping["country"] == 'United Kingdom'
+        reference = order['name'].replace('#', '')
+        items = []
+        for item in order['line_items']:
+            if item['fulfillment_status'] == 'fulfilled' or item['current_quantity'] <= 0:
+                continue
+            unit_price = unit_prices.get(item["price"])
+            if unit_price is None:
+                unit_price = unit_prices[item["price"]] = _money(factor * Decimal(item["price"]))
+            discount = discount_amount = None
+            if item["discount_allocations"]:
+                discount_amount = _money(sum(Decimal(d['amount']) for d in item["discount_allocations"]) * factor)
+                discount = float(_money(discount_amount / unit_price * 100)) if unit_price else 0.0
+                discount_amount = float(discount_amount)
+            items.append({
+                "name": item["name"],
+                "description": item["sku"],
+                "unit_price": float(unit_price),
+                "quantity": item["quantity"],
+                "unit": None,
+                "discount": discount,
+                "discount_amount": discount_amount,
+            })
+        payloads[order_id] = {
+            "invoice": {
+                "date": date,
+                "due_date": date,
+                "reference": reference,
+                "observations": uk_observations if uk else 'Product origin: Portugal',
+                'tax_exemption_reason': 'M05',
+                "retention": None,
+                "tax_exemption": "M05",
+                "sequence_id": "LuxmiiSequence",
+                "manual_sequence_number": None,
+                "client": {
+                    "name": shipping["name"],
+                    "code": reference,
+                    "email": None,
+                    "address": ' '.join(part for part in (shipping.get("address1"), shipping.get("address2"), shipping.get("province_code")) if part is not None),
+                    "city": shipping["city"],
+                    "postal_code": shipping["zip"],
+                    "country": 'UK' if uk else shipping["country"],
+                    "fiscal_id": None,
+                    "website": None,
+                    "phone": None,
+                    "fax": None,
+                    "language": None
+                },
+                "items": items
+            }
+        }
+    return payloads
+
+
+
+def invoicexpress_request(method, url, max_retries=6, **kwargs):
+    """
+    An InvoiceXpress API call, retried with backoff while it answers 429 or 5xx; returns the last response.
+    Six retries wait 63s in all, past the API's one-minute rate window.
+    """
+    for attempt in range(max_retries + 1):
+        response = requests.request(method, url, **kwargs)
+        if response.status_code != 429 and response.status_code < 500:
+            break
+        if attempt < max_retries:
+            time.sleep(2 ** attempt)
+    return response
+
+
+def create_invoice(order_id, order=None, rate=None):
+    # order: the order JSON when the caller already has it (e.g. from invoice_export), skipping the fetch
     # Initialize variables for retry mechanism
     max_retries = 5
     retry_delay = 1  # Initial delay in seconds
     attempt = 0
     
-    url = f"https://luxmii.com/admin/api/2024-10/orders/{order_id}.json"
+    url = f"{SHOPIFY_API_BASE}/admin/api/2024-10/orders/{order_id}.json"
     
     payload={}
     headers = {
@@ -170,12 +286,19 @@ def create_invoice(order_id):
         'X-Shopify-Access-Token': SHOPIFY_TOKEN
     }
     
+    # The local order mirror answers first when it is live (see webhook_receiver.py)
+    mirror = order_mirror.get_shared_connection()
+    z = order
+    if z is None and order_mirror.is_ready(mirror) and str(order_id).isdigit():
+        z = order_mirror.get_order(mirror, int(order_id))
+
     # Retry loop for Shopify API
-    while attempt < max_retries:
+    while z is None and attempt < max_retries:
         try:
             response = requests.request("GET", url, headers=headers, data=payload, verify=False)
             response.raise_for_status()  # Raises an exception for 4XX/5XX status codes
             data = response.json()
+            z = data['order']
             break  # If successful, exit the retry loop
             
         except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
@@ -187,22 +310,59 @@ def create_invoice(order_id):
             time.sleep(retry_delay)
             retry_delay *= 2  # Exponential backoff
     
-    z = data['order']
-    
     # Rest of your original function remains the same
-    conn = http.client.HTTPSConnection("intervwovenunipes.app.invoicexpress.com")
-    payload = json.dumps(transform_to_second_format(z))
+    with span("invoice: transform"):
+        payload = json.dumps(transform_to_second_format(z, rate))
     
     headers = {
         'accept': "application/json",
         'content-type': "application/json"
     }
     
-    api_key = INVOICEEXPRESS_KEY
-    endpoint = f"/invoices.json?api_key={api_key}"
+    response = invoicexpress_request(
+        "POST",
+        f"{INVOICEXPRESS_BASE_URL}/invoices.json",
+        data=payload,
+        headers=headers,
+        params={"api_key": INVOICEEXPRESS_KEY},
+    )
+    # Raised here so callers report it as a failed invoice, not as a failed client update
+    if not response.ok:
+        raise Exception(f"InvoiceXpress answered {response.status_code} creating the invoice for order {order_id}: {response.text[:200]}")
+    # Invoice id -> reference, so Rename Invoices can name the PDF without reading it
+    try:
+        invoice_index.record_invoices(invoice_index.get_shared_connection(), [json.loads(response.content)["invoice"]])
+    except Exception as e:
+        print(f"Could not index invoice for order {order_id}: {e}")
+    return(response.content)
+
+
+def update_client(client_data):
+    """Update client information in Invoice Express."""
+    client_id = client_data['invoice']['client']['id']
+    url = f"{INVOICEXPRESS_BASE_URL}/clients/{client_id}.json"
+    
+    payload = {
+        "client": {
+            "name": client_data['invoice']['client']['name'],
+            "code": client_data['invoice']['client']['code'],
+            "address": client_data['invoice']['client']['address'],
+            "city": client_data['invoice']['client']['city'],
+            "postal_code": client_data['invoice']['client']['postal_code']
+        }
+    }
+    
+    headers = {
+        "Accept": "application/json",
+        "Content-Type": "application/json"
+    }
+    
+    params = {"api_key": INVOICEEXPRESS_KEY}
     
-    conn.request("POST", endpoint, payload, headers)
+    response = invoicexpress_request("PUT", url, json=payload, headers=headers, params=params)
+    response.raise_for_status()
     
-    response = conn.getresponse()
-    data = response.read()
-    return(data)
\ No newline at end of file
+    # Verify client was updated by fetching client data
+    response = invoicexpress_request("GET", url, headers={'accept': "application/json"}, params=params)
+    response.raise_for_status()
+    return response.content
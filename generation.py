@@ -0,0 +1,181 @@
+import functools
+import io
+import os
+from typing import List, Optional
+
+from PIL import Image
+
+from instrumentation import span
+
+from google import genai
+from google.genai import types
+from dotenv import load_dotenv
+load_dotenv()
+
+# Gemini helpers shared by the studio pages and the batch photoshoot runner.
+# STUDIO_BACKEND selects the client: "gemini" (default) or "fake" (see fake_gemini.py).
+
+_client_override = None
+
+
+def set_gemini_client(client):
+    """
+    Use `client` for all generation calls (e.g. a FakeGeminiClient in benchmarks).
+    Pass None to go back to the backend chosen by STUDIO_BACKEND.
+    """
+    global _client_override
+    _client_override = client
+
+
+@functools.lru_cache(maxsize=None)
+def _client_for_backend(backend):
+    if backend == "fake":
+        import fake_gemini
+        return fake_gemini.client_from_env()
+    return genai.Client()
+
+
+def get_gemini_client():
+    """
+    Create a single Gemini client for the app.
+    Uses GEMINI_API_KEY from environment by default.
+    """
+    if _client_override is not None:
+        return _client_override
+    return _client_for_backend(os.getenv("STUDIO_BACKEND", "gemini"))
+
+
+def describe_inspiration_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> str:
+    """
+    Use Gemini text model to describe the inspiration image.
+    Focus on background, lighting, and atmosphere ONLY - NOT clothing or model.
+    """
+    client = get_gemini_client()
+
+    img_part = types.Part.from_bytes(
+        data=image_bytes,
+        mime_type=mime_type,
+    )
+
+    stylist_prompt = (
+        "You are a fashion photography director analyzing the environment and mood of this image. "
+        "Describe ONLY the following elements:\n\n"
+        "1. BACKGROUND & SETTING: The physical environment, location, textures (e.g., concrete wall, studio, outdoor park, urban street)\n"
+        "2. LIGHTING: The type and quality of light (e.g., soft natural daylight, dramatic side lighting, golden hour, studio lighting)\n"
+        "3. MOOD & ATMOSPHERE: The overall feeling and vibe (e.g., minimalist, moody, elegant, energetic, serene)\n"
+        "4. COLOR PALETTE: Background colors and tones (e.g., cool grays, warm earth tones, vibrant neon)\n"
+        "5. COMPOSITION: Camera angle, framing, depth of field if relevant to the environment\n\n"
+        "CRITICAL: Do NOT describe the person, their clothing, outfit details, accessories, or what they're wearing. "
+        "Completely ignore all garments and fashion items. Focus ONLY on the photographic environment, "
+        "setting, lighting conditions, and aesthetic atmosphere.\n\n"
+        "Keep your description to 3-4 concise sentences suitable for an AI image generator."
+    )
+
+    with span("generate_content gemini-2.5-flash", service="gemini", bytes_out=len(image_bytes)):
+        resp = client.models.generate_content(
+            model="gemini-2.5-flash",
+            contents=[stylist_prompt, img_part],
+        )
+
+    return (resp.text or "").strip()
+
+
+def build_main_prompt(
+    num_model_images: int,
+    has_outfit: bool,
+    user_description: Optional[str],
+    inspiration_desc: Optional[str],
+) -> str:
+    """
+    Build the text prompt for the main image: model references first, outfit last.
+    """
+    studio_instruction = (
+        f"PERSON TO RECREATE: The first {num_model_images} reference images show the model. "
+        f"Use their EXACT facial features, skin tone, hair, and body type. "
+        f"{'OUTFIT TO USE: The last reference image is the Product/Outfit. Dress the model in this exact outfit. ' if has_outfit else 'Create a stylish high-fashion outfit. '}"
+        "Combine the person with the outfit in the new photographic environment."
+    )
+
+    pieces = []
+    if user_description:
+        pieces.append(f"Creative direction: {user_description}")
+    if inspiration_desc:
+        pieces.append(f"Background & photographic style: {inspiration_desc}")
+    if not pieces:
+        pieces.append("Create a high-end fashion editorial photo.")
+
+    combined = "\n".join(pieces)
+
+    return (
+        f"Create a photorealistic fashion photograph.\n"
+        f"{studio_instruction}\n\n"
+        f"{combined}\n\n"
+        "Full-body shot, vertical 3:4 aspect ratio, professional fashion editorial lighting, "
+        "shallow depth of field, magazine-quality image."
+    )
+
+
+def encode_input_image(img_input):
+    """
+    Return (bytes, mime_type) for a PIL Image, an UploadedFile
+    or an already-encoded (bytes, mime_type) tuple.
+    """
+    if isinstance(img_input, Image.Image):
+        data = getattr(img_input, "encoded_bytes", None)
+        if data:
+            return data, Image.MIME.get(img_input.format, "image/png")
+        # Convert PIL Image to bytes
+        img_bytes_io = io.BytesIO()
+        with span("image: encode png"):
+            img_input.save(img_bytes_io, format='PNG')
+        return img_bytes_io.getvalue(), "image/png"
+    if isinstance(img_input, tuple):
+        # Already-encoded image, e.g. from the local image cache
+        return img_input
+    # Assume UploadedFile
+    return img_input.getvalue(), img_input.type or "image/jpeg"
+
+
+def generate_image_with_inputs(
+    prompt: str,
+    input_images: List,  # list of PIL Images, UploadedFiles or (bytes, mime_type) tuples
+    model_name: str = "gemini-3-pro-image-preview",
+) -> Optional[Image.Image]:
+    """
+    Generate an image using Nano Banana with text prompt + input images.
+    Returns a PIL Image or None.
+    """
+    client = get_gemini_client()
+
+    contents: List = [prompt]
+
+    # Add all input images as Parts
+    for img_input in input_images:
+        img_bytes, mime_type = encode_input_image(img_input)
+        contents.append(
+            types.Part.from_bytes(
+                data=img_bytes,
+                mime_type=mime_type,
+            )
+        )
+
+    with span(f"generate_content {model_name}", service="gemini") as info:
+        info["bytes_out"] = len(prompt.encode()) + sum(len(part.inline_data.data) for part in contents[1:])
+        resp = client.models.generate_content(
+            model=model_name,
+            contents=contents,
+        )
+        info["bytes_in"] = sum(len(p.inline_data.data) for p in resp.parts or [] if p.inline_data is not None)
+
+    # Extract the first image from the response
+    for part in resp.parts:
+        if part.inline_data is not None:
+            image_bytes = part.inline_data.data
+            img = Image.open(io.BytesIO(image_bytes))
+            if img.format is None:
+                img.format = 'PNG'
+            # Keep the encoded bytes so downloads/bundles don't re-encode
+            img.encoded_bytes = image_bytes
+            return img
+
+    return None
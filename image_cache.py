@@ -0,0 +1,87 @@
+import glob
+import io
+import mimetypes
+import os
+import re
+
+import requests
+from PIL import Image
+
+from atomic import write_atomic
+from instrumentation import span
+
+# Originals and sized thumbnails of Shopify product images
+IMAGE_CACHE_DIR = os.path.join("cache", "images")
+THUMB_WIDTH = 300
+
+_session = requests.Session()
+
+
+def sized_url(src, width):
+    """
+    Shopify CDN URL for a resized copy of an image.
+    .../Dress.jpg?v=123 -> .../Dress_300x.jpg?v=123
+    """
+    base, sep, query = src.partition('?')
+    root, ext = os.path.splitext(base)
+    return f"{root}_{width}x{ext}{sep}{query}"
+
+
+def _cache_path(image, width=None):
+    # Keyed by image id + updated_at so a replaced image gets a new file
+    stamp = re.sub(r'\D', '', image.get('updated_at') or '') or '0'
+    ext = os.path.splitext(image['src'].partition('?')[0])[1].lower() or '.jpg'
+    suffix = f"_{width}x" if width else ""
+    return os.path.join(IMAGE_CACHE_DIR, f"{image['id']}_{stamp}{suffix}{ext}")
+
+
+def _download(url):
+    response = _session.get(url, timeout=30)
+    response.raise_for_status()
+    return response.content
+
+
+def _drop_stale_versions(image, keep_path):
+    # Older updated_at versions of the same image id are never read again
+    for path in glob.glob(os.path.join(IMAGE_CACHE_DIR, f"{image['id']}_*")):
+        if not os.path.basename(path).startswith(os.path.basename(os.path.splitext(keep_path)[0])):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def get_image_path(image, width=None):
+    """
+    Local path of a Shopify image dict ({id, src, updated_at}).
+    With `width`, returns a thumbnail fetched from the CDN's `_WIDTHx` variant,
+    or made from the cached original if the variant is unavailable.
+    """
+    os.makedirs(IMAGE_CACHE_DIR, exist_ok=True)
+    path = _cache_path(image, width)
+    if os.path.exists(path):
+        return path
+
+    if width is None:
+        write_atomic(path, _download(image['src']))
+        _drop_stale_versions(image, path)
+        return path
+
+    try:
+        data = _download(sized_url(image['src'], width))
+    except requests.exceptions.RequestException:
+        with span("image: thumbnail resize"), Image.open(get_image_path(image)) as original:
+            original.thumbnail((width, width * 4))
+            buffer = io.BytesIO()
+            original.convert('RGB').save(buffer, format='JPEG', quality=85)
+            data = buffer.getvalue()
+    write_atomic(path, data)
+    return path
+
+
+def get_image_bytes(image, width=None):
+    """Return (bytes, mime_type) for a Shopify image, downloading it at most once."""
+    path = get_image_path(image, width)
+    with open(path, 'rb') as f:
+        data = f.read()
+    return data, mimetypes.guess_type(path)[0] or "image/jpeg"
@@ -0,0 +1,289 @@
+"""
+Lightweight timing spans for outbound calls and heavy local stages.
+
+Pages call `page_run("Returns Portal")` once near the top. That starts a run,
+hooks every `requests` call (Shopify, InvoiceXpress, exchange rates, Jasmin,
+Order Assistant, CDN), feeds metrics.py and adds an optional "⏱ Timings"
+panel to the sidebar.
+Other code wraps work in `with span("stage name"):`. With TIMINGS_LOG set
+(e.g. TIMINGS_LOG=logs/timings.jsonl) each finished span is also appended to
+that file as one JSON line tagged with its run id; it is rotated to
+<file>.1 once it passes TIMINGS_LOG_MAX_MB.
+
+    python instrumentation.py logs/timings.jsonl   # per-run summary of the log
+"""
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+import uuid
+from urllib.parse import urlparse
+
+import requests
+
+# Off unless set, like SHOW_TIMINGS; one line per span adds up quickly on a busy dyno
+TIMINGS_LOG = os.getenv("TIMINGS_LOG", "")
+TIMINGS_LOG_MAX_BYTES = int(float(os.getenv("TIMINGS_LOG_MAX_MB", "50")) * 1024 * 1024)
+# The sidebar panel redraws at most this often while a run records spans
+PANEL_REFRESH_SECONDS = 0.5
+
+# Known hosts -> service name; the *_BASE overrides are resolved at call time
+SERVICE_HOSTS = [
+    ("invoicexpress.com", "invoicexpress"),
+    ("exchangerate-api.com", "exchange_rate"),
+    ("luxmii-jasmin", "jasmin"),
+    ("shopify-order-assistant", "order_assistant"),
+    ("cdn.shopify.com", "shopify_cdn"),
+    ("luxmii.com", "shopify"),
+]
+SERVICE_ENV = [
+    ("SHOPIFY_API_BASE", "shopify"),
+    ("INVOICEXPRESS_BASE_URL", "invoicexpress"),
+    ("EXCHANGE_RATE_API_BASE", "exchange_rate"),
+    ("JASMIN_BASE_URL", "jasmin"),
+]
+
+_current_run = contextvars.ContextVar("timing_run", default=None)
+_log_lock = threading.Lock()
+_original_send = None
+_listeners = []
+
+
+class Run:
+    """Spans collected during one page run (one Streamlit script execution)."""
+
+    def __init__(self, page):
+        self.id = uuid.uuid4().hex[:12]
+        self.page = page
+        self.started = time.time()
+        self.spans = []
+        self.lock = threading.Lock()
+        self.thread_id = threading.get_ident()
+        self.on_span = None
+
+    def add(self, record):
+        with self.lock:
+            self.spans.append(record)
+        if self.on_span and threading.get_ident() == self.thread_id:
+            self.on_span(self)
+
+    def summary(self):
+        return summarize(self.spans)
+
+
+def start_run(page):
+    """Make a new Run current for this thread (and contexts copied from it)."""
+    run = Run(page)
+    _current_run.set(run)
+    return run
+
+
+def current_run():
+    return _current_run.get()
+
+
+def add_listener(fn):
+    """Call fn(record) for every finished span, in or outside a run (see metrics.py)."""
+    if fn not in _listeners:
+        _listeners.append(fn)
+
+
+def _write_log(record):
+    if not TIMINGS_LOG:
+        return
+    try:
+        os.makedirs(os.path.dirname(TIMINGS_LOG) or ".", exist_ok=True)
+        with _log_lock:
+            if os.path.exists(TIMINGS_LOG) and os.path.getsize(TIMINGS_LOG) > TIMINGS_LOG_MAX_BYTES:
+                os.replace(TIMINGS_LOG, f"{TIMINGS_LOG}.1")  # keep one previous file
+            with open(TIMINGS_LOG, "a") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+    except OSError as e:
+        print(f"Could not write timing log: {e}")
+
+
+@contextlib.contextmanager
+def span(name, service=None, **attrs):
+    """
+    Time a block. Yields a dict the block can add to (e.g. bytes_in, bytes_out, status).
+    Outside a run this only costs a couple of clock reads.
+    """
+    info = dict(attrs)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield info
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        run = _current_run.get()
+        if run is not None or _listeners:
+            record = {
+                "run_id": run.id if run else None,
+                "page": run.page if run else None,
+                "ts": round(time.time(), 3),
+                "name": name,
+                "service": service or "local",
+                "ms": round(1000 * (time.perf_counter() - start), 2),
+                "error": error,
+                **info,
+            }
+            for listener in _listeners:
+                try:
+                    listener(record)
+                except Exception as e:
+                    print(f"Span listener failed: {e}")
+            if run is not None:
+                run.add(record)
+                _write_log(record)
+
+
+def timed(name, service=None):
+    """Decorator form of span()."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, service):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def service_for_url(url):
+    netloc = urlparse(url).netloc
+    for env, service in SERVICE_ENV:
+        base = os.getenv(env)
+        if base and urlparse(base).netloc == netloc:
+            return service
+    for host, service in SERVICE_HOSTS:
+        if host in netloc:
+            return service
+    return netloc
+
+
+def _endpoint(method, url):
+    # Group by endpoint: ids and API versions become placeholders, keys in paths are dropped
+    path = urlparse(url).path
+    path = re.sub(r"/v6/[^/]+/", "/v6/{key}/", path)
+    path = re.sub(r"/\d{4}-\d{2}/", "/{version}/", path)
+    path = re.sub(r"\d{3,}", "{id}", path)
+    return f"{method} {path}"
+
+
+def _instrumented_send(session, request, **kwargs):
+    with span(_endpoint(request.method, request.url), service_for_url(request.url)) as info:
+        body = request.body or b""
+        info["bytes_out"] = len(body)
+        response = _original_send(session, request, **kwargs)
+        info["status"] = response.status_code
+        call_limit = response.headers.get("X-Shopify-Shop-Api-Call-Limit")
+        if call_limit:
+            info["call_limit"] = call_limit
+        if not kwargs.get("stream"):
+            info["bytes_in"] = len(response.content)
+        return response
+
+
+def install_requests_hook():
+    """Time every requests call, including the ones made through requests.get/post."""
+    global _original_send
+    if _original_send is None:
+        _original_send = requests.Session.send
+        requests.Session.send = _instrumented_send
+
+
+def summarize(spans):
+    """Per (service, name) totals: calls, errors, total/p95 ms and KB in/out."""
+    groups = {}
+    for s in spans:
+        groups.setdefault((s["service"], s["name"]), []).append(s)
+    rows = []
+    for (service, name), items in groups.items():
+        durations = sorted(i["ms"] for i in items)
+        rows.append({
+            "service": service,
+            "name": name,
+            "calls": len(items),
+            "errors": sum(1 for i in items if i.get("error") or (i.get("status") or 0) >= 400),
+            "total_ms": round(sum(durations), 1),
+            "p95_ms": durations[min(len(durations) - 1, int(len(durations) * 0.95))],
+            "kb_out": round(sum(i.get("bytes_out") or 0 for i in items) / 1024, 1),
+            "kb_in": round(sum(i.get("bytes_in") or 0 for i in items) / 1024, 1),
+        })
+    return sorted(rows, key=lambda r: r["total_ms"], reverse=True)
+
+
+def page_run(page):
+    """
+    Start timing a page run, hook outbound requests and add the sidebar timing panel.
+    The panel shows the last run that recorded anything; once the current run has gone
+    on for PANEL_REFRESH_SECONDS it shows that one instead, redrawn at most that often
+    (its complete summary is the "Previous run" of the next one).
+    """
+    import pandas as pd
+    import streamlit as st
+
+    import metrics
+
+    install_requests_hook()
+    metrics.install()
+    metrics.count_page_run(page)
+    previous = st.session_state.get("timing_run")
+    if previous is not None and previous.spans:
+        st.session_state["timing_last_run"] = previous
+    run = start_run(page)
+    st.session_state["timing_run"] = run
+
+    show = st.sidebar.toggle("⏱ Timings", key="show_timings", value=os.getenv("SHOW_TIMINGS") == "1")
+    if not show:
+        return run
+    placeholder = st.sidebar.empty()
+
+    def render(r, label):
+        rows = r.summary()
+        with placeholder.container():
+            elapsed = max(s["ts"] for s in r.spans) - r.started
+            st.caption(f"{label} · {len(r.spans)} spans · {elapsed:.2f}s")
+            st.dataframe(pd.DataFrame(rows), hide_index=True, width="stretch")
+
+    last = st.session_state.get("timing_last_run")
+    if last is not None:
+        render(last, "Previous run")
+    # A run that finishes within PANEL_REFRESH_SECONDS leaves the previous run's full summary up
+    drawn_at = [time.monotonic() if last is not None else 0.0]
+
+    def on_span(r):
+        # Redrawing the whole summary per span is quadratic on pages with hundreds of them
+        now = time.monotonic()
+        if now - drawn_at[0] >= PANEL_REFRESH_SECONDS:
+            drawn_at[0] = now
+            render(r, "This run")
+
+    run.on_span = on_span
+    return run
+
+
+def main():
+    path = sys.argv[1] if len(sys.argv) > 1 else (TIMINGS_LOG or os.path.join("logs", "timings.jsonl"))
+    runs = {}
+    with open(path) as f:
+        for line in f:
+            record = json.loads(line)
+            runs.setdefault((record["run_id"], record["page"]), []).append(record)
+    for (run_id, page), spans in runs.items():
+        started = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(spans[0]["ts"]))
+        print(f"\n{page}  run {run_id}  {started}")
+        for row in summarize(spans):
+            print(f"  {row['service']:>16}  {row['name'][:60]:<60}  {row['calls']:>5} calls  "
+                  f"{row['errors']:>3} err  {row['total_ms']:>10.1f} ms  p95 {row['p95_ms']:>8.1f}  "
+                  f"{row['kb_out']:>8.1f} KB out  {row['kb_in']:>8.1f} KB in")
+
+
+if __name__ == "__main__":
+    main()
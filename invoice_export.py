@@ -0,0 +1,142 @@
+"""
+Order ids and orders for invoicing read from an uploaded Shopify orders export.
+
+    ids, counts = invoice_export.read_order_ids(uploaded_file)
+    orders = invoice_export.orders_from_export(pd.read_csv(uploaded_file, dtype=str))
+    create_invoice(order_id, order=orders[order_id], rate=rate)
+
+read_order_ids only reads the id column, in chunks, and drops the repeats an
+export has for orders with several line items.
+
+The export has one row per line item, with the order-level columns only filled on
+an order's first row. The rows are grouped by order into the order JSON that
+transform_to_second_format reads (name, shipping_address, line_items). Orders
+the export can't fully describe (refunded, paid in a currency other than the
+shop's, missing address or line item fields, a country code not in COUNTRY_NAMES) map to None, and create_invoice fetches
+those from Shopify as before.
+"""
+import pandas as pd
+
+CHUNK_ROWS = 50_000
+
+ORDER_COLUMNS = [
+    "Id", "Currency", "Refunded Amount", "Shipping Name", "Shipping Address1", "Shipping Address2",
+    "Shipping City", "Shipping Zip", "Shipping Province", "Shipping Country",
+]
+LINE_COLUMNS = [
+    "Lineitem name", "Lineitem sku", "Lineitem price", "Lineitem quantity",
+    "Lineitem discount", "Lineitem fulfillment status",
+]
+# The export has prices in the currency the customer paid in; transform_to_second_format
+# expects the shop currency (the REST line item price), so other currencies are fetched
+SHOP_CURRENCY = "AUD"
+# Without these the payload can't be built, so the order is fetched instead
+REQUIRED = [
+    "Shipping Name", "Shipping City", "Shipping Zip", "Shipping Country",
+    "Lineitem name", "Lineitem price", "Lineitem quantity",
+]
+
+# The export has the shipping country code; the invoice (and the UK origin note) need the name
+COUNTRY_NAMES = {
+    "AU": "Australia", "NZ": "New Zealand", "US": "United States", "CA": "Canada",
+    "GB": "United Kingdom", "IE": "Ireland", "PT": "Portugal", "ES": "Spain", "FR": "France",
+    "DE": "Germany", "IT": "Italy", "NL": "Netherlands", "BE": "Belgium", "LU": "Luxembourg",
+    "AT": "Austria", "CH": "Switzerland", "DK": "Denmark", "SE": "Sweden", "NO": "Norway",
+    "FI": "Finland", "GR": "Greece", "PL": "Poland", "SG": "Singapore", "HK": "Hong Kong",
+    "JP": "Japan", "AE": "United Arab Emirates", "IL": "Israel", "ZA": "South Africa",
+}
+
+
+def read_order_ids(file, column="Id", chunksize=CHUNK_ROWS):
+    """
+    Unique order ids from an uploaded CSV, in file order, reading only `column` in chunks.
+
+    Returns (ids, counts); counts has rows, blank, duplicates (rows skipped as repeats)
+    and invalid (values that aren't numeric order ids, skipped).
+    """
+    if hasattr(file, "seek"):
+        file.seek(0)
+    try:
+        reader = pd.read_csv(file, usecols=[column], dtype=str, chunksize=chunksize)
+    except ValueError:
+        raise Exception(f"Column '{column}' not found in the file")
+    ids = {}
+    counts = {"rows": 0, "blank": 0, "duplicates": 0, "invalid": []}
+    for chunk in reader:
+        values = chunk[column].str.strip()
+        counts["rows"] += len(values)
+        present = values.notna() & (values != "")
+        counts["blank"] += int((~present).sum())
+        values = values[present]
+        valid = values.str.fullmatch(r"\d+")
+        counts["invalid"].extend(values[~valid])
+        values = values[valid]
+        before = len(ids)
+        ids.update(dict.fromkeys(values))
+        counts["duplicates"] += len(values) - (len(ids) - before)
+    return list(ids), counts
+
+
+def orders_from_export(df):
+    """{order id: order JSON, or None when it has to come from the API}, in file order."""
+    if "Name" not in df.columns or "Id" not in df.columns:
+        raise Exception("Not a Shopify orders export: the Name and Id columns are required")
+    df = df.reindex(columns=["Name"] + ORDER_COLUMNS + LINE_COLUMNS)
+    df["Id"] = df["Id"].str.strip()
+    # Fill each order's first-row values down over its line item rows
+    df[ORDER_COLUMNS] = df.groupby("Name", sort=False)[ORDER_COLUMNS].transform("first")
+    df = df[df["Id"].notna()]
+
+    quantity = pd.to_numeric(df["Lineitem quantity"], errors="coerce")
+    incomplete = (
+        df[REQUIRED].isna().any(axis=1)
+        | quantity.isna()
+        | pd.to_numeric(df["Lineitem price"], errors="coerce").isna()
+        | ~df["Shipping Country"].isin(list(COUNTRY_NAMES))
+        | (pd.to_numeric(df["Refunded Amount"], errors="coerce").fillna(0) > 0)
+        | (df["Currency"].str.strip() != SHOP_CURRENCY)
+    )
+    refetch = set(df.loc[incomplete, "Id"])
+
+    df = df.assign(
+        quantity=quantity.fillna(0).astype(int),
+        discount=pd.to_numeric(df["Lineitem discount"], errors="coerce").fillna(0),
+        # Zips are exported as '02134 so spreadsheets keep the leading zero
+        zip=df["Shipping Zip"].str.lstrip("'"),
+    ).astype(object)
+    df = df.where(df.notna(), None)
+
+    orders = {}
+    for row in df.to_dict("records"):
+        order_id = row["Id"]
+        if order_id in refetch:
+            orders[order_id] = None
+            continue
+        order = orders.get(order_id)
+        if order is None:
+            order = orders[order_id] = {
+                "id": order_id,
+                "name": row["Name"],
+                "shipping_address": {
+                    "name": row["Shipping Name"],
+                    "address1": row["Shipping Address1"],
+                    "address2": row["Shipping Address2"],
+                    "province_code": row["Shipping Province"],
+                    "city": row["Shipping City"],
+                    "zip": row["zip"],
+                    "country": COUNTRY_NAMES[row["Shipping Country"]],
+                },
+                "line_items": [],
+            }
+        status = row["Lineitem fulfillment status"]
+        order["line_items"].append({
+            "name": row["Lineitem name"],
+            "sku": row["Lineitem sku"],
+            "price": row["Lineitem price"],
+            "quantity": row["quantity"],
+            # Refunded orders are refetched, so nothing has been removed from these
+            "current_quantity": row["quantity"],
+            "fulfillment_status": status if status in ("fulfilled", "partial") else None,
+            "discount_allocations": [{"amount": f"{row['discount']:.2f}"}] if row["discount"] else [],
+        })
+    return orders
@@ -0,0 +1,180 @@
+"""
+Local index of InvoiceXpress invoices: document id / invoice number -> reference (the order number).
+
+    conn = invoice_index.get_shared_connection()
+    invoice_index.refresh_if_stale(conn)
+    invoice_index.Resolver(conn).reference_for("FT LuxmiiSequence_12.pdf")  # -> "13594"
+
+create_invoice records each invoice it makes, and refresh lists recent invoices
+from the API (rate limited like invoice_pdfs) to pick up numbers given at
+finalization. Rename Invoices names files from it without reading the PDFs.
+"""
+import datetime
+import functools
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from throttle import RateLimiter
+
+INDEX_DB = os.path.join("cache", "invoice_index.db")
+# The Rename Invoices page re-lists recent invoices when the index is older than this
+REFRESH_SECONDS = int(os.getenv("INVOICE_INDEX_REFRESH_SECONDS", "3600"))
+# How far back the first listing goes
+INITIAL_DAYS = int(os.getenv("INVOICE_INDEX_INITIAL_DAYS", "365"))
+# Later listings go back this far before the last one: a draft keeps its date when it is
+# finalized, so one finalized within this many days still gets its number indexed
+OVERLAP_DAYS = int(os.getenv("INVOICE_INDEX_OVERLAP_DAYS", "31"))
+LISTED_STATUSES = ["final", "sent", "settled", "canceled"]
+
+_write_lock = threading.Lock()
+_refresh_lock = threading.Lock()
+_refreshing = False
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS invoices (
+    id INTEGER PRIMARY KEY,
+    number INTEGER,
+    series TEXT,
+    reference TEXT NOT NULL,
+    date TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_invoices_number ON invoices(number, series);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def get_connection(path=INDEX_DB):
+    """Open (and create if needed) the invoice index."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+    return conn
+
+
+@functools.lru_cache(maxsize=None)
+def get_shared_connection():
+    """One connection per process, shared by the pages and functions.py."""
+    return get_connection()
+
+
+def _sequence(sequence_number):
+    """(number, series) from "12/LuxmiiSequence"; (None, None) for drafts, which have no number yet."""
+    parts = str(sequence_number or "").split("/")
+    if len(parts) != 2:
+        return None, None
+    number, series = parts if parts[0].isdigit() else parts[::-1]
+    return (int(number), series) if number.isdigit() else (None, None)
+
+
+def record_invoices(conn, invoices):
+    """Add or update invoices as InvoiceXpress returns them (create response or listing)."""
+    rows = []
+    for invoice in invoices:
+        if not invoice.get("id") or not invoice.get("reference"):
+            continue
+        number, series = _sequence(invoice.get("sequence_number"))
+        rows.append((invoice["id"], number, series, str(invoice["reference"]).lstrip("#"), invoice.get("date")))
+    with _write_lock, conn:
+        # A draft recorded at creation keeps its number once a listing has seen it finalized
+        conn.executemany(
+            """INSERT INTO invoices (id, number, series, reference, date) VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(id) DO UPDATE SET number = COALESCE(excluded.number, number),
+                   series = COALESCE(excluded.series, series), reference = excluded.reference,
+                   date = excluded.date""",
+            rows,
+        )
+    return len(rows)
+
+
+def refresh(conn, days=None):
+    """List invoices since the last refresh (or the last `days`) and add them; returns how many were seen."""
+    import invoice_pdfs  # here, since invoice_pdfs -> functions records into this index
+
+    today = datetime.date.today()
+    last = conn.execute("SELECT value FROM meta WHERE key = 'listed_on'").fetchone()
+    if days is not None or last is None:
+        since = today - datetime.timedelta(days=days if days is not None else INITIAL_DAYS)
+    else:
+        since = datetime.date.fromisoformat(last[0]) - datetime.timedelta(days=OVERLAP_DAYS)
+    limiter = RateLimiter(invoice_pdfs.INVOICE_PDF_RATE, per=60.0)
+    invoices = invoice_pdfs.list_invoices(since, today, statuses=LISTED_STATUSES, limiter=limiter)
+    record_invoices(conn, invoices)
+    with _write_lock, conn:
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('listed_on', ?)", (today.isoformat(),))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('listed_at', ?)", (str(time.time()),))
+    return len(invoices)
+
+
+def is_stale(conn, max_age=REFRESH_SECONDS):
+    row = conn.execute("SELECT value FROM meta WHERE key = 'listed_at'").fetchone()
+    return row is None or time.time() - float(row[0]) > max_age
+
+
+def refresh_if_stale(conn, max_age=REFRESH_SECONDS):
+    return refresh(conn) if is_stale(conn, max_age) else 0
+
+
+def refresh_in_background(conn, max_age=REFRESH_SECONDS):
+    """
+    refresh_if_stale on a daemon thread, one at a time per process, so a page doesn't
+    wait on the listing (the first one covers INITIAL_DAYS). Returns True if it started one.
+    """
+    global _refreshing
+    with _refresh_lock:
+        if _refreshing or not is_stale(conn, max_age):
+            return False
+        _refreshing = True
+
+    def run():
+        global _refreshing
+        try:
+            print(f"Invoice index: {refresh(conn)} invoices listed")
+        except Exception as e:
+            print(f"Invoice index refresh failed: {e}")
+        finally:
+            with _refresh_lock:
+                _refreshing = False
+
+    threading.Thread(target=run, daemon=True, name="invoice-index-refresh").start()
+    return True
+
+
+class Resolver:
+    """
+    In-memory view of the index for renaming a batch of files: reference_for(file name) is a
+    dict lookup on the invoice number (with its series in the name) or the document id.
+    """
+
+    def __init__(self, conn):
+        rows = conn.execute("SELECT id, number, series, reference FROM invoices").fetchall()
+        self.by_id = {str(r["id"]): r["reference"] for r in rows}
+        self.by_number = {(r["number"], r["series"].lower()): r["reference"] for r in rows if r["number"] is not None}
+        series = {r["series"] for r in rows if r["series"]}
+        # Longest first so "LuxmiiSequence2" isn't read as "LuxmiiSequence"
+        self.series = [
+            (s.lower(), re.compile(rf"(?<![A-Za-z]){re.escape(s)}(?![A-Za-z])", re.IGNORECASE))
+            for s in sorted(series, key=len, reverse=True)
+        ]
+
+    def reference_for(self, file_name):
+        """Order number for an InvoiceXpress file name, or None when the name doesn't identify a known invoice."""
+        stem = os.path.splitext(os.path.basename(file_name))[0]
+        numbers = re.findall(r"\d+", stem)
+        for number in numbers:
+            if number in self.by_id:
+                return self.by_id[number]
+        for series, pattern in self.series:
+            if pattern.search(stem):
+                for number in numbers:
+                    reference = self.by_number.get((int(number), series))
+                    if reference:
+                        return reference
+                break
+        return None
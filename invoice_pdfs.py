@@ -0,0 +1,159 @@
+"""
+Invoice PDFs straight from InvoiceXpress, already named by order.
+
+    invoices = invoice_pdfs.list_invoices(date(2025, 1, 1), date(2025, 1, 31))
+    written, failed = invoice_pdfs.export_zip(invoices, "invoices.zip")
+
+Lists invoices through the API (by date, optionally one sequence), asks for
+each PDF with at most INVOICE_PDF_RATE calls a minute across a few workers,
+and writes every PDF into the ZIP as {reference}.pdf. The reference is the
+order number transform_to_second_format put on the invoice, so no PDF text
+extraction is needed.
+
+rename_zip does the same naming for a ZIP downloaded by hand: from the invoice
+index when it knows the file, otherwise from the PDF text.
+"""
+import io
+import os
+import re
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from pypdf import PdfReader
+
+import functions
+from instrumentation import span
+from throttle import RateLimiter
+
+INVOICE_PDF_RATE = int(os.getenv("INVOICE_PDF_RATE", "100"))  # InvoiceXpress API calls per minute
+FINAL_STATUSES = ["final", "sent", "settled"]  # drafts and cancelled invoices have no PDF to export
+
+
+def _get(url, params, limiter=None, max_retries=5):
+    """GET on the InvoiceXpress API with the api_key, retrying 429s and 5xx with backoff."""
+    params = dict(params, api_key=functions.INVOICEEXPRESS_KEY)
+    for attempt in range(max_retries + 1):
+        if limiter:
+            limiter.acquire()
+        response = requests.get(url, params=params, headers={"accept": "application/json"})
+        if response.status_code != 429 and response.status_code < 500:
+            response.raise_for_status()
+            return response
+        if attempt == max_retries:
+            response.raise_for_status()
+        time.sleep(2 ** attempt)
+
+
+def list_invoices(date_from, date_to, sequence=None, statuses=FINAL_STATUSES, limiter=None, per_page=50):
+    """Invoices dated date_from..date_to (dates), newest first; `sequence` keeps one series, e.g. "LuxmiiSequence"."""
+    params = {
+        "date[from]": date_from.strftime("%d/%m/%Y"),
+        "date[to]": date_to.strftime("%d/%m/%Y"),
+        "status[]": statuses,
+        "type[]": "Invoice",
+        "per_page": per_page,
+    }
+    invoices = []
+    page = 1
+    while True:
+        data = _get(f"{functions.INVOICEXPRESS_BASE_URL}/invoices.json", dict(params, page=page), limiter).json()
+        invoices.extend(data.get("invoices", []))
+        if page >= data.get("pagination", {}).get("total_pages", 1):
+            break
+        page += 1
+    if sequence:
+        # sequence_number is "<number>/<series>"
+        invoices = [i for i in invoices if str(i.get("sequence_number", "")).endswith(f"/{sequence}")]
+    return invoices
+
+
+def fetch_pdf(invoice_id, limiter=None, max_polls=10):
+    """PDF bytes of one invoice; InvoiceXpress answers 202 until it has generated the file."""
+    for poll in range(max_polls):
+        response = _get(f"{functions.INVOICEXPRESS_BASE_URL}/api/pdf/{invoice_id}.json", {"second_copy": "false"}, limiter)
+        if response.status_code == 200:
+            # The file itself comes from storage, outside the API rate limit
+            pdf = requests.get(response.json()["output"]["pdfUrl"])
+            pdf.raise_for_status()
+            return pdf.content
+        time.sleep(min(1 + poll, 5))
+    raise Exception(f"PDF for invoice {invoice_id} still not ready after {max_polls} polls")
+
+
+def pdf_name(invoice):
+    """{reference}.pdf, or the sequence number when the invoice has no reference."""
+    name = invoice.get("reference") or str(invoice.get("sequence_number") or invoice["id"])
+    return re.sub(r"[^\w.-]", "_", name.lstrip("#")) + ".pdf"
+
+
+def export_zip(invoices, fileobj, concurrency=4, rate=INVOICE_PDF_RATE, progress=None):
+    """
+    Fetch the invoices' PDFs concurrently and write them to a ZIP (path or file object).
+    Returns (written file names, [(invoice, error)]); progress(done, total) is called after each invoice.
+    """
+    limiter = RateLimiter(rate, per=60.0)
+    written, failed = [], []
+    # PDFs are already compressed, so they are stored as is
+    with zipfile.ZipFile(fileobj, "w", zipfile.ZIP_STORED) as zf, ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(fetch_pdf, invoice["id"], limiter): invoice for invoice in invoices}
+        for done, future in enumerate(as_completed(futures), 1):
+            invoice = futures[future]
+            try:
+                pdf = future.result()
+            except Exception as e:
+                failed.append((invoice, e))
+            else:
+                name = pdf_name(invoice)
+                if name in written:
+                    # Same reference on two invoices (e.g. a re-issued one): keep both
+                    name = f"{name[:-4]}-{invoice['id']}.pdf"
+                zf.writestr(name, pdf)
+                written.append(name)
+            if progress:
+                progress(done, len(invoices))
+    return written, failed
+
+
+def reference_from_pdf(data):
+    """Order number printed on an invoice PDF ("Order No.:" or "Reference"), or None."""
+    with span("pdf: extract text", bytes_in=len(data)):
+        try:
+            reader = PdfReader(io.BytesIO(data))
+            text = "".join(page.extract_text() + "\n" for page in reader.pages)
+        except Exception as e:
+            print(f"Could not read PDF: {e}")
+            return None
+    found = re.findall(r'(?:Order No.:\n#*|Reference\n#)(\d+)', text)
+    return found[0] if found else None
+
+
+def rename_zip(src, dest, resolver=None):
+    """
+    Copy the files of an InvoiceXpress ZIP (path or file object) into a new ZIP at `dest`,
+    named {order number}.pdf. resolver (invoice_index.Resolver) names files without reading
+    them; files neither can name keep their own name. Returns (order numbers, how many the index named).
+    """
+    files = {}
+    orders, from_index = [], 0
+    with zipfile.ZipFile(src) as zin:
+        for info in zin.infolist():
+            name = os.path.basename(info.filename)
+            if info.is_dir() or name.startswith("."):
+                continue
+            data = zin.read(info)
+            reference = resolver.reference_for(name) if resolver else None
+            if reference:
+                from_index += 1
+            else:
+                reference = reference_from_pdf(data)
+            if reference:
+                orders.append(reference)
+                name = f"{reference}.pdf"
+            # A later file with the same order number replaces the earlier one
+            files[name] = data
+    with span("pdf: zip output"), zipfile.ZipFile(dest, "w", zipfile.ZIP_DEFLATED) as zout:
+        for name, data in files.items():
+            zout.writestr(name, data)
+    return orders, from_index
@@ -0,0 +1,322 @@
+"""
+Local stand-ins for InvoiceXpress, the Jasmin invoicing service and the exchange rate API.
+
+    python invoicing_simulator.py --port 8801 --latency 0.3 --rate-limit 100 --cold-start 20
+
+then run the app (or benchmarks/bench_invoicing.py) with
+INVOICEXPRESS_BASE_URL, JASMIN_BASE_URL and EXCHANGE_RATE_API_BASE set to
+http://localhost:8801.
+
+InvoiceXpress: POST /invoices.json (validates the transform_to_second_format
+payload), GET /invoices.json (date/status filters, paged), PUT
+/invoices/{id}/change-state.json, GET /api/pdf/{id}.json (202 while the PDF
+is being generated, then its pdfUrl), PUT/GET /clients/{id}.json,
+GET /sequences.json.
+Jasmin: GET /?orderid=... and /production?orderid=...
+Exchange rates: GET /v6/{key}/latest/AUD
+"""
+import argparse
+import collections
+import datetime
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+INVOICE_FIELDS = ["date", "due_date", "reference", "observations", "client", "items"]
+CLIENT_FIELDS = ["name", "code", "address", "city", "postal_code", "country"]
+ITEM_FIELDS = ["name", "description", "unit_price", "quantity"]
+CLIENT_UPDATE_FIELDS = ["name", "code", "address", "city", "postal_code"]
+
+
+def validate_invoice(payload):
+    """Return a list of errors for an InvoiceXpress invoice payload (empty when valid)."""
+    invoice = payload.get("invoice") if isinstance(payload, dict) else None
+    if not isinstance(invoice, dict):
+        return ["invoice is missing"]
+    errors = [f"invoice.{f} is missing" for f in INVOICE_FIELDS if f not in invoice]
+    client = invoice.get("client") or {}
+    errors += [f"invoice.client.{f} is missing" for f in CLIENT_FIELDS if not client.get(f)]
+    items = invoice.get("items") or []
+    if not items:
+        errors.append("invoice.items can't be empty")
+    for i, item in enumerate(items):
+        errors += [f"invoice.items[{i}].{f} is missing" for f in ITEM_FIELDS if item.get(f) is None]
+        if isinstance(item.get("unit_price"), (int, float)) and item["unit_price"] < 0:
+            errors.append(f"invoice.items[{i}].unit_price must be positive")
+    return errors
+
+
+class ServiceState:
+    """Counters, rate limit and cold-start bookkeeping shared by all request threads."""
+
+    def __init__(self, latency=0.0, jitter=0.0, rate_limit=0, rate_window=60.0,
+                 cold_start=0.0, idle_timeout=900.0, error_rate=0.0, seed=1):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit = rate_limit
+        self.rate_window = rate_window
+        self.cold_start = cold_start
+        self.idle_timeout = idle_timeout
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.recent = collections.deque()
+        self.last_request = None
+        self.warm_at = 0.0
+        self.invoice_ids = itertools.count(90_000_001)
+        self.sequence_numbers = itertools.count(1)
+        self.invoices = {}
+        self.pdf_requested = set()
+        self.client_ids = itertools.count(50_000_001)
+        self.clients = {}
+        self.calls = collections.Counter()
+
+    def admit(self, service):
+        """
+        Apply cold start, rate limit, latency and injected errors.
+        Returns None to go ahead, or a (status, body) to answer with instead.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.calls[service] += 1
+            # A sleeping service spins up on the first request after idling
+            if self.cold_start and (self.last_request is None or now - self.last_request > self.idle_timeout):
+                self.warm_at = now + self.cold_start
+            self.last_request = now
+            wait = max(0.0, self.warm_at - now)
+
+            if self.rate_limit:
+                while self.recent and now - self.recent[0] > self.rate_window:
+                    self.recent.popleft()
+                if len(self.recent) >= self.rate_limit:
+                    self.calls["throttled"] += 1
+                    return 429, {"errors": [{"error": "Too many requests"}]}
+                self.recent.append(now)
+
+            delay = max(0.0, self.latency + self.random.uniform(-self.jitter, self.jitter))
+            failed = self.random.random() < self.error_rate
+        time.sleep(wait + delay)
+        if failed:
+            self.calls["errors"] += 1
+            return 500, {"errors": [{"error": "Internal Server Error"}]}
+        return None
+
+
+def list_invoices(state, query):
+    """GET /invoices.json: filtered by date[from]/date[to] (dd/mm/yyyy) and status[], newest first, paged."""
+    def day(value):
+        return datetime.datetime.strptime(value, "%d/%m/%Y").date()
+
+    invoices = sorted(state.invoices.values(), key=lambda i: i["id"], reverse=True)
+    if "date[from]" in query:
+        invoices = [i for i in invoices if day(i["date"]) >= day(query["date[from]"][0])]
+    if "date[to]" in query:
+        invoices = [i for i in invoices if day(i["date"]) <= day(query["date[to]"][0])]
+    if "status[]" in query:
+        invoices = [i for i in invoices if i["status"] in query["status[]"]]
+    per_page = int((query.get("per_page") or ["10"])[0])
+    page = int((query.get("page") or ["1"])[0])
+    total_pages = max(1, -(-len(invoices) // per_page))
+    return {
+        "invoices": invoices[(page - 1) * per_page:page * per_page],
+        "pagination": {"total_entries": len(invoices), "current_page": page,
+                       "total_pages": total_pages, "per_page": per_page},
+    }
+
+
+def invoice_pdf(invoice):
+    """A one-page PDF with the invoice number and the reference lines the Rename Invoices page looks for."""
+    lines = [f"Invoice {invoice['sequence_number']}", "Reference", f"#{invoice['reference']}"]
+    text = "BT /F1 12 Tf 72 720 Td 14 TL " + " ".join(f"({line}) '" for line in lines) + " ET"
+    objects = [
+        "<< /Type /Catalog /Pages 2 0 R >>",
+        "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] /Contents 4 0 R "
+        "/Resources << /Font << /F1 5 0 R >> >> >>",
+        f"<< /Length {len(text)} >>\nstream\n{text}\nendstream",
+        "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    out = "%PDF-1.4\n"
+    offsets = []
+    for n, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{n} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+
+class InvoicingHandler(BaseHTTPRequestHandler):
+    state = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=None, content_type="application/json"):
+        if body is None:
+            data = b""
+        elif isinstance(body, str):
+            data = body.encode()
+        elif isinstance(body, bytes):
+            data = body
+        else:
+            data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"null")
+        except ValueError:
+            return None
+
+    def _route(self, method):
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        path = parsed.path
+        state = type(self).state
+
+        if m := re.fullmatch(r"/v6/[^/]+/latest/(\w+)", path):
+            # Separate API: not subject to the invoicing latency or rate limit
+            with state.lock:
+                state.calls["exchange_rate"] += 1
+            return self._send(200, {"result": "success", "base_code": m.group(1),
+                                    "conversion_rates": {"EUR": 0.6, "AUD": 1.0, "USD": 0.65, "GBP": 0.5}})
+
+        if path in ("/", "/production") and method == "GET":
+            rejected = state.admit("jasmin")
+            if rejected:
+                return self._send(rejected[0], json.dumps(rejected[1]), "text/plain")
+            order_id = (query.get("orderid") or [""])[0]
+            if not order_id.isdigit():
+                return self._send(400, "Missing orderid", "text/plain")
+            account = "production" if path == "/production" else "test"
+            return self._send(200, f"Invoice created for order {order_id} ({account})", "text/plain")
+
+        if (m := re.fullmatch(r"/pdfs/(\d+)\.pdf", path)) and int(m.group(1)) in state.invoices:
+            # Signed storage URL handed out by /api/pdf: no api_key, not rate limited
+            return self._send(200, invoice_pdf(state.invoices[int(m.group(1))]), "application/pdf")
+
+        if "api_key" not in query:
+            return self._send(401, {"errors": [{"error": "api_key is missing"}]})
+        rejected = state.admit("invoicexpress")
+        if rejected:
+            return self._send(*rejected)
+
+        if path == "/invoices.json" and method == "POST":
+            payload = self._read_json()
+            errors = validate_invoice(payload)
+            if errors:
+                return self._send(422, {"errors": [{"error": e} for e in errors]})
+            with state.lock:
+                invoice_id = next(state.invoice_ids)
+                client = dict(payload["invoice"]["client"])
+                client["id"] = next(state.client_ids)
+                state.clients[client["id"]] = client
+            invoice = dict(payload["invoice"], id=invoice_id, status="draft", sequence_number="draft", client=client)
+            with state.lock:
+                state.invoices[invoice_id] = invoice
+            return self._send(201, {"invoice": invoice})
+
+        if path == "/invoices.json" and method == "GET":
+            return self._send(200, list_invoices(state, query))
+
+        if (m := re.fullmatch(r"/invoices/(\d+)/change-state\.json", path)) and method == "PUT":
+            invoice = state.invoices.get(int(m.group(1)))
+            if invoice is None:
+                return self._send(404, {"errors": [{"error": "Invoice not found"}]})
+            if ((self._read_json() or {}).get("invoice") or {}).get("state") != "finalized":
+                return self._send(422, {"errors": [{"error": "Only finalizing is supported"}]})
+            with state.lock:
+                invoice.update(status="final", sequence_number=f"{next(state.sequence_numbers)}/{invoice['sequence_id']}")
+            return self._send(200, {"invoice": invoice})
+
+        if m := re.fullmatch(r"/api/pdf/(\d+)\.json", path):
+            invoice_id = int(m.group(1))
+            invoice = state.invoices.get(invoice_id)
+            if invoice is None:
+                return self._send(404, {"errors": [{"error": "Document not found"}]})
+            if invoice["status"] == "draft":
+                return self._send(422, {"errors": [{"error": "Drafts have no PDF"}]})
+            with state.lock:
+                ready = invoice_id in state.pdf_requested
+                state.pdf_requested.add(invoice_id)
+            if not ready:
+                return self._send(202)
+            return self._send(200, {"output": {"pdfUrl": f"http://{self.headers['Host']}/pdfs/{invoice_id}.pdf"}})
+
+        if m := re.fullmatch(r"/clients/(\d+)\.json", path):
+            client_id = int(m.group(1))
+            if client_id not in state.clients:
+                return self._send(404, {"errors": [{"error": "Client not found"}]})
+            if method == "PUT":
+                payload = self._read_json() or {}
+                client = payload.get("client") or {}
+                missing = [f for f in CLIENT_UPDATE_FIELDS if f not in client]
+                if missing:
+                    return self._send(422, {"errors": [{"error": f"client.{f} is missing"} for f in missing]})
+                with state.lock:
+                    state.clients[client_id].update(client)
+                return self._send(200)
+            return self._send(200, {"client": state.clients[client_id]})
+
+        if path == "/sequences.json":
+            return self._send(200, {"sequences": [{"id": 1, "serie": "LuxmiiSequence", "default_sequence": True}]})
+
+        self._send(404, {"errors": [{"error": "Not Found"}]})
+
+    def do_GET(self):
+        self._route("GET")
+
+    def do_POST(self):
+        self._route("POST")
+
+    def do_PUT(self):
+        self._route("PUT")
+
+
+def make_server(state, port=8801):
+    """Build a ThreadingHTTPServer around `state`; call serve_forever() to run it."""
+    handler = type("Handler", (InvoicingHandler,), {"state": state})
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def start_in_background(state, port=0):
+    """Start the stand-in on a daemon thread; returns (server, base_url)."""
+    server = make_server(state, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8801)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=int, default=0, help="Requests allowed per window (0 = unlimited)")
+    parser.add_argument("--rate-window", type=float, default=60.0)
+    parser.add_argument("--cold-start", type=float, default=0.0, help="Spin-up delay after idling (s)")
+    parser.add_argument("--idle-timeout", type=float, default=900.0)
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 500")
+    args = parser.parse_args()
+
+    state = ServiceState(args.latency, args.jitter, args.rate_limit, args.rate_window,
+                         args.cold_start, args.idle_timeout, args.error_rate)
+    server = make_server(state, args.port)
+    print(f"Invoicing stand-ins on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Process-wide performance metrics in Prometheus text format.
+
+Aggregates every span from instrumentation.py across all sessions of the
+Streamlit process: per page / service counters, latency histograms, bytes,
+429s, Shopify call-limit headroom, plus process CPU, memory and threads.
+
+Exposed two ways once `install()` has run (page_run does it):
+  - METRICS_FILE (default logs/metrics.prom), rewritten every METRICS_FLUSH_SECONDS
+  - http://127.0.0.1:METRICS_PORT/metrics (default 9464; set METRICS_PORT= to disable)
+"""
+import os
+import resource
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import instrumentation
+
+METRICS_FILE = os.getenv("METRICS_FILE", os.path.join("logs", "metrics.prom"))
+METRICS_PORT = os.getenv("METRICS_PORT", "9464")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "15"))
+
+# Latency histogram bucket bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_lock = threading.Lock()
+_installed = False
+_started_at = time.time()
+
+_calls = {}        # (page, service, name) -> [calls, errors]
+_histograms = {}   # (page, service) -> [bucket counts..., sum, count]
+_bytes = {}        # (service, direction) -> bytes
+_throttled = {}    # service -> 429 responses
+_page_runs = {}    # page -> script runs
+_call_limit = {}   # "used" / "max" / "min_headroom" from X-Shopify-Shop-Api-Call-Limit
+
+
+def observe(record):
+    """Fold one finished span (see instrumentation.span) into the aggregates."""
+    page = record.get("page") or "background"
+    service = record.get("service") or "local"
+    seconds = record["ms"] / 1000
+    status = record.get("status") or 0
+    failed = bool(record.get("error")) or status >= 400
+
+    with _lock:
+        counts = _calls.setdefault((page, service, record["name"]), [0, 0])
+        counts[0] += 1
+        counts[1] += failed
+
+        histogram = _histograms.setdefault((page, service), [0] * (len(BUCKETS) + 2))
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram[i] += 1
+        histogram[-2] += seconds
+        histogram[-1] += 1
+
+        for direction in ("bytes_in", "bytes_out"):
+            if record.get(direction):
+                key = (service, direction[6:])
+                _bytes[key] = _bytes.get(key, 0) + record[direction]
+        if status == 429:
+            _throttled[service] = _throttled.get(service, 0) + 1
+
+        if record.get("call_limit"):
+            used, limit = (int(x) for x in record["call_limit"].split("/"))
+            _call_limit["used"] = used
+            _call_limit["max"] = limit
+            _call_limit["min_headroom"] = min(_call_limit.get("min_headroom", limit), limit - used)
+
+
+def count_page_run(page):
+    with _lock:
+        _page_runs[page] = _page_runs.get(page, 0) + 1
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def render():
+    """The current metrics as Prometheus text exposition format."""
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+
+    with _lock:
+        metric("luxmii_page_runs_total", "counter", "Streamlit script runs per page.",
+               [f"luxmii_page_runs_total{_labels(page=p)} {n}" for p, n in sorted(_page_runs.items())])
+        metric("luxmii_calls_total", "counter", "Timed calls and stages per page, service and endpoint.",
+               [f"luxmii_calls_total{_labels(page=p, service=s, name=n)} {c[0]}"
+                for (p, s, n), c in sorted(_calls.items())])
+        metric("luxmii_call_errors_total", "counter", "Calls that raised or returned HTTP >= 400.",
+               [f"luxmii_call_errors_total{_labels(page=p, service=s, name=n)} {c[1]}"
+                for (p, s, n), c in sorted(_calls.items()) if c[1]])
+
+        samples = []
+        for (p, s), h in sorted(_histograms.items()):
+            for bound, count in zip(BUCKETS, h):
+                samples.append(f"luxmii_call_duration_seconds_bucket{_labels(page=p, service=s, le=bound)} {count}")
+            samples.append(f"luxmii_call_duration_seconds_bucket{_labels(page=p, service=s, le='+Inf')} {h[-1]}")
+            samples.append(f"luxmii_call_duration_seconds_sum{_labels(page=p, service=s)} {h[-2]:.6f}")
+            samples.append(f"luxmii_call_duration_seconds_count{_labels(page=p, service=s)} {h[-1]}")
+        metric("luxmii_call_duration_seconds", "histogram", "Latency of timed calls per page and service.", samples)
+
+        metric("luxmii_bytes_total", "counter", "Payload bytes per service and direction.",
+               [f"luxmii_bytes_total{_labels(service=s, direction=d)} {n}" for (s, d), n in sorted(_bytes.items())])
+        metric("luxmii_throttled_total", "counter", "HTTP 429 responses per service.",
+               [f"luxmii_throttled_total{_labels(service=s)} {n}" for s, n in sorted(_throttled.items())])
+
+        if _call_limit:
+            metric("luxmii_shopify_call_limit_used", "gauge", "Shopify REST bucket fill at the last call.",
+                   [f"luxmii_shopify_call_limit_used {_call_limit['used']}"])
+            metric("luxmii_shopify_call_limit_max", "gauge", "Shopify REST bucket size.",
+                   [f"luxmii_shopify_call_limit_max {_call_limit['max']}"])
+            metric("luxmii_shopify_call_limit_headroom", "gauge", "Calls left in the Shopify bucket at the last call.",
+                   [f"luxmii_shopify_call_limit_headroom {_call_limit['max'] - _call_limit['used']}"])
+            metric("luxmii_shopify_call_limit_min_headroom", "gauge", "Lowest headroom seen since start.",
+                   [f"luxmii_shopify_call_limit_min_headroom {_call_limit['min_headroom']}"])
+
+    # ru_maxrss is in KB on Linux
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    metric("process_cpu_seconds_total", "counter", "User and system CPU time.",
+           [f"process_cpu_seconds_total {usage.ru_utime + usage.ru_stime:.3f}"])
+    metric("process_max_resident_memory_bytes", "gauge", "Peak resident memory.",
+           [f"process_max_resident_memory_bytes {usage.ru_maxrss * 1024}"])
+    metric("process_threads", "gauge", "Live Python threads.", [f"process_threads {threading.active_count()}"])
+    metric("process_start_time_seconds", "gauge", "Process start, unix time.",
+           [f"process_start_time_seconds {_started_at:.0f}"])
+    return "\n".join(lines) + "\n"
+
+
+def write_file(path=METRICS_FILE):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(render())
+    os.replace(tmp_path, path)
+
+
+def _flush_loop():
+    while True:
+        time.sleep(METRICS_FLUSH_SECONDS)
+        try:
+            write_file()
+        except OSError as e:
+            print(f"Could not write metrics file: {e}")
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split("?")[0] not in ("/", "/metrics"):
+            self.send_response(404)
+            self.end_headers()
+            return
+        data = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def start_server(port):
+    """Serve /metrics on localhost from a daemon thread."""
+    server = ThreadingHTTPServer(("127.0.0.1", int(port)), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def install():
+    """Start collecting spans and exposing metrics; safe to call on every rerun."""
+    global _installed
+    with _lock:
+        if _installed:
+            return
+        _installed = True
+    instrumentation.add_listener(observe)
+    if METRICS_FILE:
+        threading.Thread(target=_flush_loop, daemon=True).start()
+    if METRICS_PORT:
+        try:
+            start_server(METRICS_PORT)
+            print(f"Metrics on http://127.0.0.1:{METRICS_PORT}/metrics")
+        except OSError as e:
+            print(f"Metrics endpoint not started on port {METRICS_PORT}: {e}")
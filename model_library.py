@@ -0,0 +1,175 @@
+import io
+import json
+import os
+import shutil
+import threading
+
+from PIL import Image, ImageOps
+
+from atomic import atomic_open
+from instrumentation import span
+
+# Model reference photos live in models/<ModelName>/*.png|jpg|...
+MODELS_DIR = "./models"
+# Derived previews, pre-encoded reference payloads and the scan manifest
+MODEL_CACHE_DIR = os.path.join("cache", "models")
+MANIFEST_FILE = os.path.join(MODEL_CACHE_DIR, "manifest.json")
+
+IMAGE_EXTENSIONS = ('.png', '.jpg', '.jpeg', '.webp')
+MAX_REFERENCES = 5
+PREVIEW_SIZE = 400       # longest side of the picker previews
+REFERENCE_SIZE = 1024    # longest side of the images sent to Gemini
+REFERENCE_QUALITY = 90
+
+_lock = threading.Lock()
+_manifest = None
+
+
+def _dir_signature(models_dir):
+    # Adding/removing a model or one of its photos changes these mtimes
+    signature = {".": os.stat(models_dir).st_mtime_ns}
+    for entry in os.scandir(models_dir):
+        if entry.is_dir():
+            signature[entry.name] = entry.stat().st_mtime_ns
+    return signature
+
+
+def _scan(models_dir):
+    models = {}
+    for entry in os.scandir(models_dir):
+        if entry.is_dir():
+            images = []
+            for img in os.scandir(entry.path):
+                if img.is_file() and img.name.lower().endswith(IMAGE_EXTENSIONS):
+                    images.append({"path": img.path, "mtime_ns": img.stat().st_mtime_ns})
+            if images:
+                models[entry.name] = {"images": sorted(images, key=lambda i: i["path"])}
+    return models
+
+
+def _load_manifest():
+    global _manifest
+    if _manifest is None and os.path.exists(MANIFEST_FILE):
+        try:
+            with open(MANIFEST_FILE, 'r') as f:
+                _manifest = json.load(f)
+        except (OSError, ValueError):
+            _manifest = None
+    return _manifest
+
+
+def _save_manifest(manifest):
+    global _manifest
+    os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+    with atomic_open(MANIFEST_FILE, 'w') as f:
+        json.dump(manifest, f)
+    _manifest = manifest
+
+
+def _encode(img, size, quality):
+    copy = img.copy()
+    copy.thumbnail((size, size))
+    buffer = io.BytesIO()
+    copy.save(buffer, format='JPEG', quality=quality)
+    return buffer.getvalue()
+
+
+def _build_assets(name, model):
+    """Write previews and size-normalized JPEG references for one model."""
+    out_dir = os.path.join(MODEL_CACHE_DIR, name)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    os.makedirs(out_dir, exist_ok=True)
+
+    previews, references = [], []
+    for i, image in enumerate(model["images"][:MAX_REFERENCES]):
+        with span("models: encode reference", model=name), Image.open(image["path"]) as img:
+            img = ImageOps.exif_transpose(img).convert('RGB')
+            preview_path = os.path.join(out_dir, f"preview_{i}.jpg")
+            reference_path = os.path.join(out_dir, f"reference_{i}.jpg")
+            with open(preview_path, 'wb') as f:
+                f.write(_encode(img, PREVIEW_SIZE, 85))
+            with open(reference_path, 'wb') as f:
+                f.write(_encode(img, REFERENCE_SIZE, REFERENCE_QUALITY))
+        previews.append(preview_path)
+        references.append(reference_path)
+
+    model["previews"] = previews
+    model["references"] = references
+    return model
+
+
+def _is_fresh(model):
+    # Catches photos replaced in place, which don't touch the directory mtime
+    try:
+        return all(os.stat(i["path"]).st_mtime_ns == i["mtime_ns"] for i in model["images"]) \
+            and all(os.path.exists(p) for p in model.get("references", []))
+    except OSError:
+        return False
+
+
+def get_manifest(models_dir=MODELS_DIR):
+    """
+    Return the model manifest, rescanning only when the models directory changed.
+    {"signature": {...}, "models": {name: {"images", "previews", "references"}}}
+    """
+    if not os.path.exists(models_dir):
+        return {"signature": {}, "models": {}}
+
+    with _lock:
+        signature = _dir_signature(models_dir)
+        manifest = _load_manifest()
+        if manifest and manifest.get("signature") == signature:
+            return manifest
+
+        previous = (manifest or {}).get("models", {})
+        models = _scan(models_dir)
+        for name, model in models.items():
+            old = previous.get(name)
+            if old and old["images"] == model["images"] and _is_fresh(old):
+                models[name] = old
+        manifest = {"signature": signature, "models": models}
+        _save_manifest(manifest)
+        return manifest
+
+
+def list_models(models_dir=MODELS_DIR):
+    """
+    Returns a dict: {model_name: [list_of_image_paths]}
+    """
+    manifest = get_manifest(models_dir)
+    return {name: [i["path"] for i in m["images"]] for name, m in manifest["models"].items()}
+
+
+def get_model(name, models_dir=MODELS_DIR):
+    """
+    Manifest entry for a model, with previews and references built if missing or stale.
+    Returns None for an unknown model.
+    """
+    manifest = get_manifest(models_dir)
+    model = manifest["models"].get(name)
+    if model is None:
+        return None
+    if "references" not in model or not _is_fresh(model):
+        with _lock:
+            model["images"] = _scan(models_dir).get(name, model)["images"]
+            _build_assets(name, model)
+            _save_manifest(manifest)
+    return model
+
+
+def load_reference_payloads(name, models_dir=MODELS_DIR):
+    """Pre-encoded (bytes, mime_type) reference images for a model, ready to send."""
+    model = get_model(name, models_dir)
+    if model is None:
+        return []
+    payloads = []
+    for path in model["references"]:
+        with open(path, 'rb') as f:
+            payloads.append((f.read(), "image/jpeg"))
+    return payloads
+
+
+def warm_cache(models_dir=MODELS_DIR):
+    """Build previews and references for every model up front."""
+    for name in list_models(models_dir):
+        get_model(name, models_dir)
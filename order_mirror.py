@@ -0,0 +1,601 @@
+import datetime
+import difflib
+import functools
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import requests
+
+# Local SQLite mirror of Shopify orders, kept current by webhooks (see webhook_receiver.py)
+MIRROR_DB = os.path.join("cache", "order_mirror.db")
+SHOPIFY_API_BASE = os.getenv("SHOPIFY_API_BASE", "https://luxmii.com")
+API_VERSION = "2024-10"
+# Seconds between incremental syncs when start_periodic_sync is used
+SYNC_INTERVAL = int(os.getenv("ORDER_SYNC_SECONDS", "120"))
+# Opt-in: the first sync pulls the whole order history (status=any) and customer export
+# through the same call-limit bucket the live pages use
+SYNC_ENABLED = os.getenv("ORDER_MIRROR_SYNC") == "1"
+# The mirror is only read from while a sync or the webhook receiver has checked in this recently
+MAX_AGE = int(os.getenv("ORDER_MIRROR_MAX_AGE", str(3 * SYNC_INTERVAL)))
+# Cached customer stats older than this are re-read from the API on lookup
+CUSTOMER_STATS_TTL = int(os.getenv("CUSTOMER_STATS_TTL", str(6 * 3600)))
+
+_write_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY,
+    name TEXT,
+    email TEXT,
+    customer_id INTEGER,
+    created_at TEXT,
+    updated_at TEXT,
+    fulfillment_status TEXT,
+    cancelled_at TEXT,
+    closed_at TEXT,
+    order_json TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_name ON orders(name);
+CREATE INDEX IF NOT EXISTS idx_orders_email ON orders(email COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id);
+CREATE INDEX IF NOT EXISTS idx_orders_open ON orders(fulfillment_status, cancelled_at, closed_at);
+CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5(
+    name, email, customer_name, phone, tokenize='trigram'
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts_vocab USING fts5vocab(orders_fts, 'row');
+CREATE TABLE IF NOT EXISTS search_words (
+    id INTEGER PRIMARY KEY,
+    word TEXT UNIQUE NOT NULL
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_words_fts USING fts5(word, tokenize='trigram');
+CREATE VIRTUAL TABLE IF NOT EXISTS search_words_vocab USING fts5vocab(search_words_fts, 'row');
+CREATE TABLE IF NOT EXISTS fulfillment_orders (
+    order_id INTEGER PRIMARY KEY,
+    order_updated_at TEXT,
+    fulfillment_orders_json TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS customers (
+    id INTEGER PRIMARY KEY,
+    orders_count INTEGER,
+    first_order_at TEXT,
+    updated_at TEXT,
+    fetched_at REAL
+);
+CREATE TABLE IF NOT EXISTS webhook_events (
+    webhook_id TEXT PRIMARY KEY,
+    topic TEXT,
+    received_at TEXT
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def get_connection(path=MIRROR_DB):
+    """Open (and create if needed) the order mirror."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")  # the webhook receiver writes while pages read
+    conn.executescript(SCHEMA)
+    if conn.execute("SELECT COUNT(*) FROM search_words").fetchone()[0] == 0 and count_orders(conn):
+        rebuild_search_index(conn)
+    return conn
+
+
+@functools.lru_cache(maxsize=None)
+def get_shared_connection():
+    """One connection per process, shared by pages and functions.py."""
+    return get_connection()
+
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    with _write_lock, conn:
+        conn.execute(
+            "INSERT INTO meta(key, value) VALUES(?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+
+def _now():
+    return datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+
+
+def is_ready(conn, max_age=MAX_AGE):
+    """
+    True while the mirror can answer 'all open orders' questions: a backfill has run and
+    either a backfill or the webhook receiver (heartbeat) was active in the last `max_age` seconds.
+    A one-off backfill with nothing keeping it current stops being trusted after that.
+    """
+    if get_meta(conn, 'last_synced_at') is None:
+        return False
+    seen = [get_meta(conn, key) for key in ('last_synced_at', 'receiver_alive_at')]
+    newest = max(datetime.datetime.fromisoformat(v) for v in seen if v)
+    return (datetime.datetime.now(datetime.timezone.utc) - newest).total_seconds() <= max_age
+
+
+def heartbeat(conn):
+    """Called periodically by the webhook receiver: deliveries are keeping the mirror current."""
+    set_meta(conn, 'receiver_alive_at', _now())
+
+
+def count_orders(conn):
+    return conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+
+
+def upsert_order(conn, order, force=False):
+    """
+    Store an order as returned by the Admin API or an orders/* webhook.
+    An older copy never overwrites a newer one (webhooks can arrive out of order).
+    Returns True if the stored order changed.
+    """
+    customer = order.get('customer') or {}
+    with _write_lock, conn:
+        row = conn.execute("SELECT updated_at FROM orders WHERE id = ?", (order['id'],)).fetchone()
+        if row and not force and row[0] and order.get('updated_at') and order['updated_at'] < row[0]:
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO orders(id, name, email, customer_id, created_at, updated_at, "
+            "fulfillment_status, cancelled_at, closed_at, order_json) VALUES(?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                order['id'], order.get('name'), order.get('email'), customer.get('id'),
+                order.get('created_at'), order.get('updated_at'), order.get('fulfillment_status'),
+                order.get('cancelled_at'), order.get('closed_at'), json.dumps(order),
+            ),
+        )
+        _index_order(conn, order)
+        if customer.get('id') and order.get('created_at'):
+            conn.execute(
+                "UPDATE customers SET first_order_at = ? WHERE id = ? AND (first_order_at IS NULL OR first_order_at > ?)",
+                (order['created_at'], customer['id'], order['created_at']),
+            )
+        if customer.get('id') and row is None:
+            # A new order changes the customer's orders_count; expire the cached stats
+            conn.execute("UPDATE customers SET fetched_at = 0 WHERE id = ?", (customer['id'],))
+    return True
+
+
+def _search_fields(order):
+    """(name, email, customer name, phone) as indexed for search."""
+    customer = order.get('customer') or {}
+    address = order.get('shipping_address') or order.get('billing_address') or {}
+    names = {
+        ' '.join(p for p in (customer.get('first_name'), customer.get('last_name')) if p),
+        address.get('name') or '',
+    }
+    phones = {p for p in (order.get('phone'), customer.get('phone'), address.get('phone')) if p}
+    # Digits-only copies so "0412 345 678" and "+61412345678" both hit
+    phones |= {re.sub(r"\D", "", p) for p in phones}
+    # Lower-cased, as search_orders compares against lower-cased queries
+    return (
+        (order.get('name') or '').lower(),
+        (order.get('email') or customer.get('email') or '').lower(),
+        ' '.join(n for n in names if n).lower(),
+        ' '.join(phones),
+    )
+
+
+def _index_order(conn, order):
+    name, email, customer_name, phone = _search_fields(order)
+    # The FTS rowid is the order id, so replacing an entry is an indexed delete
+    conn.execute("DELETE FROM orders_fts WHERE rowid = ?", (order['id'],))
+    conn.execute(
+        "INSERT INTO orders_fts(rowid, name, email, customer_name, phone) VALUES(?, ?, ?, ?, ?)",
+        (order['id'], name, email, customer_name, phone),
+    )
+    # Distinct emails, names and phones for fuzzy matching (a few thousand rows instead of every order)
+    for word in {email, customer_name, *customer_name.split(), *phone.split()} - {''}:
+        cursor = conn.execute("INSERT OR IGNORE INTO search_words(word) VALUES(?)", (word,))
+        if cursor.rowcount:
+            conn.execute("INSERT INTO search_words_fts(rowid, word) VALUES(?, ?)", (cursor.lastrowid, word))
+
+
+def rebuild_search_index(conn):
+    """Re-index every mirrored order (used once for mirrors created before the index existed)."""
+    with _write_lock, conn:
+        conn.execute("DELETE FROM orders_fts")
+        conn.execute("DELETE FROM search_words")
+        conn.execute("DELETE FROM search_words_fts")
+        for row in conn.execute("SELECT order_json FROM orders").fetchall():
+            _index_order(conn, json.loads(row[0]))
+
+
+def upsert_orders(conn, orders):
+    return sum(upsert_order(conn, o) for o in orders)
+
+
+def get_order(conn, order_id):
+    row = conn.execute("SELECT order_json FROM orders WHERE id = ?", (order_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+
+def find_orders(conn, email=None, name=None, limit=50):
+    """Orders by customer email (case-insensitive) or order name ('#12345' or '12345'), newest first."""
+    if email:
+        rows = conn.execute(
+            "SELECT order_json FROM orders WHERE email = ? COLLATE NOCASE ORDER BY created_at DESC LIMIT ?",
+            (email.strip(), limit),
+        ).fetchall()
+    elif name:
+        name = name.strip().lstrip('#')
+        rows = conn.execute(
+            "SELECT order_json FROM orders WHERE name IN (?, ?) ORDER BY created_at DESC LIMIT ?",
+            (name, f"#{name}", limit),
+        ).fetchall()
+    else:
+        return []
+    return [json.loads(r[0]) for r in rows]
+
+
+def _orders_by_ids(conn, ids):
+    if not ids:
+        return []
+    rows = conn.execute(
+        f"SELECT id, order_json FROM orders WHERE id IN ({','.join('?' * len(ids))})", ids
+    ).fetchall()
+    by_id = {r[0]: json.loads(r[1]) for r in rows}
+    return [by_id[i] for i in ids if i in by_id]
+
+
+_term_counts = {}  # (id(conn), vocab table) -> (loaded at, {trigram: number of rows containing it})
+
+
+def _trigram_counts(conn, vocab="orders_fts_vocab"):
+    """Document frequency per indexed trigram, reloaded every SYNC_INTERVAL seconds."""
+    loaded_at, counts = _term_counts.get((id(conn), vocab), (0, None))
+    if counts is None or time.monotonic() - loaded_at > SYNC_INTERVAL:
+        counts = dict(conn.execute(f"SELECT term, doc FROM {vocab}").fetchall())
+        _term_counts[(id(conn), vocab)] = (time.monotonic(), counts)
+    return counts
+
+
+def _rarest(conn, trigrams, n):
+    # Common trigrams ("com", "@gm") have posting lists as long as the table; querying
+    # only the rarest keeps lookups in the low milliseconds. Unseen trigrams sort first.
+    counts = _trigram_counts(conn)
+    return sorted(trigrams, key=lambda t: counts.get(t, 0))[:n]
+
+
+def _fts_query(trigrams, op):
+    return f" {op} ".join('"' + t.replace('"', '""') + '"' for t in trigrams)
+
+
+def _substring_search(conn, text, limit):
+    # Trigram AND narrows the candidates, instr() confirms the substring; FTS walks rowids
+    # (= order ids) newest first, so this stops after `limit` hits
+    trigrams = {text[i:i + 3] for i in range(len(text) - 2)}
+    rows = conn.execute(
+        "SELECT rowid FROM orders_fts WHERE orders_fts MATCH ? "
+        "AND (instr(name, ?) OR instr(email, ?) OR instr(customer_name, ?) OR instr(phone, ?)) "
+        "ORDER BY rowid DESC LIMIT ?",
+        (_fts_query(_rarest(conn, trigrams, 3), "AND"), text, text, text, text, limit),
+    ).fetchall()
+    return [r[0] for r in rows]
+
+
+def _closest_words(conn, text, min_similarity, n=3):
+    """Indexed emails, names and phones most similar to `text` (typo tolerant)."""
+    counts = _trigram_counts(conn, "search_words_vocab")
+    trigrams = sorted((t for t in {text[i:i + 3] for i in range(len(text) - 2)} if t in counts), key=counts.get)
+    # Skip trigrams shared by many words (email domains); they only slow the ranking down
+    common = max(50, conn.execute("SELECT COUNT(*) FROM search_words").fetchone()[0] // 20)
+    trigrams = trigrams[:3] + [t for t in trigrams[3:] if counts[t] <= common]
+    if not trigrams:
+        return []
+    candidates = conn.execute(
+        "SELECT word FROM search_words_fts WHERE search_words_fts MATCH ? ORDER BY rank LIMIT 50",
+        (_fts_query(trigrams, "OR"),),
+    ).fetchall()
+    matcher = difflib.SequenceMatcher()
+    matcher.set_seq2(text)
+    scored = []
+    for (word,) in candidates:
+        matcher.set_seq1(word)
+        if matcher.real_quick_ratio() >= min_similarity and matcher.quick_ratio() >= min_similarity:
+            score = matcher.ratio()
+            if score >= min_similarity:
+                scored.append((score, word))
+    return [word for _, word in sorted(scored, reverse=True)[:n]]
+
+
+def search_orders(conn, query, limit=20, min_similarity=0.75):
+    """
+    Find orders by (part of) order name, email, customer name or phone, newest first.
+    When nothing contains the query, orders matching the closest indexed
+    emails / names / phones are returned, so misspelled emails still hit.
+    """
+    text = (query or '').strip().lower()
+    if re.fullmatch(r"[\d\s()+-]+", text):
+        text = re.sub(r"\D", "", text)  # phone numbers are indexed digits-only too
+    if not text:
+        return []
+    if len(text) < 3:
+        # Too short for trigrams: prefix match on the order name only
+        rows = conn.execute(
+            "SELECT id FROM orders WHERE name GLOB ? ORDER BY name DESC LIMIT ?",
+            (f"#{text.lstrip('#')}*", limit),
+        ).fetchall()
+        return _orders_by_ids(conn, [r[0] for r in rows])
+
+    ids = _substring_search(conn, text, limit)
+    if not ids:
+        for word in _closest_words(conn, text, min_similarity):
+            ids += [i for i in _substring_search(conn, word, limit) if i not in ids]
+    return _orders_by_ids(conn, ids[:limit])
+
+
+def open_unfulfilled_orders(conn):
+    """Same selection as REST orders.json?fulfillment_status=unfulfilled (open orders only)."""
+    rows = conn.execute(
+        "SELECT order_json FROM orders WHERE cancelled_at IS NULL AND closed_at IS NULL "
+        "AND (fulfillment_status IS NULL OR fulfillment_status = 'partial') ORDER BY id"
+    ).fetchall()
+    return [json.loads(r[0]) for r in rows]
+
+
+def apply_fulfillment(conn, fulfillment):
+    """Fold a fulfillments/create payload into its stored order. Returns False if the order isn't mirrored."""
+    order = get_order(conn, fulfillment.get('order_id'))
+    if order is None:
+        return False
+    fulfillments = [f for f in order.get('fulfillments') or [] if f.get('id') != fulfillment.get('id')]
+    order['fulfillments'] = fulfillments + [fulfillment]
+    # A fulfillment can ship part of a line item; only a fully shipped quantity is 'fulfilled'
+    line_items = order.get('line_items') or []
+    quantities = {i['id']: i.get('quantity') or 0 for i in line_items}
+    shipped = {}
+    for f in order['fulfillments']:
+        if f.get('status') in ('cancelled', 'error', 'failure'):
+            continue
+        for i in f.get('line_items') or []:
+            shipped[i['id']] = shipped.get(i['id'], 0) + i.get('quantity', quantities.get(i['id'], 0))
+    for item in line_items:
+        done = shipped.get(item['id'], 0)
+        item['fulfillment_status'] = 'fulfilled' if done >= item.get('quantity', 0) else ('partial' if done else None)
+    if all(i['fulfillment_status'] == 'fulfilled' for i in line_items):
+        order['fulfillment_status'] = 'fulfilled'
+    else:
+        order['fulfillment_status'] = 'partial' if shipped else None
+    order['updated_at'] = max(order.get('updated_at') or '', fulfillment.get('updated_at') or '')
+    upsert_order(conn, order, force=True)
+    return True
+
+
+def apply_refund(conn, refund):
+    """Fold a refunds/create payload into its stored order. Returns False if the order isn't mirrored."""
+    order = get_order(conn, refund.get('order_id'))
+    if order is None:
+        return False
+    refunds = [r for r in order.get('refunds') or [] if r.get('id') != refund.get('id')]
+    if len(refunds) == len(order.get('refunds') or []):
+        # First time we see this refund: take the refunded quantities off the line items
+        refunded = {}
+        for refund_item in refund.get('refund_line_items') or []:
+            refunded[refund_item['line_item_id']] = refunded.get(refund_item['line_item_id'], 0) + refund_item['quantity']
+        for item in order.get('line_items') or []:
+            if item['id'] in refunded and item.get('current_quantity') is not None:
+                item['current_quantity'] = max(0, item['current_quantity'] - refunded[item['id']])
+    order['refunds'] = refunds + [refund]
+    upsert_order(conn, order, force=True)
+    return True
+
+
+def webhook_seen(conn, webhook_id):
+    return conn.execute("SELECT 1 FROM webhook_events WHERE webhook_id = ?", (webhook_id,)).fetchone() is not None
+
+
+def mark_webhook_seen(conn, webhook_id, topic):
+    """Record a processed webhook delivery; returns False if this id was already recorded (Shopify retries)."""
+    with _write_lock, conn:
+        cursor = conn.execute(
+            "INSERT OR IGNORE INTO webhook_events(webhook_id, topic, received_at) VALUES(?, ?, ?)",
+            (webhook_id, topic, _now()),
+        )
+    return cursor.rowcount == 1
+
+
+def _headers(access_token):
+    return {"X-Shopify-Access-Token": access_token, "Content-Type": "application/json"}
+
+
+def get_fulfillment_orders(conn, order_id, access_token, base_url=None):
+    """
+    Fulfillment orders of an order, cached until the order itself changes.
+    No webhook covers them, so a miss (or a stale copy) goes to the API.
+    """
+    order_row = conn.execute("SELECT updated_at FROM orders WHERE id = ?", (order_id,)).fetchone()
+    cached = conn.execute(
+        "SELECT order_updated_at, fulfillment_orders_json FROM fulfillment_orders WHERE order_id = ?", (order_id,)
+    ).fetchone()
+    if cached and order_row and cached[0] == order_row[0]:
+        return json.loads(cached[1])
+
+    url = f"{base_url or SHOPIFY_API_BASE}/admin/api/{API_VERSION}/orders/{order_id}/fulfillment_orders.json"
+    response = requests.get(url, headers=_headers(access_token), verify=False)
+    response.raise_for_status()
+    fulfillment_orders = response.json()["fulfillment_orders"]
+    if order_row:
+        with _write_lock, conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO fulfillment_orders(order_id, order_updated_at, fulfillment_orders_json) "
+                "VALUES(?, ?, ?)",
+                (order_id, order_row[0], json.dumps(fulfillment_orders)),
+            )
+    return fulfillment_orders
+
+
+def _upsert_customers(conn, customers):
+    """Store orders_count from Admin API customer records; first_order_at comes from mirrored orders."""
+    now = time.time()
+    with _write_lock, conn:
+        conn.executemany(
+            "INSERT INTO customers(id, orders_count, first_order_at, updated_at, fetched_at) "
+            "VALUES(?, ?, (SELECT MIN(created_at) FROM orders WHERE customer_id = ?), ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET orders_count = excluded.orders_count, "
+            "updated_at = excluded.updated_at, fetched_at = excluded.fetched_at, "
+            "first_order_at = COALESCE(customers.first_order_at, excluded.first_order_at)",
+            [(c['id'], c.get('orders_count'), c['id'], c.get('updated_at'), now) for c in customers],
+        )
+
+
+def get_customer_stats(conn, customer_id, access_token, base_url=None, ttl=CUSTOMER_STATS_TTL, max_retries=3):
+    """
+    {'orders_count', 'first_order_at'} for a customer, from the cache while fresher than `ttl`.
+    Otherwise /customers/{id}.json with retries; a stale copy is used if the API stays down.
+    """
+    row = conn.execute(
+        "SELECT orders_count, first_order_at, fetched_at FROM customers WHERE id = ?", (customer_id,)
+    ).fetchone()
+    if row and row[0] is not None and time.time() - row[2] < ttl:
+        return {'orders_count': row[0], 'first_order_at': row[1]}
+
+    # orders_count was dropped from the REST customer resource after 2024-04
+    url = f"{base_url or SHOPIFY_API_BASE}/admin/api/2024-04/customers/{customer_id}.json"
+    retries = 0
+    while True:
+        try:
+            response = requests.get(url, headers=_headers(access_token), verify=False)
+            response.raise_for_status()
+            # A throttled or errored response can still be 2xx JSON without the record
+            customer = response.json().get('customer')
+            if not customer:
+                raise ValueError(f"no customer in response: {response.text[:200]}")
+            break
+        except (requests.exceptions.RequestException, ValueError) as e:
+            retries += 1
+            if retries > max_retries:
+                if row and row[0] is not None:
+                    print(f"Customer {customer_id}: API unavailable, using cached stats ({e})")
+                    return {'orders_count': row[0], 'first_order_at': row[1]}
+                raise Exception(f"Failed to fetch customer {customer_id}: {str(e)}")
+            time.sleep(2 ** retries)
+    try:
+        _upsert_customers(conn, [customer])
+    except sqlite3.Error as e:
+        # The cache is only an optimisation; the API answer is still good
+        print(f"Customer {customer_id}: could not cache stats ({e})")
+        return {'orders_count': customer.get('orders_count'), 'first_order_at': row[1] if row else None}
+    row = conn.execute("SELECT orders_count, first_order_at FROM customers WHERE id = ?", (customer_id,)).fetchone()
+    return {'orders_count': row[0], 'first_order_at': row[1]}
+
+
+def _fetch_pages(url, key, access_token, params):
+    """Generator over the `key` list of each page of a Link-paginated Admin API listing."""
+    while url:
+        response = requests.get(url, headers=_headers(access_token), params=params, verify=False)
+        response.raise_for_status()
+        yield response.json().get(key, [])
+
+        # Link header format: <https://...page_info=...>; rel="next"
+        link_header = response.headers.get('Link') or ''
+        next_link = next((l for l in link_header.split(',') if 'rel="next"' in l), None)
+        url = next_link.split(';')[0].strip('<> ') if next_link else None
+        params = {}  # already encoded in the next URL
+
+
+def fetch_orders(access_token, base_url=None, updated_at_min=None):
+    """Generator over pages of orders (any status) from the Admin API."""
+    url = f"{base_url or SHOPIFY_API_BASE}/admin/api/{API_VERSION}/orders.json"
+    params = {"limit": 250, "status": "any"}
+    if updated_at_min:
+        params["updated_at_min"] = updated_at_min
+    return _fetch_pages(url, "orders", access_token, params)
+
+
+def fetch_customers(access_token, base_url=None, updated_at_min=None):
+    """Generator over pages of customers (id, orders_count, updated_at only)."""
+    url = f"{base_url or SHOPIFY_API_BASE}/admin/api/2024-04/customers.json"
+    params = {"limit": 250, "fields": "id,orders_count,updated_at"}
+    if updated_at_min:
+        params["updated_at_min"] = updated_at_min
+    return _fetch_pages(url, "customers", access_token, params)
+
+
+def backfill(conn, access_token, base_url=None, full=False):
+    """
+    Load orders the webhooks haven't delivered (first run, or after downtime).
+    Incremental from the last backfill unless `full`. Returns the number of orders written.
+    """
+    if not access_token:
+        raise ValueError("Missing Shopify credentials")
+    started_at = _now()
+    since = None if full else get_meta(conn, 'last_synced_at')
+    written = 0
+    for page in fetch_orders(access_token, base_url, updated_at_min=since):
+        written += upsert_orders(conn, page)
+    set_meta(conn, 'last_synced_at', started_at)
+    return written
+
+
+def backfill_customers(conn, access_token, base_url=None, full=False):
+    """
+    Export customer order counts into the stats cache. A new order bumps the
+    customer's updated_at, so later runs only fetch customers changed since the last one.
+    Returns the number of customers written.
+    """
+    if not access_token:
+        raise ValueError("Missing Shopify credentials")
+    started_at = _now()
+    since = None if full else get_meta(conn, 'customers_synced_at')
+    written = 0
+    for page in fetch_customers(access_token, base_url, updated_at_min=since):
+        _upsert_customers(conn, page)
+        written += len(page)
+    set_meta(conn, 'customers_synced_at', started_at)
+    return written
+
+
+_sync_started = False
+_sync_lock = threading.Lock()
+
+
+def start_periodic_sync(access_token, interval=SYNC_INTERVAL, base_url=None):
+    """
+    Keep the mirror current without webhooks: backfill now, then incrementally every `interval` seconds.
+    Runs on one daemon thread per process, only with ORDER_MIRROR_SYNC=1; later calls are no-ops.
+    Without it (and without the webhook receiver) pages keep calling the API as before.
+    """
+    global _sync_started
+    with _sync_lock:
+        if _sync_started or not access_token or not SYNC_ENABLED:
+            return
+        _sync_started = True
+
+    def loop():
+        conn = get_shared_connection()
+        while True:
+            try:
+                backfill(conn, access_token, base_url)
+                backfill_customers(conn, access_token, base_url)
+            except Exception as e:
+                # Anything (a locked database while the receiver writes, an odd payload) only
+                # skips this round; a dead thread would leave the mirror stale until a restart
+                print(f"Order mirror sync failed: {type(e).__name__}: {e}")
+            time.sleep(interval)
+
+    threading.Thread(target=loop, daemon=True, name="order-mirror-sync").start()
+
+
+if __name__ == "__main__":
+    import argparse
+    from dotenv import load_dotenv
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(description="Backfill the local order mirror from Shopify")
+    parser.add_argument("--full", action="store_true", help="Reload every order, not just recent changes")
+    args = parser.parse_args()
+    conn = get_connection()
+    print(f"{backfill(conn, os.getenv('shopify_key'), full=args.full)} orders written, {count_orders(conn)} mirrored")
+    print(f"{backfill_customers(conn, os.getenv('shopify_key'), full=args.full)} customers written")
@@ -1,19 +1,26 @@
 # main.py
 
 import io
-from typing import List, Optional
 
 import streamlit as st
 from PIL import Image
 
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 load_dotenv()
 import zipfile
-import requests
-import json
+import mimetypes
 import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import batch_shoot
+import bundle
+import generation
+import image_cache
+import model_library
+import product_catalog
+from instrumentation import page_run
+from generation import describe_inspiration_image, generate_image_with_inputs, get_gemini_client
 
 # --- Prompt Library ----------------------------------------------------------
 
@@ -42,202 +49,48 @@ st.set_page_config(
     page_icon="✨",
     layout="wide"
 )
+page_run("Creative Studio Beta")
 
 
 # -----------------------------------------------------------------------------
-# Helpers
+# Shopify Helpers
 # -----------------------------------------------------------------------------
 
 @st.cache_resource
-def get_gemini_client():
-    """
-    Create a single Gemini client for the app.
-    Uses GEMINI_API_KEY from environment by default.
-    """
-    return genai.Client()
-
-
-def describe_inspiration_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> str:
+def get_catalog():
     """
-    Use Gemini text model to describe the inspiration image.
-    Focus on background, lighting, and atmosphere ONLY - NOT clothing or model.
+    Shared connection to the local Shopify catalog index.
     """
-    client = get_gemini_client()
-
-    img_part = types.Part.from_bytes(
-        data=image_bytes,
-        mime_type=mime_type,
-    )
-
-    stylist_prompt = (
-        "You are a fashion photography director analyzing the environment and mood of this image. "
-        "Describe ONLY the following elements:\n\n"
-        "1. BACKGROUND & SETTING: The physical environment, location, textures (e.g., concrete wall, studio, outdoor park, urban street)\n"
-        "2. LIGHTING: The type and quality of light (e.g., soft natural daylight, dramatic side lighting, golden hour, studio lighting)\n"
-        "3. MOOD & ATMOSPHERE: The overall feeling and vibe (e.g., minimalist, moody, elegant, energetic, serene)\n"
-        "4. COLOR PALETTE: Background colors and tones (e.g., cool grays, warm earth tones, vibrant neon)\n"
-        "5. COMPOSITION: Camera angle, framing, depth of field if relevant to the environment\n\n"
-        "CRITICAL: Do NOT describe the person, their clothing, outfit details, accessories, or what they're wearing. "
-        "Completely ignore all garments and fashion items. Focus ONLY on the photographic environment, "
-        "setting, lighting conditions, and aesthetic atmosphere.\n\n"
-        "Keep your description to 3-4 concise sentences suitable for an AI image generator."
-    )
-
-    resp = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[stylist_prompt, img_part],
-    )
-
-    return (resp.text or "").strip()
-
-
-# -----------------------------------------------------------------------------
-# Shopify Helpers
-# -----------------------------------------------------------------------------
+    return product_catalog.get_connection()
 
-CACHE_FILE = "shopify_products_cache.json"
 
-def fetch_shopify_products_api(shop_url, access_token):
+def sync_catalog(full=False):
     """
-    Fetches products from Shopify Admin API.
-    Returns list of products with images.
+    Refresh the catalog index from Shopify.
+    Incremental unless `full` is set. Returns the number of products written.
     """
+    shop_url = os.getenv("SHOPIFY_SHOP_URL")
+    access_token = os.getenv("SHOPIFY_ACCESS_TOKEN")
     if not shop_url or not access_token:
         st.error("Missing Shopify Credentials in .env")
-        return []
-
-    # clean url
-    shop_url = shop_url.replace("https://", "").replace("http://", "").strip()
-    
-    all_products = []
-    page_info = None
-    
-    url = f"https://{shop_url}/admin/api/2023-10/products.json"
-    headers = {
-        "X-Shopify-Access-Token": access_token,
-        "Content-Type": "application/json"
-    }
-    
-    while True:
-        params = {
-            "limit": 250, # Max limit
-            "fields": "id,title,images,variants"
-        }
-        if page_info:
-            params["page_info"] = page_info
-            
-        try:
-            response = requests.get(url, headers=headers, params=params)
-            response.raise_for_status()
-            data = response.json()
-            products = data.get("products", [])
-            all_products.extend(products)
-            
-            # Check for Link header for pagination
-            link_header = response.headers.get('Link')
-            if not link_header or 'rel="next"' not in link_header:
-                break
-                
-            # Extract page_info from Link header
-            # Link header format: <https://...page_info=...>; rel="next"
-            # We can just extract the URL or parse it. A simple split works for standard Shopify headers.
-            # But the params are already in the URL in the Link header.
-            # Let's extract values.
-            links = link_header.split(',')
-            next_link = next((l for l in links if 'rel="next"' in l), None)
-            
-            if next_link:
-                # Extract URL from brackets <url>
-                next_url = next_link.split(';')[0].strip('<> ')
-                # Update url and clear params since next_url has them
-                url = next_url
-                page_info = None # Not needed as it's in the URL
-                params = {} # Clear params as they are in the URL
-            else:
-                break
-                
-        except Exception as e:
-            st.error(f"Error fetching from Shopify: {e}")
-            break
-            
-    return all_products
-
-def manage_shopify_products():
-    """
-    Handles caching and fetching of Shopify products.
-    Returns list of products.
-    """
-    products = []
-    
-    # Load cache if exists
-    if os.path.exists(CACHE_FILE):
-        try:
-            with open(CACHE_FILE, 'r') as f:
-                products = json.load(f)
-        except:
-            pass
-
-    # Sidebar control to refresh
-    # We'll put this logic near the selector for better UX or in sidebar
-    return products
+        return 0
+    try:
+        return product_catalog.refresh_catalog(get_catalog(), shop_url, access_token, full=full)
+    except Exception as e:
+        st.error(f"Error fetching from Shopify: {e}")
+        return 0
 
-def save_cache(products):
-    with open(CACHE_FILE, 'w') as f:
-        json.dump(products, f)
 
-
-
-
-
-
-def generate_image_with_inputs(
-    prompt: str,
-    input_images: List,  # list of PIL Images or UploadedFiles
-    model_name: str = "gemini-3-pro-image-preview",
-) -> Optional[Image.Image]:
+def product_thumbnail(image):
     """
-    Generate an image using Nano Banana with text prompt + input images.
-    Returns a PIL Image or None.
+    Local thumbnail of a Shopify image for the picker.
+    Falls back to the CDN URL if it can't be cached.
     """
-    client = get_gemini_client()
+    try:
+        return image_cache.get_image_path(image, width=image_cache.THUMB_WIDTH)
+    except Exception:
+        return image['src']
 
-    contents: List = [prompt]
-
-    # Add all input images as Parts
-    for img_input in input_images:
-        if isinstance(img_input, Image.Image):
-            # Convert PIL Image to bytes
-            img_bytes_io = io.BytesIO()
-            img_input.save(img_bytes_io, format='PNG')
-            img_bytes = img_bytes_io.getvalue()
-            mime_type = "image/png"
-        else:
-            # Assume UploadedFile
-            img_bytes = img_input.getvalue()
-            mime_type = img_input.type or "image/jpeg"
-
-        contents.append(
-            types.Part.from_bytes(
-                data=img_bytes,
-                mime_type=mime_type,
-            )
-        )
-
-    resp = client.models.generate_content(
-        model=model_name,
-        contents=contents,
-    )
-
-    # Extract the first image from the response
-    for part in resp.parts:
-        if part.inline_data is not None:
-            image_bytes = part.inline_data.data
-            img = Image.open(io.BytesIO(image_bytes))
-            if img.format is None:
-                img.format = 'PNG'
-            return img
-
-    return None
 
 # -----------------------------------------------------------------------------
 # Model Library Helpers
@@ -245,23 +98,11 @@ def generate_image_with_inputs(
 
 def list_models():
     """
-    Scans the 'models' directory for subdirectories (models) and their images.
+    Lists the models in the 'models' directory and their images.
+    Backed by the model library manifest, so it only rescans when the directory changes.
     Returns a dict: {model_name: [list_of_image_paths]}
     """
-    models_dir = "./models"
-    if not os.path.exists(models_dir):
-        return {}
-    
-    models = {}
-    for entry in os.scandir(models_dir):
-        if entry.is_dir():
-            images = []
-            for img in os.scandir(entry.path):
-                if img.is_file() and img.name.lower().endswith(('.png', '.jpg', '.jpeg', '.webp')):
-                    images.append(img.path)
-            if images:
-                models[entry.name] = sorted(images)
-    return models
+    return model_library.list_models()
 
 # -----------------------------------------------------------------------------
 # Streamlit UI
@@ -365,7 +206,7 @@ with col_model_1:
 
     model_reference_files = None
     studio_files = None # Kept for compatibility if we revert
-    shopify_img_url = None
+    shopify_img = None
     shopify_img_bytes = None
     
     available_models = list_models()
@@ -388,25 +229,19 @@ with col_model_1:
         else:
             selected_model_name = st.selectbox("Choose Model", list(available_models.keys()))
             if selected_model_name:
-                model_paths = available_models[selected_model_name]
-                # Load images as PIL for compatibility with generation function
-                # We need to simulate UploadedFile or just list of PILs
-                # Our generator accepts PIL images, so let's load them.
+                # Pre-encoded, size-normalized references (max 5) from the model library,
+                # passed to the generator as-is so nothing is decoded or re-encoded here
                 try:
-                    loaded_model_images = []
-                    # Limit to 5
-                    for p in model_paths[:5]:
-                         loaded_model_images.append(Image.open(p))
+                    model_entry = model_library.get_model(selected_model_name)
+                    model_reference_files = model_library.load_reference_payloads(selected_model_name) # This Variable is used in generation
                     
-                    model_reference_files = loaded_model_images # This Variable is used in generation
-                    
-                    st.success(f"Loaded {len(loaded_model_images)} images for {selected_model_name}")
+                    st.success(f"Loaded {len(model_reference_files)} images for {selected_model_name}")
                     
                     # Preview
-                    cols = st.columns(len(loaded_model_images))
-                    for i, img in enumerate(loaded_model_images):
+                    cols = st.columns(len(model_entry["previews"]))
+                    for i, preview_path in enumerate(model_entry["previews"]):
                         with cols[i]:
-                            st.image(img, width=200)
+                            st.image(preview_path, width=200)
                             
                 except Exception as e:
                     st.error(f"Error loading model images: {e}")
@@ -421,34 +256,40 @@ with col_model_2:
         label_visibility="collapsed"
     )
     
-    final_outfit_image_pil = None
+    final_outfit_image = None
     shopify_image_pil = None
     
     if outfit_source == "🛍️ Shopify Store":
         # Shopify Logic
-        cached_products = manage_shopify_products()
-        
+        catalog = get_catalog()
+
         col_shop_1, col_shop_2 = st.columns([1, 1])
         with col_shop_1:
             if st.button("🔄 Sync with Shopify"):
-                with st.spinner("Fetching products..."):
-                    shop_url = os.getenv("SHOPIFY_SHOP_URL")
-                    access_token = os.getenv("SHOPIFY_ACCESS_TOKEN")
-                    new_products = fetch_shopify_products_api(shop_url, access_token)
-                    if new_products:
-                        save_cache(new_products)
-                        cached_products = new_products
-                        st.success(f"Synced {len(new_products)} products!")
-                        st.rerun()
-
-        selected_product_name = st.selectbox(
+                with st.spinner("Fetching updated products..."):
+                    synced = sync_catalog(full=st.session_state.get("full_resync", False))
+                    st.success(f"Synced {synced} products!")
+        with col_shop_2:
+            st.checkbox("Full resync", key="full_resync", help="Re-download the whole catalog instead of only changed products.")
+
+        product_query = st.text_input(
+            "Search products",
+            placeholder="Title, SKU or variant...",
+            help="Matches the start of any word in the title, SKU or variant name."
+        )
+        matches = dict(product_catalog.search_products(catalog, product_query, limit=50))
+
+        selected_product_id = st.selectbox(
             "Choose Product",
-            options=["Select a product..."] + [p['title'] for p in cached_products]
+            options=[None] + list(matches.keys()),
+            format_func=lambda pid: "Select a product..." if pid is None else matches[pid]
         )
 
-        if selected_product_name != "Select a product...":
+        if selected_product_id is not None:
             # Find product
-            product = next((p for p in cached_products if p['title'] == selected_product_name), None)
+            product = product_catalog.get_product(catalog, selected_product_id)
+            if product:
+                product['images'] = product_catalog.get_product_images(catalog, selected_product_id)
             if product and product.get('images'):
                 
                 # --- COMPACT GRID LOGIC ---
@@ -468,12 +309,12 @@ with col_model_2:
                 
                 # 1. Show Selected Image Preview (Compact Mode)
                 selected_img_data = product['images'][current_idx] if current_idx < len(product['images']) else product['images'][0]
-                shopify_img_url = selected_img_data['src']
+                shopify_img = selected_img_data
                 
                 # Use columns to align preview and controls
                 col_preview, col_controls = st.columns([1, 2])
                 with col_preview:
-                    st.image(selected_img_data['src'], caption=f"Selected: Image {current_idx+1}", width=150)
+                    st.image(product_thumbnail(selected_img_data), caption=f"Selected: Image {current_idx+1}", width=150)
                 
                 with col_controls:
                     # 2. Toggle Button for Grid
@@ -503,7 +344,7 @@ with col_model_2:
                                 st.session_state[idx_key] = idx
                                 st.session_state[grid_vis_key] = False # Auto-close on selection
                                 st.rerun()
-                            st.image(img_data['src'])
+                            st.image(product_thumbnail(img_data))
 
             else:
                 st.warning("No images found for this product.")
@@ -521,7 +362,7 @@ with col_model_2:
             # But we'll handle it in the generation step.
             shopify_image_pil = Image.open(io.BytesIO(shopify_img_bytes)) # Pre-load for preview
             st.image(shopify_image_pil, caption="Selected Outfit", width=200)
-            final_outfit_image_pil = shopify_image_pil
+            final_outfit_image = shopify_image_pil
 
 
 st.markdown("---")
@@ -542,33 +383,32 @@ if generate_btn:
         st.stop()
 
     
-    # Logic to set final_outfit_image_pil from Shopify if not already set by manual upload
+    # Logic to set final_outfit_image from Shopify if not already set by manual upload
     if outfit_source == "🛍️ Shopify Store":
-        if not shopify_img_url:
+        if not shopify_img:
              st.warning("⚠️ You haven't selected a product image. Generation will rely solely on model photos.")
         else:
             try:
-                 with st.spinner("Downloading product image..."):
-                    r = requests.get(shopify_img_url, stream=True)
-                    r.raise_for_status()
-                    final_outfit_image_pil = Image.open(io.BytesIO(r.content))
+                 with st.spinner("Loading product image..."):
+                    # Same cached original the picker downloaded, sent without re-encoding
+                    final_outfit_image = image_cache.get_image_bytes(shopify_img)
             except Exception as e:
                 st.error(f"Failed to load Shopify image: {e}")
                 st.stop()
     elif outfit_source == "📤 Manual Upload":
-         if not final_outfit_image_pil:
+         if not final_outfit_image:
              st.warning("⚠️ No outfit image uploaded.")
 
     # Harmonize variable for prompt
     # If manual upload, we used `shopify_image_pil` name in the block above (oops, let's fix that connection)
     
     # RE-MAPPING for clarity:
-    # 1. `shopify_image_pil` needs to be `final_outfit_image_pil`
+    # 1. `shopify_image_pil` needs to be `final_outfit_image`
     # Let's clean up the variable usage in the Manual block in next step or just ensure it propagates.
     # Actually, let's fix the variable name in the previous chunk if possible, or handle it here.
     
     if outfit_source == "📤 Manual Upload" and shopify_image_pil:
-        final_outfit_image_pil = shopify_image_pil
+        final_outfit_image = shopify_image_pil
 
     client = get_gemini_client()
 
@@ -594,29 +434,11 @@ if generate_btn:
             st.write(inspiration_desc or "_No description provided._")
 
     # 2) Build prompt for first image
-    studio_instruction = (
-        f"PERSON TO RECREATE: The first {len(model_reference_files)} reference images show the model. "
-        f"Use their EXACT facial features, skin tone, hair, and body type. "
-        f"{'OUTFIT TO USE: The last reference image is the Product/Outfit. Dress the model in this exact outfit. ' if final_outfit_image_pil else 'Create a stylish high-fashion outfit. '}"
-        "Combine the person with the outfit in the new photographic environment."
-    )
-    
-    pieces = []
-    if user_description:
-        pieces.append(f"Creative direction: {user_description}")
-    if inspiration_desc:
-        pieces.append(f"Background & photographic style: {inspiration_desc}")
-    if not pieces:
-        pieces.append("Create a high-end fashion editorial photo.")
-    
-    combined = "\n".join(pieces)
-    
-    main_prompt = (
-        f"Create a photorealistic fashion photograph.\n"
-        f"{studio_instruction}\n\n"
-        f"{combined}\n\n"
-        "Full-body shot, vertical 3:4 aspect ratio, professional fashion editorial lighting, "
-        "shallow depth of field, magazine-quality image."
+    main_prompt = generation.build_main_prompt(
+        num_model_images=len(model_reference_files),
+        has_outfit=bool(final_outfit_image),
+        user_description=user_description,
+        inspiration_desc=inspiration_desc,
     )
 
     with st.expander("🎯 Generated prompt for main image", expanded=False):
@@ -630,8 +452,8 @@ if generate_btn:
             all_reference_images.extend(model_reference_files)
         
         # Add Outfit image last
-        if final_outfit_image_pil:
-            all_reference_images.append(final_outfit_image_pil)
+        if final_outfit_image:
+            all_reference_images.append(final_outfit_image)
         
         main_image = generate_image_with_inputs(
             main_prompt, 
@@ -760,15 +582,14 @@ if 'generated_images' in st.session_state and st.session_state.generated_images:
                 st.image(variation_image, caption="Custom Variation")
             
             with col_download:
-                # Convert to bytes for download
-                img_bytes = io.BytesIO()
-                variation_image.save(img_bytes, format='PNG')
+                # Reuse the generated bytes for download (no re-encode)
+                img_bytes, img_ext = bundle.image_payload(variation_image)
                 
                 st.download_button(
                     label="💾 Download",
-                    data=img_bytes.getvalue(),
-                    file_name=f"variation_{len(st.session_state.generated_images)+1}.png",
-                    mime="image/png",
+                    data=img_bytes,
+                    file_name=f"variation_{len(st.session_state.generated_images)+1}{img_ext}",
+                    mime=mimetypes.guess_type(f"x{img_ext}")[0],
                     use_container_width=True
                 )
             
@@ -784,3 +605,86 @@ if 'generated_images' in st.session_state and st.session_state.generated_images:
 
     elif generate_variation_btn and not variation_prompt:
         st.warning("⚠️ Please describe the variation you want to generate.")
+
+
+# 13) Batch catalog photoshoot - same model & style across many products
+st.markdown("---")
+with st.expander("📦 Batch Catalog Photoshoot", expanded=False):
+    st.markdown(
+        "Generate an on-model main image for many products at once, using the model and "
+        "style chosen above. Results are written to one folder per product."
+    )
+
+    batch_ids_text = st.text_area(
+        "Product IDs or SKUs (one per line)",
+        height=150,
+        placeholder="7940344053996\nA-AGAP-XSS-0325"
+    )
+
+    if "batch_run_name" not in st.session_state:
+        st.session_state.batch_run_name = batch_shoot.default_run_name()
+
+    col_batch_1, col_batch_2, col_batch_3 = st.columns(3)
+    with col_batch_1:
+        batch_run_name = st.text_input("Run name", key="batch_run_name", help="Use an existing run name to resume it.")
+    with col_batch_2:
+        batch_concurrency = st.number_input("Parallel requests", min_value=1, max_value=8, value=4)
+    with col_batch_3:
+        batch_rpm = st.number_input("Max requests / minute", min_value=1, max_value=120, value=20)
+
+    if st.button("🚀 Run Batch", use_container_width=True):
+        if not model_reference_files:
+            st.error("Please choose a model above first.")
+            st.stop()
+
+        catalog = get_catalog()
+        batch_product_ids, unknown_ids = batch_shoot.resolve_products(catalog, batch_ids_text.splitlines())
+        if unknown_ids:
+            st.warning(f"Not found in the local catalog: {', '.join(unknown_ids)}")
+        if not batch_product_ids:
+            st.error("No products to process.")
+            st.stop()
+
+        # One inspiration description and one encoded reference set for the whole batch
+        batch_style = None
+        if input_mode == "📸 Use inspiration image" and inspiration_file is not None:
+            style_key = f"batch_style_{inspiration_file.file_id}"
+            if style_key not in st.session_state:
+                with st.spinner("Analyzing inspiration image style with Gemini…"):
+                    st.session_state[style_key] = describe_inspiration_image(
+                        image_bytes=inspiration_file.getvalue(),
+                        mime_type=inspiration_file.type or "image/jpeg",
+                    )
+            batch_style = st.session_state[style_key]
+        elif input_mode == "✍️ Write custom prompt":
+            batch_style = custom_style_prompt
+
+        batch_references = [generation.encode_input_image(f) for f in model_reference_files]
+
+        batch_progress_bar = st.progress(0)
+        batch_status_text = st.empty()
+
+        def on_batch_progress(done, total, product_id, status):
+            batch_progress_bar.progress(done / total)
+            batch_status_text.text(f"{done}/{total} — product {product_id}: {status}")
+
+        batch_result = batch_shoot.run_batch(
+            catalog,
+            batch_product_ids,
+            batch_references,
+            user_description=user_description,
+            inspiration_desc=batch_style,
+            run_name=batch_run_name,
+            concurrency=int(batch_concurrency),
+            requests_per_minute=int(batch_rpm),
+            on_progress=on_batch_progress,
+        )
+
+        batch_entries = [batch_result["products"].get(str(pid), {}) for pid in batch_product_ids]
+        batch_done = sum(1 for e in batch_entries if e.get("status") == "done")
+        st.success(f"{batch_done} of {len(batch_product_ids)} products done. Output: `{batch_result['run_dir']}`")
+
+        batch_failed = {pid: e.get("error") for pid, e in zip(batch_product_ids, batch_entries) if e.get("status") == "failed"}
+        if batch_failed:
+            st.error(f"{len(batch_failed)} products failed — run the batch again with the same name to retry them.")
+            st.write(batch_failed)
@@ -1,17 +1,10 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
 import re
-import requests
 import os
-import smtplib
-from email.mime.text import MIMEText
-# MIMEMultipart send emails with both text content and attachments.
-from email.mime.multipart import MIMEMultipart
-# MIMEText for creating body of the email message.
-from email.mime.text import MIMEText
-# MIMEApplication attaching application-specific data (like CSV files) to email messages.
-from email.mime.application import MIMEApplication
+import atelier
+import report_mailer
+from instrumentation import page_run
 st.set_page_config(layout='wide')
 # key= st.secrets["shopify_key"]
 key = os.environ['shopify_key']
@@ -19,154 +12,95 @@ key = os.environ['shopify_key']
 if "authenticated" not in st.session_state or not st.session_state.authenticated:
     st.error("Please login first.")
     st.stop()
+page_run("Inventory App")
 
 
 
 st.title("Luxmii Production Management Report")
 
-def send_email(subject, body, sender, recipients, password):
-    msg= MIMEMultipart()
-    msg['Subject'] = subject
-    msg['From'] = sender
-    msg['To'] = ', '.join(recipients)
-    body_part = MIMEText(body)
-    msg.attach(body_part)
+@st.cache_resource
+def get_mailer():
+    """One mailer (sending thread + SMTP connection) for every session."""
+    return report_mailer.ReportMailer()
 
 
-        # section 1 to attach file
-    with open(path_to_file,'rb') as file:
-        # Attach the file with filename to the email
-        msg.attach(MIMEApplication(file.read(), Name="example.xlsx"))
-
-    
-    with smtplib.SMTP_SSL('smtp.gmail.com', 465) as smtp_server:
-       smtp_server.login(sender, password)
-       smtp_server.sendmail(sender, recipients, msg.as_string())
-    print("Message sent!")
-
-
-
-
-def get_all_orders():
-    last=0
-    orders=pd.DataFrame()
-    while True:        
-
-        url = f"https://luxmii.com/admin/api/2024-04/orders.json?limit=250&fulfillment_status=unfulfilled&since_id={last}"
-
-        payload={}
-        headers = {
-          'Content-Type': 'application/json',
-          'X-Shopify-Access-Token': key
-        }
-
-        response = requests.request("GET", url, headers=headers, data=payload,verify=False)
-
-        
-        
-        df=pd.DataFrame(response.json()['orders'])
-        orders=pd.concat([orders,df])
-        last=df['id'].iloc[-1]
-        if len(df)<250:
-            break
-    return(orders)
-
-def get_item_location(order_id):
-    url = f"https://luxmii.com/admin/api/2024-04/orders/{order_id}/fulfillment_orders.json"
-
-    payload={}
-    headers = {
-      'Content-Type': 'application/json',
-      'X-Shopify-Access-Token': key
-    }
-
-    response = requests.request("GET", url, headers=headers, data=payload,verify=False)
-    
-    z=pd.DataFrame((response.json()['fulfillment_orders']))
-
-    z['list_items']=z['line_items'].apply(lambda x:[ i['line_item_id'] for i in x])
-    z['location']=z['assigned_location'].apply(lambda x: x['country_code'])
-    z=z[['list_items','location']].explode('list_items')
-    z.columns=['item_id','location']
-    z=z.drop_duplicates().reset_index(drop=True)
-    return(z)
-
-
-
-def get_the_data():
-    df=get_all_orders()
-    df['list_items']=df['line_items'].apply(lambda x:[{'name':i['name'],'id':i['id'],'quantity':i['quantity']} for i in x] )
-    s=df[['name','id','list_items','created_at']].explode('list_items')
-    s.reset_index(inplace=True,drop=True)
-    s['product_name']=s['list_items'].apply(lambda x:x['name'])
-    s['item_id']=s['list_items'].apply(lambda x:x['id'])
-    s['quantity']=s['list_items'].apply(lambda x:x['quantity'])
-    s.drop('list_items',axis=1,inplace=True)
-
-    locs=pd.DataFrame()
-    for order_id in list(s['id'].unique()):
-        locs=pd.concat([locs,get_item_location(order_id)])
-
-    data=s.merge(locs,on='item_id',how='left')
-    data=data[data['location']!='AU']
-
-
-    #remove_fullfiled items
-    d=df[df['fulfillments'].apply(lambda x: len(x)>0)]
-    ff=list(d['fulfillments'].apply(lambda x: [[z['id'] for z in i['line_items']] for i in x]).explode().explode())
-    data=data[~data['item_id'].isin(ff)]
-
-
-    tab1=data.sort_values('name')
-    tab2=data.groupby('product_name').agg({'quantity':'sum','name':list})
-    tab2['name']=tab2['name'].apply(lambda x: ', '.join(x))
-    tab2=tab2.rename(columns={'name':'order_numbers'})
-    tab2['check']=False
-    tab2['notes']=np.nan
-    tab1['check']=False
-    tab1['notes']=np.nan
-    tab1=tab1.drop(['id','item_id','location'],axis=1)
-    tab1=tab1[['name', 'product_name', 'quantity','check','notes','created_at']]
-    tab1=tab1.rename(columns={'name':'order'})
-    return(tab1, tab2)
 col1, col2, col3,col4, col5 = st.columns(5)
 
 update_button=col1.button("Update the Data")
 save_button=col2.button("Save")
+use_bulk=col3.toggle("Bulk export", value=True, help=f"One Shopify bulk job instead of paging orders; falls back to paging if it fails or takes over {atelier.PAGE_BULK_TIMEOUT}s")
+use_mirror=col4.toggle("Local mirror", value=True, help="Read orders from the webhook-fed local mirror when it is live")
+email_button=col5.button("Email report", help=f"Send both tabs to {', '.join(report_mailer.REPORT_RECIPIENTS) or 'REPORT_RECIPIENTS'}")
 
-if update_button:
-    with st.spinner('Wait for it...'):
+atelier.start_scheduler(key, use_bulk=use_bulk, use_mirror=use_mirror)
 
-        # df1,df2=get_the_data()
+EDITORS=['tab1_editor','tab2_editor']
+# After a Save the files hold the edits, so the editors can start over from them
+if st.session_state.pop('report_saved', False):
+    for editor in EDITORS:
+        st.session_state.pop(editor, None)
 
-        a,b=get_the_data()
-        df1=pd.read_csv('tab1.csv',dtype={'notes':str})
-        df2=pd.read_csv('tab2.csv',dtype={'notes':str})
+def has_unsaved_edits():
+    for editor in EDITORS:
+        state=st.session_state.get(editor) or {}
+        if state.get('edited_rows') or state.get('added_rows') or state.get('deleted_rows'):
+            return True
+    return False
 
-        df1=a.merge(df1[['order','product_name','notes']],on=['order','product_name'],how='left')
-        df1['notes']=df1['notes_y'].combine_first(df1['notes_x'])
-        df1=df1[['order', 'product_name', 'quantity', 'check',  'notes', 'created_at']]
-
-        b.reset_index(inplace=True)
-        df2=b.merge(df2[['product_name','notes']],on='product_name',how='left')
-        df2['notes']=df2['notes_y'].combine_first(df2['notes_x'])
-        df2=df2[['product_name','quantity','order_numbers','check','notes']]
-
-        df1.to_csv('tab1.csv',index=False)
-        df2.to_csv('tab2.csv',index=False)
-        st.success('Done!')
+# A new snapshot rewrites tab1/tab2, which would drop edits made in the tables before they're saved
+unsaved=save_button or has_unsaved_edits()
 
+if update_button:
+    age=atelier.snapshot_age()
+    if age is not None and age<=atelier.SNAPSHOT_MAX_AGE:
+        st.info(f"Already up to date (refreshed {age/60:.0f} min ago); data older than {atelier.SNAPSHOT_MAX_AGE//60} min is fetched again.")
+    else:
+        with st.spinner('Wait for it...'):
+
+            # df1,df2=get_the_data()
+
+            atelier.write_snapshot(key, use_bulk=use_bulk, use_mirror=use_mirror, bulk_timeout=atelier.PAGE_BULK_TIMEOUT)
+            st.success('Done!')
+
+if unsaved:
+    as_of=atelier.applied_snapshot()
+else:
+    as_of=atelier.load_snapshot()
+if as_of is None:
+    st.caption("No report snapshot yet: press Update the Data.")
+else:
+    minutes=(pd.Timestamp.now(tz='UTC')-as_of).total_seconds()/60
+    st.caption(f"Data as of {as_of.astimezone():%d %b %Y %H:%M} ({minutes:.0f} min ago)")
+latest=atelier.latest_snapshot()
+if unsaved and latest and atelier.snapshot_time(latest)!=as_of:
+    st.caption("Newer data is waiting: it loads once your changes are saved.")
 
 tab1, tab2 = st.tabs(["All Data", "Aggregated Items"])
 df1=pd.read_csv('tab1.csv',dtype={'notes':str})
 df2=pd.read_csv('tab2.csv',dtype={'notes':str})
 
 with tab1:
-    edited_df1 = st.data_editor(df1, num_rows="fixed", use_container_width=True )
+    edited_df1 = st.data_editor(df1, num_rows="fixed", use_container_width=True, key='tab1_editor')
 with tab2:
-    edited_df2= st.data_editor(df2, num_rows="fixed", use_container_width=True )
+    edited_df2= st.data_editor(df2, num_rows="fixed", use_container_width=True, key='tab2_editor')
     
 if save_button:
     edited_df1.to_csv('tab1.csv',index=False)
     edited_df2.to_csv('tab2.csv',index=False)
-    
+    st.session_state.report_saved=True
+    st.rerun()
+
+if email_button:
+    try:
+        st.session_state.report_email=get_mailer().send_report(edited_df1, edited_df2, as_of=as_of.astimezone() if as_of else None)
+        st.toast("Report queued for sending")
+    except Exception as e:
+        st.error(f"Could not send the report: {e}")
+
+# Sending happens on the mailer's thread; show how the last one went once it's done
+sent=st.session_state.get('report_email')
+if sent is not None and sent.done():
+    if sent.exception():
+        st.error(f"Report email failed: {sent.exception()}")
+    else:
+        st.caption(f"Report emailed to {sent.result()}")
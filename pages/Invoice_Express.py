@@ -1,7 +1,6 @@
 import streamlit as st
 import pandas as pd
 import requests
-import http.client
 import json
 import time
 import os
@@ -10,7 +9,9 @@ import traceback
 import sys 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
-from functions import create_invoice
+from instrumentation import page_run
+from functions import create_invoice, update_client, INVOICEXPRESS_BASE_URL, EXCHANGE_RATE_API_BASE
+from invoice_export import orders_from_export, read_order_ids
 
 if "authenticated" not in st.session_state or not st.session_state.authenticated:
     st.error("Please login first.")
@@ -22,13 +23,13 @@ load_dotenv()
 
 # Configuration constants
 API_KEY = os.getenv("INVOICEEXPRESS_KEY")
-API_BASE_URL = "intervwovenunipes.app.invoicexpress.com"
+API_BASE_URL = INVOICEXPRESS_BASE_URL
 EXCHANGE_RATE_API_KEY = os.getenv("EXCHANGE_RATE_API_KEY")  # Consider moving to .env
 
 def get_exchange_rate():
     """Fetch the current AUD to EUR exchange rate."""
     try:
-        response = requests.get(f'https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/latest/AUD')
+        response = requests.get(f'{EXCHANGE_RATE_API_BASE}/v6/{EXCHANGE_RATE_API_KEY}/latest/AUD')
         response.raise_for_status()  # Raise exception for non-200 responses
         rate = response.json()['conversion_rates']['EUR']
         return rate
@@ -36,42 +37,12 @@ def get_exchange_rate():
         st.error(f"Failed to fetch exchange rate: {str(e)}")
         return None
 
-def update_client(client_data):
-    """Update client information in Invoice Express."""
-    client_id = client_data['invoice']['client']['id']
-    url = f"https://{API_BASE_URL}/clients/{client_id}.json"
-    
-    payload = {
-        "client": {
-            "name": client_data['invoice']['client']['name'],
-            "code": client_data['invoice']['client']['code'],
-            "address": client_data['invoice']['client']['address'],
-            "city": client_data['invoice']['client']['city'],
-            "postal_code": client_data['invoice']['client']['postal_code']
-        }
-    }
-    
-    headers = {
-        "Accept": "application/json",
-        "Content-Type": "application/json"
-    }
-    
-    params = {"api_key": API_KEY}
-    
-    response = requests.put(url, json=payload, headers=headers, params=params)
-    response.raise_for_status()
-    
-    # Verify client was updated by fetching client data
-    conn = http.client.HTTPSConnection(API_BASE_URL)
-    headers = {'accept': "application/json"}
-    conn.request("GET", f"/clients/{client_id}.json?api_key={API_KEY}", headers=headers)
-    res = conn.getresponse()
-    data = res.read()
-    
-    return data
+def process_orders(orders, exported=None, rate=None):
+    """Process each order to create invoice and update client.
 
-def process_orders(orders):
-    """Process each order to create invoice and update client."""
+    exported: {order id: order JSON} built from the upload; orders missing from it are fetched from Shopify.
+    """
+    exported = exported or {}
     results = {
         "successful": [],
         "failed_invoices": [],
@@ -87,7 +58,7 @@ def process_orders(orders):
         
         try:
             # Create invoice
-            invoice_response = create_invoice(order_id)
+            invoice_response = create_invoice(order_id, order=exported.get(order_id), rate=rate)
             
             # Update client if invoice creation was successful
             try:
@@ -112,6 +83,7 @@ def process_orders(orders):
 
 def main():
     st.set_page_config(page_title="Shopify Invoice Express App", layout="wide")
+    page_run("Invoice Express")
     
     st.title("Shopify Invoice Express App")
     
@@ -129,11 +101,17 @@ def main():
         
         # Optional column selection
         id_column = "Id"  # Default column name
+
+        from_export = st.checkbox(
+            "Build invoices from the uploaded Shopify export",
+            value=True,
+            help="Uses the line items and shipping address in the file and only fetches orders it can't fully describe (e.g. refunded ones).",
+        )
         
         if uploaded_file is not None:
             try:
                 # Preview the Excel file
-                df_preview = pd.read_csv(uploaded_file,dtype=str)
+                df_preview = pd.read_csv(uploaded_file,dtype=str,nrows=5)
                 st.write("Preview of uploaded file:")
                 st.dataframe(df_preview.head())
                 
@@ -161,16 +139,29 @@ def main():
                         #     st.error(f"Column 'Id' not found in the Excel file.")
                         #     return
                         
-                        orders = list(df_preview['Id'].dropna().astype(str))
+                        # Only the id column, in chunks; exports repeat the id on every line item row
+                        orders, counts = read_order_ids(uploaded_file, id_column)
+                        exported = {}
+                        # A plain list of ids (no Name column) is still fetched order by order
+                        use_export = from_export and "Name" in df_preview.columns
+                        if use_export:
+                            uploaded_file.seek(0)
+                            exported = orders_from_export(pd.read_csv(uploaded_file, dtype=str))
                         
                         if not orders:
                             st.warning("No order IDs found in the selected column.")
                             return
                         
-                        st.info(f"Found {len(orders)} orders to process.")
+                        st.info(f"Found {len(orders)} orders to process ({counts['rows']} rows read, "
+                                f"{counts['duplicates']} repeated ids and {counts['blank']} blank rows skipped).")
+                        if counts["invalid"]:
+                            st.warning(f"Skipped {len(counts['invalid'])} values that aren't order ids: {', '.join(counts['invalid'][:10])}")
+                        if use_export:
+                            refetch = sum(order is None for order in exported.values())
+                            st.info(f"{len(orders) - refetch} built from the export, {refetch} will be fetched from Shopify.")
                         
                         # Process orders
-                        results = process_orders(orders)
+                        results = process_orders(orders, exported, exchange_rate)
                         
                         # Display results
                         st.success(f"Processing complete! Successfully processed {len(results['successful'])} orders.")
@@ -230,7 +221,7 @@ def main():
             with st.spinner("Testing API connections..."):
                 # Test Exchange Rate API
                 try:
-                    exchange_response = requests.get(f'https://v6.exchangerate-api.com/v6/{EXCHANGE_RATE_API_KEY}/latest/AUD')
+                    exchange_response = requests.get(f'{EXCHANGE_RATE_API_BASE}/v6/{EXCHANGE_RATE_API_KEY}/latest/AUD')
                     if exchange_response.status_code == 200:
                         st.success("✅ Exchange Rate API connection successful")
                     else:
@@ -240,13 +231,11 @@ def main():
                 
                 # Test Invoice Express API - just a simple endpoint check
                 try:
-                    conn = http.client.HTTPSConnection(API_BASE_URL)
-                    conn.request("GET", f"/sequences.json?api_key={API_KEY}")
-                    response = conn.getresponse()
-                    if response.status == 200:
+                    response = requests.get(f"{API_BASE_URL}/sequences.json", params={"api_key": API_KEY})
+                    if response.status_code == 200:
                         st.success("✅ Invoice Express API connection successful")
                     else:
-                        st.error(f"❌ Invoice Express API error: {response.status} - {response.reason}")
+                        st.error(f"❌ Invoice Express API error: {response.status_code} - {response.reason}")
                 except Exception as e:
                     st.error(f"❌ Invoice Express API connection failed: {str(e)}")
 
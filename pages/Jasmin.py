@@ -10,6 +10,8 @@ import traceback
 import sys 
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+from instrumentation import page_run
+from invoice_export import read_order_ids
 
 if "authenticated" not in st.session_state or not st.session_state.authenticated:
     st.error("Please login first.")
@@ -18,6 +20,8 @@ if "authenticated" not in st.session_state or not st.session_state.authenticated
 
 # Load environment variables from .env file
 load_dotenv()
+# Override to point at a local stand-in (see invoicing_simulator.py)
+JASMIN_BASE_URL = os.getenv("JASMIN_BASE_URL", "https://luxmii-jasmin.onrender.com")
 
 
 def process_orders(orders, account):
@@ -38,9 +42,9 @@ def process_orders(orders, account):
         try:
             # Create invoice
             if account =="Test":
-                invoice_response = requests.get(f"https://luxmii-jasmin.onrender.com/?orderid={order_id}&extra_disc=70")
+                invoice_response = requests.get(f"{JASMIN_BASE_URL}/?orderid={order_id}&extra_disc=70")
             elif account=='Production':
-                invoice_response = requests.get(f"https://luxmii-jasmin.onrender.com/production?orderid={order_id}&extra_disc=70") 
+                invoice_response = requests.get(f"{JASMIN_BASE_URL}/production?orderid={order_id}&extra_disc=70") 
             
             st.write(invoice_response.text)
 
@@ -58,6 +62,7 @@ def process_orders(orders, account):
 
 def main():
     st.set_page_config(page_title="Shopify Invoice Express App", layout="wide")
+    page_run("Jasmin")
     
     st.title("Shopify Invoice Express App")
     
@@ -79,7 +84,7 @@ def main():
     if uploaded_file is not None:
         try:
             # Preview the Excel file
-            df_preview = pd.read_csv(uploaded_file,dtype=str)
+            df_preview = pd.read_csv(uploaded_file,dtype=str,nrows=5)
             st.write("Preview of uploaded file:")
             st.dataframe(df_preview.head())
             
@@ -102,13 +107,17 @@ def main():
                     #     st.error(f"Column 'Id' not found in the Excel file.")
                     #     return
                     
-                    orders = list(df_preview['Id'].dropna().astype(str))
+                    # Only the id column, in chunks; exports repeat the id on every line item row
+                    orders, counts = read_order_ids(uploaded_file, id_column)
                     
                     if not orders:
                         st.warning("No order IDs found in the selected column.")
                         return
                     
-                    st.info(f"Found {len(orders)} orders to process.")
+                    st.info(f"Found {len(orders)} orders to process ({counts['rows']} rows read, "
+                            f"{counts['duplicates']} repeated ids and {counts['blank']} blank rows skipped).")
+                    if counts["invalid"]:
+                        st.warning(f"Skipped {len(counts['invalid'])} values that aren't order ids: {', '.join(counts['invalid'][:10])}")
                     
                     # Process orders
                     results = process_orders(orders,account)
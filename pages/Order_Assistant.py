@@ -2,6 +2,8 @@ import streamlit as st
 import requests
 import json
 
+from instrumentation import page_run
+
 with open("./guidelines.txt", "r", encoding="utf-8") as file:
     SYSTEM_MESSAGE = file.read()  # Reads the entire file as a string
 
@@ -11,6 +13,7 @@ st.set_page_config(
     page_icon="📧",
     layout="wide"
 )
+page_run("Order Assistant")
 
 # Initialize session state for system message
 if 'system_message' not in st.session_state:
@@ -1,16 +1,17 @@
 import streamlit as st
 import pandas as pd
 import numpy as np
-import zipfile
-import os
-from pypdf import PdfReader
-import re
-from pathlib import Path
-import shutil
+import datetime
+import io
+
+from instrumentation import page_run, span
+import invoice_index
+import invoice_pdfs
 
 if "authenticated" not in st.session_state or not st.session_state.authenticated:
     st.error("Please login first.")
     st.stop()
+page_run("Rename Invoices")
 
 st.title('Luxmii Order Extractor - PDF Rename')
 
@@ -23,44 +24,17 @@ with st.form(key='my_form'):
 
 
 if submit_button:
-    my_dir = "extracted"
-    with zipfile.ZipFile(file_uploaded, 'r') as zip_ref:
-        for zip_info in zip_ref.infolist():
-            if zip_info.is_dir():
-                continue
-            zip_info.filename = os.path.basename(zip_info.filename)
-            zip_ref.extract(zip_info, my_dir)
+    # Invoice number / id -> order number from the local index; only unknown files are parsed
+    index = invoice_index.get_shared_connection()
+    # Listing new invoices can take a while (the first time, a year of them), so this upload uses what the index has
+    if invoice_index.refresh_in_background(index):
+        st.caption("Refreshing the invoice index from InvoiceXpress in the background; files it doesn't know yet are read from the PDF text.")
+    resolver = invoice_index.Resolver(index)
 
-    files=os.listdir('extracted')
+    orders, from_index = invoice_pdfs.rename_zip(file_uploaded, "output.zip", resolver)
 
-        
-    files=[i for i in files if 'pdf' in i]
-    files=[i for i in os.listdir('extracted') if not i.startswith('.')]
-    orders=[]
-    for i in files:
-        inp=f"{my_dir}/{i}"
-        
-        reader = PdfReader(inp)
-        text = ""
-        for page in reader.pages:
-            text += page.extract_text() + "\n"
-        try:
-            out=re.findall('(?:Order No.:\n#*|Reference\n#)(\d+)',text)[0]
-            os.rename(inp, f'{my_dir}/{out}.pdf')
-            orders.append(out)
-        except:
-            continue
-    
     st.write(','.join(orders))
-
-    fp_zip = Path("output.zip")
-    path_to_archive = Path(f"./{my_dir}")
-
-    with zipfile.ZipFile(fp_zip, "w", zipfile.ZIP_DEFLATED) as zipf:
-        for fp in path_to_archive.glob("**/*"):
-            zipf.write(fp, arcname=fp.relative_to(path_to_archive))
-
-    shutil.rmtree(f'{my_dir}')
+    st.caption(f"{from_index} named from the invoice index, {len(orders) - from_index} read from the PDF text.")
 
     with open("output.zip", "rb") as fp:
         btn = st.download_button(
@@ -68,4 +42,35 @@ if submit_button:
             data=fp,
             file_name="output.zip",
             mime="application/zip"
-        )
\ No newline at end of file
+        )
+
+st.subheader('Download invoice PDFs from InvoiceXpress')
+st.caption('Fetches the finalized invoices straight from InvoiceXpress, already named by order number.')
+with st.form(key='export_form'):
+    today = datetime.date.today()
+    date_range = st.date_input('Invoice dates', value=(today - datetime.timedelta(days=7), today))
+    sequence = st.text_input('Sequence', value='LuxmiiSequence')
+    export_button = st.form_submit_button('Fetch PDFs')
+
+if export_button and len(date_range) == 2:
+    with span("pdf: invoicexpress export"):
+        with st.spinner('Listing invoices...'):
+            invoices = invoice_pdfs.list_invoices(date_range[0], date_range[1], sequence=sequence or None)
+            invoice_index.record_invoices(invoice_index.get_shared_connection(), invoices)
+        if not invoices:
+            st.warning('No finalized invoices in that range.')
+        else:
+            progress_bar = st.progress(0)
+            buffer = io.BytesIO()
+            written, failed = invoice_pdfs.export_zip(
+                invoices, buffer, progress=lambda done, total: progress_bar.progress(done / total)
+            )
+            st.write(','.join(name[:-4] for name in written))
+            if failed:
+                st.warning(f"{len(failed)} PDFs could not be fetched: " + ', '.join(str(i.get('sequence_number') or i['id']) for i, _ in failed))
+            st.download_button(
+                label="Download ZIP",
+                data=buffer.getvalue(),
+                file_name=f"invoices_{date_range[0]:%Y%m%d}_{date_range[1]:%Y%m%d}.zip",
+                mime="application/zip"
+            )
@@ -7,6 +7,9 @@ from requests.exceptions import RequestException
 import datetime
 from datetime import timezone
 import sys
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import urllib3
 import os
@@ -20,7 +23,12 @@ from requests.exceptions import RequestException
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 load_dotenv()
 API_KEY = os.getenv("shopify_key")
+SHOPIFY_API_BASE = os.getenv("SHOPIFY_API_BASE", "https://luxmii.com")
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import order_mirror
+import variant_prices
+from instrumentation import page_run, span
+page_run("Returns Portal")
 
 
 # Shopify API Headers
@@ -29,25 +37,44 @@ HEADERS = {
     'X-Shopify-Access-Token': API_KEY
 }
 
+# Local order mirror (webhook_receiver.py); only read while a sync or the receiver keeps it current
+mirror = order_mirror.get_shared_connection()
+# Without webhooks, ORDER_MIRROR_SYNC=1 keeps it current with an incremental sync every ORDER_SYNC_SECONDS
+order_mirror.start_periodic_sync(API_KEY)
+
+def mirror_ready():
+    return order_mirror.is_ready(mirror)
+
 def get_shopify_data(order_id, max_retries=3):
-    url = f"https://luxmii.com/admin/api/2024-10/orders/{order_id}.json"
+    use_mirror = mirror_ready() and str(order_id).isdigit()
+    if use_mirror:
+        order = order_mirror.get_order(mirror, int(order_id))
+        if order is not None:
+            return order
+    url = f"{SHOPIFY_API_BASE}/admin/api/2024-10/orders/{order_id}.json"
     for attempt in range(max_retries + 1):
         try:
             response = requests.get(url, headers=HEADERS, verify=False)
             response.raise_for_status()
-            return response.json()["order"]
+            order = response.json()["order"]
+            if use_mirror:
+                order_mirror.upsert_order(mirror, order)
+            return order
         except RequestException:
             if attempt == max_retries:
                 raise
             time.sleep(2 ** attempt)
 
 def get_item_status(order_id, max_retries=3):
-    url = f"https://luxmii.com/admin/api/2024-04/orders/{order_id}/fulfillment_orders.json"
+    url = f"{SHOPIFY_API_BASE}/admin/api/2024-04/orders/{order_id}/fulfillment_orders.json"
     for attempt in range(max_retries + 1):
         try:
-            response = requests.get(url, headers=HEADERS, verify=False)
-            response.raise_for_status()
-            fulfillment_orders = response.json()["fulfillment_orders"]
+            if mirror_ready():
+                fulfillment_orders = order_mirror.get_fulfillment_orders(mirror, int(order_id), API_KEY)
+            else:
+                response = requests.get(url, headers=HEADERS, verify=False)
+                response.raise_for_status()
+                fulfillment_orders = response.json()["fulfillment_orders"]
             status_map = {}
             for fo in fulfillment_orders:
                 for item in fo["line_items"]:
@@ -59,27 +86,74 @@ def get_item_status(order_id, max_retries=3):
             time.sleep(2 ** attempt)
 
 def get_order_count(customer_id):
-    url = f"https://luxmii.com/admin/api/2024-04/customers/{customer_id}.json"
-    response = requests.get(url, headers=HEADERS, verify=False)
-    response.raise_for_status()
-    return response.json()['customer']['orders_count']
-
-def get_variant_prices(variant_id):
-    url = f"https://luxmii.com/admin/api/2024-04/variants/{variant_id}.json"
-    try:
-        response = requests.get(url, headers=HEADERS, verify=False)
-        response.raise_for_status()
-        variant = response.json()["variant"]
-        price = float(variant.get("price", 0))
-        compare_at_price = float(variant["compare_at_price"]) if variant.get("compare_at_price") else 0
-        return price, compare_at_price
-    except Exception as e:
-        print(f"Error fetching variant {variant_id}: {e}")
-        return None, None
+    # Customer stats cache in the mirror (filled by the periodic sync); API only on a miss or expiry
+    return order_mirror.get_customer_stats(mirror, customer_id, API_KEY)['orders_count']
+
+def get_variant_prices(variant_ids):
+    """{variant_id: (price, compare_at_price)} in one batched, cached GraphQL lookup."""
+    return variant_prices.get_prices(variant_ids, API_KEY, base_url=SHOPIFY_API_BASE)
+
+# Details of the newest search results are loaded into the mirror's caches while the agent picks one
+PREFETCH_ORDERS = int(os.getenv("RETURNS_PREFETCH_ORDERS", "5"))
+
+@st.cache_resource
+def prefetch_store():
+    """Worker pool and the prefetches still running {order_id: future}, shared by every session of this page."""
+    return ThreadPoolExecutor(max_workers=4, thread_name_prefix="returns-prefetch"), {}, threading.Lock()
+
+def load_order_details(order_id):
+    """Order, fulfillment status map and customer order count; also warms the variant price cache."""
+    order = get_shopify_data(order_id)
+    status_map = get_item_status(order_id)
+    order_count = get_order_count(order['customer']['id'])
+    get_variant_prices([i.get('variant_id') for i in order['line_items'] if i['current_quantity'] > 0])
+    return order, status_map, order_count
+
+def warm_order(order):
+    # Newest-wins, so a search result never replaces a fresher copy from a webhook
+    order_mirror.upsert_order(mirror, order)
+    load_order_details(order['id'])
+
+def prefetch_order_details(orders, n=PREFETCH_ORDERS):
+    """
+    Start loading the n most recent search results into the mirror (order, fulfillment
+    orders, customer stats) and the variant price cache. Only with a live mirror: without
+    one there is nowhere to keep them, and each would be three extra Shopify calls.
+    """
+    if not mirror_ready():
+        return
+    pool, pending, lock = prefetch_store()
+    newest = sorted(orders, key=lambda o: o['created_at'], reverse=True)[:n]
+    with lock:
+        for key in [k for k, future in pending.items() if future.done()]:
+            del pending[key]
+        for o in newest:
+            if str(o['id']) not in pending:
+                pending[str(o['id'])] = pool.submit(contextvars.copy_context().run, warm_order, o)
+
+def get_order_details(order_id):
+    """Load an order's details, after any prefetch of it still running; prefetched parts come from the caches."""
+    _, pending, lock = prefetch_store()
+    with lock:
+        future = pending.get(str(order_id))
+    if future is not None:
+        try:
+            future.result()
+        except Exception as e:
+            print(f"Prefetch of order {order_id} failed, loading it again: {e}")
+    return load_order_details(order_id)
 
 def search_orders_by_email_or_name(query, field='email', max_retries=3):
-    assert field in ['email', 'name']
-    url = f"https://luxmii.com/admin/api/2024-10/orders.json?status=any&{field}={query}"
+    assert field in ['email', 'name', 'any']
+    if mirror_ready():
+        # Indexed prefix / substring / fuzzy match, so partial or misspelled input still finds the order
+        with span("returns: local order search", field=field):
+            orders = order_mirror.search_orders(mirror, query)
+        if orders or field == 'any':
+            return orders
+    if field == 'any':
+        raise Exception("Customer name / phone search needs the local order mirror (python order_mirror.py)")
+    url = f"{SHOPIFY_API_BASE}/admin/api/2024-10/orders.json?status=any&{field}={query}"
     headers = {
         'Content-Type': 'application/json',
         'X-Shopify-Access-Token': API_KEY
@@ -139,6 +213,8 @@ def process_order_items(order, statuses, order_count):
     results = []
     fulfillments = order.get("fulfillments", [])
     refunds = order.get("refunds", [])
+    # Current price vs compare-at for every variant in the order, in one call
+    prices = get_variant_prices([i.get('variant_id') for i in order['line_items'] if i['current_quantity'] > 0])
 
     for item in order['line_items']:
         # if  (item['fulfillment_status']!='fulfilled')&(item['current_quantity']>0):
@@ -227,6 +303,8 @@ def process_order_items(order, statuses, order_count):
 
             return_label = "RETURNED" if was_returned else eligibility_status
 
+            variant_price, compare_at_price = prices.get(item.get('variant_id'), (None, None))
+
             results.append({
                 "name": item["name"],
                 "sku": item["sku"],
@@ -244,7 +322,10 @@ def process_order_items(order, statuses, order_count):
                 "return_options": return_options,
                 "days_held": days_held,
                 "actual_paid":actual_paid,
-                "line_net":line_net
+                "line_net":line_net,
+                "variant_price": variant_price,
+                "compare_at_price": compare_at_price,
+                "variant_discount_pct": variant_prices.discount_pct(variant_price, compare_at_price),
             })
 
     return results
@@ -314,7 +395,7 @@ st.subheader("🔍 Order Search")
 
 col1, col2 = st.columns([1, 3])
 with col1:
-    search_method = st.selectbox("Search by", ["Order ID", "Email", "Order Name"])
+    search_method = st.selectbox("Search by", ["Order ID", "Email", "Order Name", "Customer name / phone"])
 with col2:
     query_input = st.text_input(
         f"Enter {search_method}", 
@@ -329,7 +410,7 @@ if query_input:
     if search_method == "Order ID":
         selected_order_id = query_input
     else:
-        field = 'email' if search_method == 'Email' else 'name'
+        field = {'Email': 'email', 'Order Name': 'name'}.get(search_method, 'any')
         try:
             with st.spinner("🔍 Searching orders..."):
                 orders = search_orders_by_email_or_name(query_input, field=field)
@@ -337,6 +418,7 @@ if query_input:
                 st.warning("🔍 No matching orders found.")
             else:
                 st.success(f"Found {len(orders)} matching orders")
+                prefetch_order_details(orders)
                 order_options = {
                     f"{o['name']} ({o['email']}) - {o['created_at'][:10]}": o['id']
                     for o in orders
@@ -349,11 +431,8 @@ if query_input:
 # Load and display order details
 if selected_order_id:
     try:
-        with st.spinner("📦 Loading order details..."):
-            order_data = get_shopify_data(selected_order_id)
-            status_map = get_item_status(selected_order_id)
-            customer_id = order_data['customer']['id']
-            order_count = get_order_count(customer_id)
+        with st.spinner("📦 Loading order details..."), span("returns: order lookup"):
+            order_data, status_map, order_count = get_order_details(selected_order_id)
             results = process_order_items(order=order_data, statuses=status_map, order_count=order_count)
 
             # Store order data in session state
@@ -427,6 +506,13 @@ if selected_order_id:
                         st.write("**💰 Discount:** None")
                     
                     # Show variant discount indicator (independent of order discounts)
+                    if item['variant_price'] is None:
+                        st.write("**🏷️ Variant Price:** Not available")
+                    elif item['variant_discount_pct'] > 0:
+                        st.write(f"**🏷️ Variant On Sale:** {item['variant_discount_pct']}% off "
+                                 f"(${item['variant_price']:.2f}, was ${item['compare_at_price']:.2f})")
+                    else:
+                        st.write(f"**🏷️ Variant Price:** ${item['variant_price']:.2f} (full price)")
 
                         # --- Column 2: Shipping info ---
                 with col2:
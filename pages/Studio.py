@@ -1,67 +1,31 @@
 # main.py
 
 import io
-from typing import List, Optional
+from typing import List
 
 import streamlit as st
 from PIL import Image
 
-from google import genai
-from google.genai import types
 from dotenv import load_dotenv
 load_dotenv()
-import zipfile
+import os
+import sys
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+import animation
+import bundle
+from instrumentation import page_run
+from generation import describe_inspiration_image, generate_image_with_inputs, get_gemini_client
 
 # -----------------------------------------------------------------------------
 # Helpers
 # -----------------------------------------------------------------------------
 
-@st.cache_resource
-def get_gemini_client():
-    """
-    Create a single Gemini client for the app.
-    Uses GEMINI_API_KEY from environment by default.
-    """
-    return genai.Client()
-
-
-def describe_inspiration_image(image_bytes: bytes, mime_type: str = "image/jpeg") -> str:
-    """
-    Use Gemini text model to describe the inspiration image.
-    Focus on background, lighting, and atmosphere ONLY - NOT clothing or model.
-    """
-    client = get_gemini_client()
-
-    img_part = types.Part.from_bytes(
-        data=image_bytes,
-        mime_type=mime_type,
-    )
-
-    stylist_prompt = (
-        "You are a fashion photography director analyzing the environment and mood of this image. "
-        "Describe ONLY the following elements:\n\n"
-        "1. BACKGROUND & SETTING: The physical environment, location, textures (e.g., concrete wall, studio, outdoor park, urban street)\n"
-        "2. LIGHTING: The type and quality of light (e.g., soft natural daylight, dramatic side lighting, golden hour, studio lighting)\n"
-        "3. MOOD & ATMOSPHERE: The overall feeling and vibe (e.g., minimalist, moody, elegant, energetic, serene)\n"
-        "4. COLOR PALETTE: Background colors and tones (e.g., cool grays, warm earth tones, vibrant neon)\n"
-        "5. COMPOSITION: Camera angle, framing, depth of field if relevant to the environment\n\n"
-        "CRITICAL: Do NOT describe the person, their clothing, outfit details, accessories, or what they're wearing. "
-        "Completely ignore all garments and fashion items. Focus ONLY on the photographic environment, "
-        "setting, lighting conditions, and aesthetic atmosphere.\n\n"
-        "Keep your description to 3-4 concise sentences suitable for an AI image generator."
-    )
-
-    resp = client.models.generate_content(
-        model="gemini-2.5-flash",
-        contents=[stylist_prompt, img_part],
-    )
-
-    return (resp.text or "").strip()
-
-
 def create_animated_gif(images: List[Image.Image], duration: int = 1000) -> bytes:
     """
-    Create a high-quality animated GIF from a list of PIL Images.
+    Create an animated GIF from a list of PIL Images.
+    Frames are resized to delivery size and share one adaptive palette;
+    the GIF and WebP are encoded together and cached (see animation.py).
     
     Args:
         images: List of PIL Image objects
@@ -73,54 +37,18 @@ def create_animated_gif(images: List[Image.Image], duration: int = 1000) -> byte
     if not images or len(images) == 0:
         return None
     
-    rgb_images = []
-    for img in images:
-        if img.mode != 'RGB':
-            rgb_images.append(img.convert('RGB'))
-        else:
-            rgb_images.append(img)
-    
-    gif_bytes = io.BytesIO()
-    
-    rgb_images[0].save(
-        gif_bytes,
-        format='GIF',
-        append_images=rgb_images[1:],
-        save_all=True,
-        duration=duration,
-        loop=0,
-        optimize=False,
-        disposal=2
-    )
-    
-    gif_bytes.seek(0)
-    return gif_bytes.getvalue()
+    return animation.read_animation(images, "gif", duration=duration)
 
 
 def create_animated_webp(images: List[Image.Image], duration: int = 1000) -> bytes:
     """
-    Create a high-quality animated WebP (much better than GIF).
-    WebP has no color limitations and supports lossless compression.
+    Create an animated WebP (much better than GIF).
+    Shares the cached export with create_animated_gif.
     """
     if not images or len(images) == 0:
         return None
     
-    webp_bytes = io.BytesIO()
-    
-    images[0].save(
-        webp_bytes,
-        format='WebP',
-        append_images=images[1:],
-        save_all=True,
-        duration=duration,
-        loop=0,
-        lossless=True,
-        quality=100,
-        method=6
-    )
-    
-    webp_bytes.seek(0)
-    return webp_bytes.getvalue()
+    return animation.read_animation(images, "webp", duration=duration)
 
 
 def create_zip_bundle(
@@ -130,113 +58,38 @@ def create_zip_bundle(
     backshot_image: Image.Image,
     movement_image: Image.Image,
     sideshot_image: Image.Image,
-    gif_data: bytes = None,
-    webp_data: bytes = None
-) -> bytes:
+    gif_data=None,
+    webp_data=None
+) -> str:
     """
     Create a zip file containing all generated images and animations.
+    Animations can be passed as bytes or as file paths.
     
     Returns:
-        bytes: Zip file as bytes for download
-    """
-    zip_buffer = io.BytesIO()
-    
-    with zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED) as zip_file:
-        if main_image:
-            img_buffer = io.BytesIO()
-            main_image.save(img_buffer, format='PNG')
-            zip_file.writestr('01_main_image.png', img_buffer.getvalue())
-        
-        if pose_image:
-            img_buffer = io.BytesIO()
-            pose_image.save(img_buffer, format='PNG')
-            zip_file.writestr('02_different_pose.png', img_buffer.getvalue())
-        
-        if closeup_image:
-            img_buffer = io.BytesIO()
-            closeup_image.save(img_buffer, format='PNG')
-            zip_file.writestr('03_closeup.png', img_buffer.getvalue())
-        
-        if backshot_image:
-            img_buffer = io.BytesIO()
-            backshot_image.save(img_buffer, format='PNG')
-            zip_file.writestr('04_backshot.png', img_buffer.getvalue())
-        
-        if movement_image:
-            img_buffer = io.BytesIO()
-            movement_image.save(img_buffer, format='PNG')
-            zip_file.writestr('05_movement.png', img_buffer.getvalue())
-        
-        if sideshot_image:
-            img_buffer = io.BytesIO()
-            sideshot_image.save(img_buffer, format='PNG')
-            zip_file.writestr('06_sideshot.png', img_buffer.getvalue())
-        
-        if gif_data:
-            zip_file.writestr('07_animation.gif', gif_data)
-        
-        if webp_data:
-            zip_file.writestr('08_animation.webp', webp_data)
-    
-    zip_buffer.seek(0)
-    return zip_buffer.getvalue()
-
-
-def generate_image_with_inputs(
-    prompt: str,
-    input_images: List,  # list of PIL Images or UploadedFiles
-    model_name: str = "gemini-3-pro-image-preview",
-) -> Optional[Image.Image]:
-    """
-    Generate an image using Nano Banana with text prompt + input images.
-    Returns a PIL Image or None.
+        str: Path of the (cached) zip file for download
     """
-    client = get_gemini_client()
-
-    contents: List = [prompt]
-
-    # Add all input images as Parts
-    for img_input in input_images:
-        if isinstance(img_input, Image.Image):
-            # Convert PIL Image to bytes
-            img_bytes_io = io.BytesIO()
-            img_input.save(img_bytes_io, format='PNG')
-            img_bytes = img_bytes_io.getvalue()
-            mime_type = "image/png"
-        else:
-            # Assume UploadedFile
-            img_bytes = img_input.getvalue()
-            mime_type = img_input.type or "image/jpeg"
-
-        contents.append(
-            types.Part.from_bytes(
-                data=img_bytes,
-                mime_type=mime_type,
-            )
-        )
-
-    resp = client.models.generate_content(
-        model=model_name,
-        contents=contents,
+    return bundle.build_image_bundle(
+        [
+            ('01_main_image', main_image),
+            ('02_different_pose', pose_image),
+            ('03_closeup', closeup_image),
+            ('04_backshot', backshot_image),
+            ('05_movement', movement_image),
+            ('06_sideshot', sideshot_image),
+        ],
+        extra_files=[
+            ('07_animation.gif', gif_data),
+            ('08_animation.webp', webp_data),
+        ]
     )
 
-    # Extract the first image from the response
-    for part in resp.parts:
-        if part.inline_data is not None:
-            image_bytes = part.inline_data.data
-            img = Image.open(io.BytesIO(image_bytes))
-            if img.format is None:
-                img.format = 'PNG'
-            return img
-
-    return None
-
 
 # -----------------------------------------------------------------------------
 # Streamlit UI
 # -----------------------------------------------------------------------------
 
 st.set_page_config(page_title="Nano Banana Outfit Stylist", layout="wide")
+page_run("Studio")
 st.title("👗 Nano Banana Fashion Generator")
 
 st.markdown(
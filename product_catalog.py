@@ -0,0 +1,231 @@
+import datetime
+import json
+import os
+import re
+import sqlite3
+import threading
+
+import requests
+
+# Local SQLite index over the Shopify catalog (id / title / SKU / variant)
+CATALOG_DB = os.path.join("cache", "shopify_catalog.db")
+# Legacy whole-catalog JSON dump, used once to seed an empty index
+LEGACY_CACHE_FILE = "shopify_products_cache.json"
+
+API_VERSION = "2023-10"
+
+_write_lock = threading.Lock()
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    id INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    updated_at TEXT,
+    images_json TEXT
+);
+CREATE TABLE IF NOT EXISTS variants (
+    id INTEGER PRIMARY KEY,
+    product_id INTEGER NOT NULL,
+    title TEXT,
+    sku TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_variants_product ON variants(product_id);
+CREATE INDEX IF NOT EXISTS idx_variants_sku ON variants(sku);
+CREATE INDEX IF NOT EXISTS idx_products_title ON products(title);
+CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+    product_id UNINDEXED, title, skus, variants, tokenize='unicode61'
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def get_connection(path=CATALOG_DB):
+    """
+    Open (and create if needed) the catalog index.
+    An empty index is seeded from the legacy JSON cache when it exists.
+    """
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(SCHEMA)
+
+    if count_products(conn) == 0 and os.path.exists(LEGACY_CACHE_FILE):
+        try:
+            with open(LEGACY_CACHE_FILE, 'r') as f:
+                upsert_products(conn, json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Could not import {LEGACY_CACHE_FILE}: {e}")
+    return conn
+
+
+def count_products(conn):
+    return conn.execute("SELECT COUNT(*) FROM products").fetchone()[0]
+
+
+def get_meta(conn, key, default=None):
+    row = conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def set_meta(conn, key, value):
+    with _write_lock, conn:
+        conn.execute(
+            "INSERT INTO meta(key, value) VALUES(?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+            (key, value),
+        )
+
+
+def upsert_products(conn, products):
+    """Insert or replace products (as returned by the Admin API) in the index."""
+    with _write_lock, conn:
+        for p in products:
+            variants = p.get('variants') or []
+            conn.execute(
+                "INSERT OR REPLACE INTO products(id, title, updated_at, images_json) VALUES(?, ?, ?, ?)",
+                (p['id'], p.get('title') or '', p.get('updated_at'), json.dumps(p.get('images') or [])),
+            )
+            conn.execute("DELETE FROM variants WHERE product_id = ?", (p['id'],))
+            conn.executemany(
+                "INSERT OR REPLACE INTO variants(id, product_id, title, sku) VALUES(?, ?, ?, ?)",
+                [(v['id'], p['id'], v.get('title'), v.get('sku')) for v in variants],
+            )
+            conn.execute("DELETE FROM products_fts WHERE product_id = ?", (p['id'],))
+            conn.execute(
+                "INSERT INTO products_fts(product_id, title, skus, variants) VALUES(?, ?, ?, ?)",
+                (
+                    p['id'],
+                    p.get('title') or '',
+                    ' '.join(v.get('sku') or '' for v in variants),
+                    ' '.join(v.get('title') or '' for v in variants),
+                ),
+            )
+    return len(products)
+
+
+def delete_missing_products(conn, keep_ids):
+    """Drop products that are no longer in the store (used after a full sync)."""
+    keep_ids = set(keep_ids)
+    stale = [r[0] for r in conn.execute("SELECT id FROM products") if r[0] not in keep_ids]
+    with _write_lock, conn:
+        for product_id in stale:
+            conn.execute("DELETE FROM products WHERE id = ?", (product_id,))
+            conn.execute("DELETE FROM variants WHERE product_id = ?", (product_id,))
+            conn.execute("DELETE FROM products_fts WHERE product_id = ?", (product_id,))
+    return len(stale)
+
+
+def _fts_query(text):
+    # Every token must match as a prefix, e.g. "agap blk" -> "agap"* "blk"*
+    tokens = re.findall(r"\w+", text.lower())
+    return ' '.join(f'"{t}"*' for t in tokens)
+
+
+def search_products(conn, query="", limit=50):
+    """
+    Typeahead search over title, SKU and variant title.
+    Returns a list of (id, title) tuples, at most `limit` long.
+    """
+    match = _fts_query(query or "")
+    if not match:
+        rows = conn.execute(
+            "SELECT id, title FROM products ORDER BY title LIMIT ?", (limit,)
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT p.id, p.title FROM products_fts f JOIN products p ON p.id = f.product_id "
+            "WHERE products_fts MATCH ? ORDER BY rank LIMIT ?",
+            (match, limit),
+        ).fetchall()
+    return [(r['id'], r['title']) for r in rows]
+
+
+def get_product(conn, product_id):
+    """Return {id, title, updated_at, variants} for a product, without its images."""
+    row = conn.execute(
+        "SELECT id, title, updated_at FROM products WHERE id = ?", (product_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    variants = conn.execute(
+        "SELECT id, title, sku FROM variants WHERE product_id = ? ORDER BY id", (product_id,)
+    ).fetchall()
+    return {
+        'id': row['id'],
+        'title': row['title'],
+        'updated_at': row['updated_at'],
+        'variants': [dict(v) for v in variants],
+    }
+
+
+def get_product_images(conn, product_id):
+    """Lazily load the image list of a single product."""
+    row = conn.execute("SELECT images_json FROM products WHERE id = ?", (product_id,)).fetchone()
+    if row is None or not row[0]:
+        return []
+    return json.loads(row[0])
+
+
+def find_product_by_sku(conn, sku):
+    row = conn.execute("SELECT product_id FROM variants WHERE sku = ?", (sku,)).fetchone()
+    return row[0] if row else None
+
+
+def fetch_products(shop_url, access_token, updated_at_min=None):
+    """
+    Generator over pages of products from the Shopify Admin API.
+    Pass `updated_at_min` to only fetch products changed since then.
+    """
+    # Plain http:// is kept for local stand-ins (see shopify_simulator.py)
+    scheme = "http" if shop_url.startswith("http://") else "https"
+    shop_url = shop_url.replace("https://", "").replace("http://", "").strip().rstrip('/')
+    url = f"{scheme}://{shop_url}/admin/api/{API_VERSION}/products.json"
+    headers = {
+        "X-Shopify-Access-Token": access_token,
+        "Content-Type": "application/json"
+    }
+    params = {
+        "limit": 250,
+        "fields": "id,title,images,variants,updated_at"
+    }
+    if updated_at_min:
+        params["updated_at_min"] = updated_at_min
+
+    while url:
+        response = requests.get(url, headers=headers, params=params)
+        response.raise_for_status()
+        yield response.json().get("products", [])
+
+        # Link header format: <https://...page_info=...>; rel="next"
+        link_header = response.headers.get('Link') or ''
+        next_link = next((l for l in link_header.split(',') if 'rel="next"' in l), None)
+        url = next_link.split(';')[0].strip('<> ') if next_link else None
+        params = {}  # already encoded in the next URL
+
+
+def refresh_catalog(conn, shop_url, access_token, full=False):
+    """
+    Sync the index with Shopify.
+    Incremental by default (only products updated since the last sync);
+    a full sync also removes products that no longer exist.
+    Returns the number of products written.
+    """
+    if not shop_url or not access_token:
+        raise ValueError("Missing Shopify credentials")
+
+    started_at = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds')
+    since = None if full else get_meta(conn, 'last_synced_at')
+
+    written = 0
+    seen_ids = []
+    for page in fetch_products(shop_url, access_token, updated_at_min=since):
+        written += upsert_products(conn, page)
+        seen_ids.extend(p['id'] for p in page)
+
+    if full:
+        delete_missing_products(conn, seen_ids)
+    set_meta(conn, 'last_synced_at', started_at)
+    return written
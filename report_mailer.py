@@ -0,0 +1,152 @@
+"""
+Emails the Atelier production report (tab1 / tab2) without touching disk.
+
+    mailer = report_mailer.ReportMailer()
+    future = mailer.send_report(df1, df2, ["atelier@luxmii.com"])
+
+The tables are rendered in memory: one XLSX workbook with a sheet per tab when
+openpyxl is installed, otherwise a CSV per tab. CSVs over COMPRESS_BYTES are
+zipped. Messages go out one at a time on the mailer's own thread, over one
+SMTP connection that is kept open between sends and reopened when the server
+has dropped it. send_report returns a Future that holds the recipients or the
+error, so the page never waits on the SMTP server.
+
+To try it locally, start a debugging server and point SMTP_HOST/SMTP_PORT at it:
+
+    python -m aiosmtpd -n -l localhost:1025
+    SMTP_HOST=localhost SMTP_PORT=1025 SMTP_SSL=0 python cli.py mail-report --to me@example.com
+"""
+import datetime
+import importlib.util
+import io
+import os
+import smtplib
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+
+import pandas as pd
+
+SMTP_HOST = os.getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+# Implicit TLS (Gmail's 465); with SMTP_SSL=0 the connection is upgraded with STARTTLS when the server offers it
+SMTP_SSL = os.getenv("SMTP_SSL", "1") == "1"
+SMTP_USER = os.getenv("SMTP_USER")
+SMTP_PASSWORD = os.getenv("SMTP_PASSWORD")
+# Comma separated; who gets the report when no recipients are given
+REPORT_RECIPIENTS = [r.strip() for r in os.getenv("REPORT_RECIPIENTS", "").split(",") if r.strip()]
+# CSV attachments larger than this are sent zipped (XLSX already is a ZIP)
+COMPRESS_BYTES = int(os.getenv("REPORT_COMPRESS_BYTES", str(1024 * 1024)))
+
+HAS_XLSX = importlib.util.find_spec("openpyxl") is not None
+
+XLSX_TYPE = ("application", "vnd.openxmlformats-officedocument.spreadsheetml.sheet")
+
+
+def render_attachments(tables, stem, xlsx=HAS_XLSX, compress_bytes=COMPRESS_BYTES):
+    """
+    tables is {sheet name: DataFrame}. Returns [(file name, bytes, (maintype, subtype))]:
+    one {stem}.xlsx, or one CSV per table ({stem}-{sheet}.csv, zipped when large).
+    """
+    if xlsx:
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+            for sheet, df in tables.items():
+                df.to_excel(writer, sheet_name=sheet[:31], index=False)
+        return [(f"{stem}.xlsx", buffer.getvalue(), XLSX_TYPE)]
+
+    attachments = []
+    for sheet, df in tables.items():
+        name = f"{stem}-{sheet.lower().replace(' ', '-')}.csv"
+        data = df.to_csv(index=False).encode("utf-8")
+        if len(data) > compress_bytes:
+            buffer = io.BytesIO()
+            with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr(name, data)
+            attachments.append((f"{name}.zip", buffer.getvalue(), ("application", "zip")))
+        else:
+            attachments.append((name, data, ("text", "csv")))
+    return attachments
+
+
+def build_message(subject, body, sender, recipients, attachments):
+    msg = EmailMessage()
+    msg["Subject"] = subject
+    msg["From"] = sender
+    msg["To"] = ", ".join(recipients)
+    msg.set_content(body)
+    for name, data, (maintype, subtype) in attachments:
+        msg.add_attachment(data, maintype=maintype, subtype=subtype, filename=name)
+    return msg
+
+
+class ReportMailer:
+    """One sending thread and one SMTP connection, reused for every message it sends."""
+
+    def __init__(self, host=SMTP_HOST, port=SMTP_PORT, use_ssl=SMTP_SSL, user=SMTP_USER, password=SMTP_PASSWORD,
+                 sender=None, timeout=30):
+        self.host, self.port, self.use_ssl = host, port, use_ssl
+        self.user, self.password, self.timeout = user, password, timeout
+        self.sender = sender or user or "reports@localhost"
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="report-mailer")
+        self.smtp = None
+        self.lock = threading.Lock()
+
+    def _connect(self):
+        if self.use_ssl:
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            smtp.ehlo()
+            if smtp.has_extn("starttls"):
+                smtp.starttls()
+                smtp.ehlo()
+        if self.user:
+            smtp.login(self.user, self.password)
+        return smtp
+
+    def _deliver(self, msg):
+        with self.lock:
+            if self.smtp is not None:
+                try:
+                    self.smtp.noop()
+                except (smtplib.SMTPException, OSError):
+                    # The server closed the connection while it sat idle
+                    self.smtp = None
+            if self.smtp is None:
+                self.smtp = self._connect()
+            try:
+                self.smtp.send_message(msg)
+            except smtplib.SMTPServerDisconnected:
+                self.smtp = self._connect()
+                self.smtp.send_message(msg)
+        print(f"Report sent to {msg['To']}")
+        return msg["To"]
+
+    def send(self, subject, body, recipients, attachments=()):
+        """Queue a message; returns a Future with the recipients, or the SMTP error."""
+        msg = build_message(subject, body, self.sender, recipients, attachments)
+        return self.pool.submit(self._deliver, msg)
+
+    def send_report(self, df1, df2, recipients=None, as_of=None):
+        """Queue the production report with tab1 / tab2 attached."""
+        recipients = recipients or REPORT_RECIPIENTS
+        if not recipients:
+            raise Exception("No recipients: pass some or set REPORT_RECIPIENTS")
+        as_of = as_of or datetime.datetime.now()
+        attachments = render_attachments({"All Data": df1, "Aggregated Items": df2}, f"production-report-{as_of:%Y-%m-%d}")
+        body = (f"Luxmii production report as of {as_of:%d %b %Y %H:%M}.\n\n"
+                f"{len(df1)} open order lines, {len(df2)} products, {int(df2['quantity'].sum())} pieces to make.")
+        return self.send(f"Production report {as_of:%d %b %Y}", body, recipients, attachments)
+
+    def close(self):
+        """Wait for queued messages, then close the connection."""
+        self.pool.shutdown(wait=True)
+        with self.lock:
+            if self.smtp is not None:
+                try:
+                    self.smtp.quit()
+                except (smtplib.SMTPException, OSError):
+                    pass
+                self.smtp = None
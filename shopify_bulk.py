@@ -0,0 +1,183 @@
+"""
+Shopify GraphQL Bulk Operations: run one export job instead of paging REST.
+
+    url = run_bulk_query(UNFULFILLED_ORDERS_QUERY, token)
+    for order in iter_bulk_objects(url):   # nested children re-attached to their parent
+        ...
+
+Only one bulk query can run per shop at a time; BulkOperationError is raised
+when Shopify refuses or the job fails, so callers can fall back to REST.
+"""
+import datetime
+import json
+import os
+import time
+import zoneinfo
+
+import requests
+
+API_VERSION = "2024-10"
+SHOPIFY_API_BASE = os.getenv("SHOPIFY_API_BASE", "https://luxmii.com")
+
+POLL_INTERVAL = 2.0
+POLL_TIMEOUT = 30 * 60
+
+# Open, not (fully) fulfilled orders, same selection as the REST
+# orders.json?fulfillment_status=unfulfilled call the inventory report used
+UNFULFILLED_ORDERS_QUERY = """
+{
+  orders(query: "status:open AND fulfillment_status:unfulfilled") {
+    edges {
+      node {
+        id
+        name
+        createdAt
+        lineItems {
+          edges {
+            node {
+              id
+              name
+              quantity
+              unfulfilledQuantity
+            }
+          }
+        }
+        fulfillmentOrders {
+          edges {
+            node {
+              id
+              assignedLocation { countryCode }
+              lineItems {
+                edges {
+                  node {
+                    id
+                    lineItem { id }
+                  }
+                }
+              }
+            }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+RUN_MUTATION = """
+mutation bulkOperationRunQuery($query: String!) {
+  bulkOperationRunQuery(query: $query) {
+    bulkOperation { id status }
+    userErrors { field message }
+  }
+}
+"""
+
+STATUS_QUERY = """
+query bulkOperation($id: ID!) {
+  node(id: $id) {
+    ... on BulkOperation { id status errorCode objectCount url partialDataUrl }
+  }
+}
+"""
+
+
+SHOP_TIMEZONE_QUERY = "{ shop { ianaTimezone } }"
+
+
+class BulkOperationError(Exception):
+    pass
+
+
+def legacy_id(gid):
+    """gid://shopify/Order/123 -> 123"""
+    return int(str(gid).rsplit("/", 1)[-1])
+
+
+def rest_timestamp(value, tz):
+    """GraphQL DateTime (UTC, '...Z') -> REST style shop-local time, e.g. 2024-01-06T04:34:00+10:00."""
+    moment = datetime.datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return moment.astimezone(tz).isoformat(timespec="seconds")
+
+
+def shop_timezone(access_token, base_url=None):
+    """The shop's time zone; REST returns timestamps in it, GraphQL in UTC."""
+    return zoneinfo.ZoneInfo(graphql(SHOP_TIMEZONE_QUERY, access_token, base_url=base_url)["shop"]["ianaTimezone"])
+
+
+def graphql(query, access_token, variables=None, base_url=None):
+    """POST a GraphQL query and return its `data`, raising on transport or GraphQL errors."""
+    url = f"{base_url or SHOPIFY_API_BASE}/admin/api/{API_VERSION}/graphql.json"
+    response = requests.post(
+        url,
+        json={"query": query, "variables": variables or {}},
+        headers={"X-Shopify-Access-Token": access_token, "Content-Type": "application/json"},
+    )
+    response.raise_for_status()
+    body = response.json()
+    if body.get("errors"):
+        raise BulkOperationError(f"GraphQL errors: {body['errors']}")
+    return body["data"]
+
+
+def run_bulk_query(query, access_token, base_url=None, poll_interval=POLL_INTERVAL, timeout=POLL_TIMEOUT):
+    """
+    Submit a bulk query and wait for it to finish.
+    Returns the URL of the JSONL result, or None when the query matched nothing.
+    """
+    data = graphql(RUN_MUTATION, access_token, {"query": query}, base_url)["bulkOperationRunQuery"]
+    if data["userErrors"]:
+        raise BulkOperationError("; ".join(e["message"] for e in data["userErrors"]))
+    operation_id = data["bulkOperation"]["id"]
+
+    deadline = time.monotonic() + timeout
+    while True:
+        operation = graphql(STATUS_QUERY, access_token, {"id": operation_id}, base_url)["node"]
+        status = operation["status"]
+        if status == "COMPLETED":
+            print(f"Bulk operation {operation_id}: {operation.get('objectCount')} objects")
+            return operation.get("url")
+        if status in ("FAILED", "CANCELED", "EXPIRED"):
+            raise BulkOperationError(f"Bulk operation {status.lower()}: {operation.get('errorCode')}")
+        if time.monotonic() > deadline:
+            raise BulkOperationError(f"Bulk operation still {status} after {timeout}s")
+        time.sleep(poll_interval)
+
+
+def iter_jsonl(url, chunk_size=1024 * 1024):
+    """Stream a JSONL result file, one parsed object per line."""
+    with requests.get(url, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines(chunk_size=chunk_size):
+            if line:
+                yield json.loads(line)
+
+
+def iter_bulk_objects(url):
+    """
+    Rebuild top-level objects from a bulk JSONL result.
+    Child lines (with __parentId) follow their parent; they are collected
+    under obj["children"][<type name>], and grandchildren the same way.
+    A top-level object is yielded as soon as the next one starts.
+    """
+    if not url:
+        return
+    current = None
+    by_id = {}
+    for obj in iter_jsonl(url):
+        parent_id = obj.pop("__parentId", None)
+        if parent_id is None:
+            if current is not None:
+                yield current
+            current = obj
+            by_id = {obj["id"]: obj}
+            continue
+        parent = by_id.get(parent_id)
+        if parent is None:
+            raise BulkOperationError(f"Child line before its parent {parent_id}")
+        kind = obj["id"].split("/")[3] if obj.get("id", "").startswith("gid://") else "Object"
+        parent.setdefault("children", {}).setdefault(kind, []).append(obj)
+        if obj.get("id"):
+            by_id[obj["id"]] = obj
+    if current is not None:
+        yield current
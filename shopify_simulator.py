@@ -0,0 +1,577 @@
+"""
+Local stand-in for the Shopify Admin API, for load and regression testing.
+
+    python shopify_simulator.py --orders 20000 --port 8800 --latency 0.05 --throttle-rate 0.02
+
+then run the app (or the benchmarks) with SHOPIFY_API_BASE=http://localhost:8800.
+
+Serves synthetic orders, fulfillment_orders, customers, variants and products
+with Link pagination, X-Shopify-Shop-Api-Call-Limit headers from a leaky
+bucket, and injectable latency and 429 responses. GraphQL supports bulk
+operations (bulkOperationRunQuery, polling, JSONL download) over orders and
+nodes(ids:) lookups of product variants. --export-csv writes the same orders
+as a Shopify orders export (Orders > Export) for the invoice upload pages.
+"""
+import argparse
+import base64
+import csv
+import datetime
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+COUNTRIES = [
+    ("Australia", "AU", "NSW"), ("United States", "US", "NY"), ("United Kingdom", "GB", None),
+    ("Germany", "DE", None), ("France", "FR", None), ("Canada", "CA", "ON"), ("Portugal", "PT", None),
+]
+FIRST_NAMES = ["Anna", "Chloe", "Sofia", "Maria", "Elena", "Grace", "Ivy", "Lena", "Mia", "Zoe"]
+LAST_NAMES = ["Smith", "Brown", "Papadopoulos", "Silva", "Martin", "Jones", "Taylor", "Muller"]
+GARMENTS = ["Maxi Dress", "Midi Skirt", "Linen Shirt", "Kaftan", "Top", "Trousers", "Blazer"]
+NAMES = ["Agapi", "Halvar", "Aris", "Agio", "Alarik", "Eleni", "Nefeli", "Thalia"]
+COLOURS = ["Black", "Natural Beige", "French Blue Stripe", "Khaki", "Navy", "White"]
+SIZES = ["XS", "S", "M", "L", "XL"]
+# Every fifth order outside AU is checked out in the customer's currency (Shopify Markets);
+# REST prices stay in the shop currency, presentment amounts and the CSV export don't
+LOCAL_CURRENCIES = {"US": ("USD", 0.66), "GB": ("GBP", 0.52), "DE": ("EUR", 0.61), "FR": ("EUR", 0.61),
+                    "CA": ("CAD", 0.90), "PT": ("EUR", 0.61)}
+
+
+# REST timestamps are in the shop's zone (fixed +10:00, as Australia/Brisbane); GraphQL ones in UTC
+SHOP_TIMEZONE = "Australia/Brisbane"
+
+
+def _iso(dt):
+    return dt.strftime("%Y-%m-%dT%H:%M:%S+10:00")
+
+
+def _utc(rest_timestamp):
+    moment = datetime.datetime.fromisoformat(rest_timestamp).astimezone(datetime.timezone.utc)
+    return moment.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+class SyntheticStore:
+    """Deterministic synthetic store data, generated up front from `seed`."""
+
+    def __init__(self, num_orders=2000, num_products=300, num_customers=None, seed=0):
+        rng = random.Random(seed)
+        self.products = {}
+        self.variants = {}
+        for p in range(num_products):
+            product_id = 7_000_000_000_000 + p
+            title = f"{rng.choice(NAMES)} {rng.choice(GARMENTS)} {rng.choice(COLOURS)}"
+            price = rng.choice([89, 129, 149, 189, 249, 329])
+            variants = []
+            for s, size in enumerate(SIZES):
+                variant = {
+                    "id": 40_000_000_000_000 + p * 10 + s,
+                    "product_id": product_id,
+                    "title": size,
+                    "sku": f"{title[:4].upper()}-{p:04d}-{size}",
+                    "price": f"{price * rng.choice([0.4, 0.7, 1.0]):.2f}",
+                    "compare_at_price": f"{price:.2f}" if rng.random() < 0.5 else None,
+                    "updated_at": _iso(datetime.datetime(2025, 1, 1) + datetime.timedelta(hours=p)),
+                }
+                variants.append(variant)
+                self.variants[variant["id"]] = variant
+            self.products[product_id] = {
+                "id": product_id,
+                "title": title,
+                "updated_at": _iso(datetime.datetime(2025, 1, 1) + datetime.timedelta(hours=p)),
+                "variants": variants,
+                "images": [
+                    {
+                        "id": 30_000_000_000_000 + p * 10 + i,
+                        "product_id": product_id,
+                        "position": i + 1,
+                        "src": f"https://cdn.shopify.com/s/files/sim/{product_id}_{i}.jpg?v=1",
+                        "updated_at": _iso(datetime.datetime(2025, 1, 1)),
+                        "width": 893, "height": 1341,
+                    }
+                    for i in range(rng.randint(1, 6))
+                ],
+            }
+
+        num_customers = num_customers or max(1, num_orders // 2)
+        self.customers = {}
+        for c in range(num_customers):
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            customer_id = 6_000_000_000_000 + c
+            self.customers[customer_id] = {
+                "id": customer_id,
+                "email": f"{first.lower()}.{last.lower()}{c}@example.com",
+                "first_name": first,
+                "last_name": last,
+                "phone": f"+614{c:08d}",
+                "orders_count": 0,
+                "created_at": _iso(datetime.datetime(2023, 1, 1)),
+                "updated_at": _iso(datetime.datetime(2023, 1, 1)),
+            }
+
+        self.orders = {}
+        self.fulfillment_orders = {}
+        customer_ids = list(self.customers)
+        variant_ids = list(self.variants)
+        start = datetime.datetime(2024, 1, 1)
+        for o in range(num_orders):
+            order_id = 5_000_000_000_000 + o
+            customer = self.customers[rng.choice(customer_ids)]
+            customer["orders_count"] += 1
+            country, country_code, province = rng.choice(COUNTRIES)
+            created = start + datetime.timedelta(minutes=37 * o)
+            customer["updated_at"] = _iso(created)
+            currency, fx = LOCAL_CURRENCIES.get(country_code, ("AUD", 1.0)) if o % 5 == 0 else ("AUD", 1.0)
+            line_items = []
+            for li in range(rng.randint(1, 4)):
+                variant = self.variants[rng.choice(variant_ids)]
+                product = self.products[variant["product_id"]]
+                quantity = rng.choice([1, 1, 1, 2])
+                discount = round(float(variant["price"]) * 0.1, 2) if rng.random() < 0.3 else 0
+                line_items.append({
+                    "id": 14_000_000_000_000 + o * 10 + li,
+                    "name": f"{product['title']} - {variant['title']}",
+                    "sku": variant["sku"],
+                    "variant_id": variant["id"],
+                    "product_id": product["id"],
+                    "quantity": quantity,
+                    "current_quantity": quantity,
+                    "price": variant["price"],
+                    "price_set": {"presentment_money": {"amount": f"{float(variant['price']) * fx:.2f}", "currency_code": currency}},
+                    "fulfillment_status": None,
+                    "properties": [{"name": "_Final", "value": "Final Sale"}] if rng.random() < 0.05 else [],
+                    "discount_allocations": [
+                        {"amount": f"{discount:.2f}",
+                         "amount_set": {"presentment_money": {"amount": f"{discount * fx:.2f}", "currency_code": currency}}}
+                    ] if discount else [],
+                })
+            fulfilled = rng.random() < 0.6
+            fulfillments = []
+            if fulfilled:
+                for item in line_items:
+                    item["fulfillment_status"] = "fulfilled"
+                fulfillments.append({
+                    "id": 4_000_000_000_000 + o,
+                    "shipment_status": rng.choice(["delivered", "in_transit", None]),
+                    "updated_at": _iso(created + datetime.timedelta(days=5)),
+                    "line_items": [{"id": i["id"]} for i in line_items],
+                })
+            address = {
+                "name": f"{customer['first_name']} {customer['last_name']}",
+                "address1": f"{rng.randint(1, 300)} Example St",
+                "address2": None,
+                "city": "Sydney" if country_code == "AU" else "Capital",
+                "zip": f"{rng.randint(1000, 9999)}",
+                "country": country,
+                "country_code": country_code,
+                "province_code": province,
+            }
+            total = sum(float(i["price"]) * i["quantity"] for i in line_items)
+            self.orders[order_id] = {
+                "id": order_id,
+                "name": f"#{10000 + o}",
+                "email": customer["email"],
+                "phone": customer["phone"],
+                "created_at": _iso(created),
+                "updated_at": _iso(created + datetime.timedelta(days=6 if fulfilled else 0)),
+                "fulfillment_status": "fulfilled" if fulfilled else None,
+                "currency": "AUD",
+                "presentment_currency": currency,
+                "tags": "",
+                "discount_codes": [{"code": "WELCOME10"}] if rng.random() < 0.1 else [],
+                "customer": {k: customer[k] for k in ("id", "email", "first_name", "last_name", "phone")},
+                "shipping_address": address,
+                "billing_address": address,
+                "total_price_set": {"presentment_money": {"amount": f"{total * fx:.2f}", "currency_code": currency}},
+                "line_items": line_items,
+                "fulfillments": fulfillments,
+                "refunds": [],
+            }
+            location = "AU" if rng.random() < 0.3 else "PT"
+            self.fulfillment_orders[order_id] = [{
+                "id": 3_000_000_000_000 + o,
+                "order_id": order_id,
+                "status": "closed" if fulfilled else "open",
+                "assigned_location": {"country_code": location},
+                "line_items": [{"line_item_id": i["id"], "quantity": i["quantity"]} for i in line_items],
+            }]
+
+
+def _gid(kind, legacy_id):
+    return f"gid://shopify/{kind}/{legacy_id}"
+
+
+def bulk_orders_jsonl(store, unfulfilled_only=True):
+    """Lines of a bulk export of orders with line items and fulfillment orders, like Shopify writes them."""
+    for order in sorted(store.orders.values(), key=lambda o: o["id"]):
+        if unfulfilled_only and order["fulfillment_status"] is not None:
+            continue
+        order_gid = _gid("Order", order["id"])
+        yield {"id": order_gid, "name": order["name"], "createdAt": _utc(order["created_at"])}
+        for item in order["line_items"]:
+            yield {
+                "id": _gid("LineItem", item["id"]),
+                "name": item["name"],
+                "quantity": item["quantity"],
+                "unfulfilledQuantity": 0 if item["fulfillment_status"] == "fulfilled" else item["quantity"],
+                "__parentId": order_gid,
+            }
+        for fulfillment_order in store.fulfillment_orders.get(order["id"], []):
+            fo_gid = _gid("FulfillmentOrder", fulfillment_order["id"])
+            yield {
+                "id": fo_gid,
+                "assignedLocation": {"countryCode": fulfillment_order["assigned_location"]["country_code"]},
+                "__parentId": order_gid,
+            }
+            for i, fo_item in enumerate(fulfillment_order["line_items"]):
+                yield {
+                    "id": _gid("FulfillmentOrderLineItem", fulfillment_order["id"] * 10 + i),
+                    "lineItem": {"id": _gid("LineItem", fo_item["line_item_id"])},
+                    "__parentId": fo_gid,
+                }
+
+
+def orders_export_rows(store):
+    """Rows of a Shopify orders CSV export: one per line item, order-level columns on the first row only."""
+    for order in sorted(store.orders.values(), key=lambda o: o["id"]):
+        address = order["shipping_address"]
+        for i, item in enumerate(order["line_items"]):
+            first = i == 0
+            # The export has the amounts the customer paid, in the currency they paid in
+            discount = sum(float(d["amount_set"]["presentment_money"]["amount"]) for d in item["discount_allocations"])
+            yield {
+                "Name": order["name"],
+                "Email": order["email"],
+                "Fulfillment Status": (order["fulfillment_status"] or "unfulfilled") if first else "",
+                "Refunded Amount": "0.00" if first else "",
+                "Created at": order["created_at"] if first else "",
+                "Currency": order["presentment_currency"] if first else "",
+                "Lineitem quantity": item["quantity"],
+                "Lineitem name": item["name"],
+                "Lineitem price": item["price_set"]["presentment_money"]["amount"],
+                "Lineitem sku": item["sku"],
+                "Lineitem fulfillment status": item["fulfillment_status"] or "pending",
+                "Shipping Name": address["name"] if first else "",
+                "Shipping Address1": address["address1"] if first else "",
+                "Shipping Address2": (address["address2"] or "") if first else "",
+                "Shipping City": address["city"] if first else "",
+                "Shipping Zip": f"'{address['zip']}" if first else "",
+                "Shipping Province": (address["province_code"] or "") if first else "",
+                "Shipping Country": address["country_code"] if first else "",
+                "Id": order["id"] if first else "",
+                "Lineitem discount": f"{discount:.2f}",
+            }
+
+
+class LeakyBucket:
+    """Shopify REST rate limit: `size` requests, leaking `leak_rate` per second."""
+
+    def __init__(self, size=40, leak_rate=2.0):
+        self.size = size
+        self.leak_rate = leak_rate
+        self.level = 0.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def take(self):
+        """Returns (allowed, level after the call)."""
+        with self.lock:
+            now = time.monotonic()
+            self.level = max(0.0, self.level - (now - self.updated) * self.leak_rate)
+            self.updated = now
+            if self.level + 1 > self.size:
+                return False, int(self.level)
+            self.level += 1
+            return True, int(self.level)
+
+
+class SimulatorHandler(BaseHTTPRequestHandler):
+    store = None
+    bucket = None
+    latency = 0.0
+    jitter = 0.0
+    throttle_rate = 0.0
+    error_rate = 0.0
+    bulk_delay = 2.0
+    bulk_operations = None
+    calls = 0
+    _random = random.Random(1)
+    _lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _admit(self):
+        """Latency, injected failures and the call-limit bucket. Returns headers or None if answered."""
+        cls = type(self)
+        with cls._lock:
+            cls.calls += 1
+            delay = max(0.0, cls.latency + cls._random.uniform(-cls.jitter, cls.jitter))
+            roll = cls._random.random()
+        time.sleep(delay)
+
+        allowed, level = cls.bucket.take()
+        limit_header = {"X-Shopify-Shop-Api-Call-Limit": f"{level}/{cls.bucket.size}"}
+        if not allowed or roll < cls.throttle_rate:
+            self._send_json(429, {"errors": "Exceeded 2 calls per second for api client. Reduce request rates to resume uninterrupted service."},
+                            {**limit_header, "Retry-After": "1.0"})
+            return None
+        if roll < cls.throttle_rate + cls.error_rate:
+            self._send_json(502, {"errors": "Bad Gateway"}, limit_header)
+            return None
+        return limit_header
+
+    def _page(self, items, query, path):
+        """Cursor pagination with Link headers, like Shopify's page_info."""
+        limit = min(int(query.get("limit", ["50"])[0]), 250)
+        offset = 0
+        if "page_info" in query:
+            offset = json.loads(base64.urlsafe_b64decode(query["page_info"][0]))["offset"]
+        page = items[offset:offset + limit]
+        headers = {}
+        if offset + limit < len(items):
+            cursor = base64.urlsafe_b64encode(json.dumps({"offset": offset + limit}).encode()).decode()
+            next_query = {k: v[0] for k, v in query.items() if k not in ("page_info",)}
+            next_query["page_info"] = cursor
+            host = self.headers.get("Host")
+            headers["Link"] = f'<http://{host}{path}?{urlencode(next_query)}>; rel="next"'
+        return page, headers
+
+    @staticmethod
+    def _fields(items, query):
+        if "fields" not in query:
+            return items
+        fields = query["fields"][0].split(",")
+        return [{k: item[k] for k in fields if k in item} for item in items]
+
+    def do_GET(self):
+        if m := re.fullmatch(r"/bulk/(\d+)\.jsonl", urlparse(self.path).path):
+            return self._send_bulk_file(int(m.group(1)))
+        headers = self._admit()
+        if headers is None:
+            return
+        parsed = urlparse(self.path)
+        query = parse_qs(parsed.query)
+        path = re.sub(r"^/admin/api/[\d-]+", "", parsed.path)
+        store = type(self).store
+
+        if m := re.fullmatch(r"/orders/(\d+)\.json", path):
+            order = store.orders.get(int(m.group(1)))
+            if order is None:
+                return self._send_json(404, {"errors": "Not Found"}, headers)
+            return self._send_json(200, {"order": order}, headers)
+
+        if m := re.fullmatch(r"/orders/(\d+)/fulfillment_orders\.json", path):
+            return self._send_json(200, {"fulfillment_orders": store.fulfillment_orders.get(int(m.group(1)), [])}, headers)
+
+        if path == "/orders.json":
+            orders = store.orders.values()
+            if "since_id" in query:
+                since_id = int(query["since_id"][0])
+                orders = [o for o in orders if o["id"] > since_id]
+            if query.get("fulfillment_status") == ["unfulfilled"]:
+                orders = [o for o in orders if o["fulfillment_status"] is None]
+            if "updated_at_min" in query:
+                orders = [o for o in orders if o["updated_at"] >= query["updated_at_min"][0]]
+            if "email" in query:
+                orders = [o for o in orders if o["email"] == query["email"][0]]
+            if "name" in query:
+                name = query["name"][0].lstrip("#")
+                orders = [o for o in orders if o["name"].lstrip("#") == name]
+            orders = sorted(orders, key=lambda o: o["id"])
+            page, link = self._page(orders, query, parsed.path)
+            return self._send_json(200, {"orders": self._fields(page, query)}, {**headers, **link})
+
+        if m := re.fullmatch(r"/customers/(\d+)\.json", path):
+            customer = store.customers.get(int(m.group(1)))
+            if customer is None:
+                return self._send_json(404, {"errors": "Not Found"}, headers)
+            return self._send_json(200, {"customer": customer}, headers)
+
+        if path == "/customers.json":
+            customers = sorted(store.customers.values(), key=lambda c: c["id"])
+            if "updated_at_min" in query:
+                customers = [c for c in customers if c["updated_at"] >= query["updated_at_min"][0]]
+            page, link = self._page(customers, query, parsed.path)
+            return self._send_json(200, {"customers": self._fields(page, query)}, {**headers, **link})
+
+        if m := re.fullmatch(r"/variants/(\d+)\.json", path):
+            variant = store.variants.get(int(m.group(1)))
+            if variant is None:
+                return self._send_json(404, {"errors": "Not Found"}, headers)
+            return self._send_json(200, {"variant": variant}, headers)
+
+        if path == "/products.json":
+            products = sorted(store.products.values(), key=lambda p: p["id"])
+            if "updated_at_min" in query:
+                products = [p for p in products if p["updated_at"] >= query["updated_at_min"][0]]
+            page, link = self._page(products, query, parsed.path)
+            return self._send_json(200, {"products": self._fields(page, query)}, {**headers, **link})
+
+        self._send_json(404, {"errors": "Not Found"}, headers)
+
+    def _bulk_operation(self, operation_id):
+        """Current state of a bulk operation as GraphQL would return it."""
+        cls = type(self)
+        with cls._lock:
+            operation = cls.bulk_operations.get(operation_id)
+            if operation is None:
+                return None
+            if operation["status"] == "RUNNING" and time.monotonic() - operation["started"] >= cls.bulk_delay:
+                operation["status"] = "COMPLETED"
+        number = operation_id.rsplit("/", 1)[-1]
+        done = operation["status"] == "COMPLETED"
+        return {
+            "id": operation_id,
+            "status": operation["status"],
+            "errorCode": None,
+            "objectCount": str(operation["objects"]) if done else "0",
+            "url": f"http://{self.headers.get('Host')}/bulk/{number}.jsonl" if done and operation["objects"] else None,
+            "partialDataUrl": None,
+        }
+
+    def do_POST(self):
+        headers = self._admit()
+        if headers is None:
+            return
+        path = re.sub(r"^/admin/api/[\d-]+", "", urlparse(self.path).path)
+        if path != "/graphql.json":
+            return self._send_json(404, {"errors": "Not Found"}, headers)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = json.loads(self.rfile.read(length) or b"{}")
+        query = body.get("query") or ""
+        variables = body.get("variables") or {}
+        cls = type(self)
+
+        if "bulkOperationRunQuery" in query:
+            with cls._lock:
+                running = [i for i, o in cls.bulk_operations.items() if o["status"] == "RUNNING"
+                           and time.monotonic() - o["started"] < cls.bulk_delay]
+                if running:
+                    return self._send_json(200, {"data": {"bulkOperationRunQuery": {
+                        "bulkOperation": None,
+                        "userErrors": [{"field": None, "message": f"A bulk query operation for this app and shop is already in progress: {running[0]}."}],
+                    }}}, headers)
+                operation_id = _gid("BulkOperation", 1000 + len(cls.bulk_operations))
+                unfulfilled_only = "fulfillment_status:unfulfilled" in variables.get("query", "")
+                cls.bulk_operations[operation_id] = {
+                    "status": "RUNNING",
+                    "started": time.monotonic(),
+                    "unfulfilled_only": unfulfilled_only,
+                    "objects": sum(1 for _ in bulk_orders_jsonl(cls.store, unfulfilled_only)),
+                }
+            return self._send_json(200, {"data": {"bulkOperationRunQuery": {
+                "bulkOperation": {"id": operation_id, "status": "CREATED"}, "userErrors": [],
+            }}}, headers)
+
+        if "BulkOperation" in query and "id" in variables:
+            return self._send_json(200, {"data": {"node": self._bulk_operation(variables["id"])}}, headers)
+
+        if "nodes(" in query:
+            nodes = []
+            for gid in variables.get("ids", []):
+                variant = cls.store.variants.get(int(gid.rsplit("/", 1)[-1])) if "/ProductVariant/" in gid else None
+                nodes.append(variant and {
+                    "id": gid, "price": variant["price"], "compareAtPrice": variant["compare_at_price"],
+                })
+            return self._send_json(200, {"data": {"nodes": nodes}}, headers)
+
+        if "ianaTimezone" in query:
+            return self._send_json(200, {"data": {"shop": {"ianaTimezone": SHOP_TIMEZONE}}}, headers)
+
+        if "currentBulkOperation" in query:
+            latest = max(cls.bulk_operations, default=None, key=lambda i: int(i.rsplit("/", 1)[-1]))
+            return self._send_json(200, {"data": {"currentBulkOperation": latest and self._bulk_operation(latest)}}, headers)
+
+        self._send_json(200, {"errors": [{"message": "Query not supported by the simulator"}]}, headers)
+
+    def _send_bulk_file(self, number):
+        """Stream a finished bulk export (served from cloud storage in the real thing)."""
+        operation = type(self).bulk_operations.get(_gid("BulkOperation", number))
+        if operation is None or operation["status"] != "COMPLETED":
+            return self._send_json(404, {"errors": "Not Found"})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/jsonl")
+        self.end_headers()
+        batch = []
+        for line in bulk_orders_jsonl(type(self).store, operation["unfulfilled_only"]):
+            batch.append(json.dumps(line))
+            if len(batch) >= 500:
+                self.wfile.write(("\n".join(batch) + "\n").encode())
+                batch = []
+        if batch:
+            self.wfile.write(("\n".join(batch) + "\n").encode())
+
+
+def make_server(store, port=8800, latency=0.0, jitter=0.0, throttle_rate=0.0, error_rate=0.0,
+                bucket_size=40, leak_rate=2.0, bulk_delay=2.0):
+    """Build a ThreadingHTTPServer serving `store`; call serve_forever() to run it."""
+    handler = type("Handler", (SimulatorHandler,), {
+        "store": store,
+        "bucket": LeakyBucket(bucket_size, leak_rate),
+        "latency": latency,
+        "jitter": jitter,
+        "throttle_rate": throttle_rate,
+        "error_rate": error_rate,
+        "bulk_delay": bulk_delay,
+        "bulk_operations": {},
+        "calls": 0,
+        "_lock": threading.Lock(),
+    })
+    return ThreadingHTTPServer(("127.0.0.1", port), handler)
+
+
+def start_in_background(store, **kwargs):
+    """Start a simulator on a daemon thread; returns (server, base_url)."""
+    server = make_server(store, **kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8800)
+    parser.add_argument("--orders", type=int, default=2000)
+    parser.add_argument("--products", type=int, default=300)
+    parser.add_argument("--customers", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every response")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Fraction of calls answered with 429")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of calls answered with 502")
+    parser.add_argument("--bucket-size", type=int, default=40)
+    parser.add_argument("--leak-rate", type=float, default=2.0)
+    parser.add_argument("--bulk-delay", type=float, default=2.0, help="Seconds a bulk operation stays RUNNING")
+    parser.add_argument("--export-csv", help="Also write the orders as a Shopify orders export to this path")
+    args = parser.parse_args()
+
+    store = SyntheticStore(args.orders, args.products, args.customers, args.seed)
+    if args.export_csv:
+        rows = list(orders_export_rows(store))
+        with open(args.export_csv, "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+            writer.writeheader()
+            writer.writerows(rows)
+        print(f"Wrote {len(rows)} export rows to {args.export_csv}")
+    server = make_server(
+        store, args.port, args.latency, args.jitter, args.throttle_rate, args.error_rate,
+        args.bucket_size, args.leak_rate, args.bulk_delay,
+    )
+    print(f"Shopify simulator with {len(store.orders)} orders on http://127.0.0.1:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
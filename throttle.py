@@ -0,0 +1,23 @@
+import threading
+import time
+
+
+class RateLimiter:
+    """
+    Spread calls evenly so that at most `rate` start per `per` seconds.
+    Safe to share between worker threads.
+    """
+
+    def __init__(self, rate, per=60.0):
+        self.interval = per / rate if rate else 0.0
+        self._next_at = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until the caller may make its next call."""
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_at - now
+            self._next_at = max(now, self._next_at) + self.interval
+        if wait > 0:
+            time.sleep(wait)
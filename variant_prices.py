@@ -0,0 +1,82 @@
+"""
+Variant price / compare-at price lookups, batched and cached.
+
+    prices = get_prices([variant_id, ...], token)   # {variant_id: (price, compare_at_price)}
+
+Uncached ids are resolved with one GraphQL `nodes(ids:)` query per 250 ids
+instead of one /variants/{id}.json call each. Results are kept in-process for
+VARIANT_PRICE_TTL seconds, so re-opening an order or running a returns report
+over many orders doesn't repeat the lookups.
+"""
+import os
+import threading
+import time
+
+import requests
+
+import shopify_bulk
+
+VARIANT_PRICE_TTL = int(os.getenv("VARIANT_PRICE_TTL", "900"))
+BATCH_SIZE = 250  # most ids nodes() accepts per query
+
+NODES_QUERY = """
+query variantPrices($ids: [ID!]!) {
+  nodes(ids: $ids) {
+    ... on ProductVariant { id price compareAtPrice }
+  }
+}
+"""
+
+_cache = {}  # variant id -> (fetched at, price, compare_at_price)
+_lock = threading.Lock()
+
+
+def _fetch(variant_ids, access_token, base_url=None, max_retries=3):
+    """{variant_id: (price, compare_at_price)} for one batch; deleted variants come back as (None, None)."""
+    ids = [f"gid://shopify/ProductVariant/{v}" for v in variant_ids]
+    for attempt in range(max_retries + 1):
+        try:
+            nodes = shopify_bulk.graphql(NODES_QUERY, access_token, {"ids": ids}, base_url)["nodes"]
+            break
+        except requests.exceptions.RequestException:
+            if attempt == max_retries:
+                raise
+            time.sleep(2 ** attempt)
+    prices = {v: (None, None) for v in variant_ids}
+    for node in nodes:
+        if node and node.get("id"):
+            compare_at = float(node["compareAtPrice"]) if node.get("compareAtPrice") else 0
+            prices[shopify_bulk.legacy_id(node["id"])] = (float(node["price"]), compare_at)
+    return prices
+
+
+def get_prices(variant_ids, access_token, base_url=None, ttl=VARIANT_PRICE_TTL):
+    """
+    (price, compare_at_price) per variant id; compare_at_price is 0 when the variant isn't on sale.
+    Lookups that fail are printed and returned as (None, None), like the single-variant call was.
+    """
+    now = time.time()
+    wanted = list(dict.fromkeys(int(v) for v in variant_ids if v))
+    with _lock:
+        result = {v: _cache[v][1:] for v in wanted if v in _cache and now - _cache[v][0] < ttl}
+    missing = [v for v in wanted if v not in result]
+    for i in range(0, len(missing), BATCH_SIZE):
+        batch = missing[i:i + BATCH_SIZE]
+        try:
+            fetched = _fetch(batch, access_token, base_url)
+        except (requests.exceptions.RequestException, shopify_bulk.BulkOperationError) as e:
+            print(f"Error fetching prices for {len(batch)} variants: {e}")
+            result.update({v: (None, None) for v in batch})
+            continue
+        with _lock:
+            for v, (price, compare_at) in fetched.items():
+                _cache[v] = (now, price, compare_at)
+        result.update(fetched)
+    return result
+
+
+def discount_pct(price, compare_at_price):
+    """How far the variant is marked down from its compare-at price, in whole percent (0 if not on sale)."""
+    if not price or not compare_at_price or compare_at_price <= price:
+        return 0
+    return round(100 * (compare_at_price - price) / compare_at_price)
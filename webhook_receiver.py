@@ -0,0 +1,152 @@
+"""
+Shopify webhook receiver that keeps the local order mirror current.
+
+    python webhook_receiver.py --port 8790            # serve POST /webhooks
+    python webhook_receiver.py --register https://<public address>/webhooks
+
+Handles orders/create, orders/updated, fulfillments/create and refunds/create.
+Every delivery is checked against SHOPIFY_WEBHOOK_SECRET (X-Shopify-Hmac-Sha256),
+de-duplicated on X-Shopify-Webhook-Id once applied; failures get a 500 so Shopify retries.
+Shopify only calls public HTTPS addresses, so put this behind a tunnel or proxy.
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+from dotenv import load_dotenv
+
+import order_mirror
+
+load_dotenv()
+
+WEBHOOK_SECRET = os.getenv("SHOPIFY_WEBHOOK_SECRET")
+TOPICS = ["orders/create", "orders/updated", "fulfillments/create", "refunds/create"]
+
+
+def verify_hmac(body, header_hmac, secret=None):
+    """Shopify signs the raw body with the app secret: base64(HMAC-SHA256)."""
+    secret = secret or WEBHOOK_SECRET
+    if not secret or not header_hmac:
+        return False
+    digest = base64.b64encode(hmac.new(secret.encode(), body, hashlib.sha256).digest()).decode()
+    return hmac.compare_digest(digest, header_hmac)
+
+
+def handle_event(conn, topic, payload):
+    """Apply one webhook payload to the mirror. Returns True if something was stored."""
+    if topic in ("orders/create", "orders/updated"):
+        return order_mirror.upsert_order(conn, payload)
+    if topic == "fulfillments/create":
+        return order_mirror.apply_fulfillment(conn, payload)
+    if topic == "refunds/create":
+        return order_mirror.apply_refund(conn, payload)
+    print(f"Ignoring webhook topic {topic}")
+    return False
+
+
+class WebhookHandler(BaseHTTPRequestHandler):
+    conn = None
+    secret = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status):
+        self.send_response(status)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def do_POST(self):
+        if self.path.split("?")[0].rstrip("/") != "/webhooks":
+            return self._reply(404)
+        body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        if not verify_hmac(body, self.headers.get("X-Shopify-Hmac-Sha256"), self.secret):
+            return self._reply(401)
+
+        topic = self.headers.get("X-Shopify-Topic")
+        webhook_id = self.headers.get("X-Shopify-Webhook-Id")
+        conn = type(self).conn
+        # Shopify retries deliveries it thinks failed; skip ones already applied
+        if webhook_id and order_mirror.webhook_seen(conn, webhook_id):
+            return self._reply(200)
+        try:
+            handle_event(conn, topic, json.loads(body))
+        except Exception as e:
+            # Not recorded as seen, and a 500 makes Shopify deliver it again
+            print(f"Failed {topic} webhook {webhook_id}: {e}")
+            return self._reply(500)
+        if webhook_id:
+            order_mirror.mark_webhook_seen(conn, webhook_id, topic)
+        self._reply(200)
+
+
+def _heartbeat_loop(conn):
+    # Lets pages know the mirror is being kept current (see order_mirror.is_ready)
+    while True:
+        order_mirror.heartbeat(conn)
+        time.sleep(order_mirror.SYNC_INTERVAL)
+
+
+def start_heartbeat(conn):
+    threading.Thread(target=_heartbeat_loop, args=(conn,), daemon=True).start()
+
+
+def make_server(conn, port=8790, secret=None):
+    handler = type("Handler", (WebhookHandler,), {"conn": conn, "secret": secret or WEBHOOK_SECRET})
+    return ThreadingHTTPServer(("0.0.0.0", port), handler)
+
+
+def start_in_background(conn, port=0, secret=None):
+    """Start the receiver on a daemon thread; returns (server, url of the /webhooks endpoint)."""
+    server = make_server(conn, port, secret)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    start_heartbeat(conn)
+    return server, f"http://127.0.0.1:{server.server_address[1]}/webhooks"
+
+
+def register_webhooks(address, access_token, base_url=None):
+    """Subscribe `address` to the mirrored topics (existing subscriptions are left alone)."""
+    url = f"{base_url or order_mirror.SHOPIFY_API_BASE}/admin/api/{order_mirror.API_VERSION}/webhooks.json"
+    headers = {"X-Shopify-Access-Token": access_token, "Content-Type": "application/json"}
+    for topic in TOPICS:
+        response = requests.post(url, headers=headers, json={"webhook": {"topic": topic, "address": address, "format": "json"}})
+        if response.status_code == 422:
+            print(f"{topic}: already registered")
+        else:
+            response.raise_for_status()
+            print(f"{topic}: registered")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=int(os.getenv("WEBHOOK_PORT", "8790")))
+    parser.add_argument("--register", metavar="ADDRESS", help="Register the webhook topics for ADDRESS and exit")
+    parser.add_argument("--no-backfill", action="store_true", help="Skip the catch-up backfill on start")
+    args = parser.parse_args()
+
+    token = os.getenv("shopify_key")
+    if args.register:
+        register_webhooks(args.register, token)
+        return
+    if not WEBHOOK_SECRET:
+        raise Exception("SHOPIFY_WEBHOOK_SECRET is not set")
+
+    conn = order_mirror.get_connection()
+    if not args.no_backfill:
+        # Catch up on anything delivered while we were down
+        print(f"Backfilled {order_mirror.backfill(conn, token)} orders")
+    server = make_server(conn, args.port)
+    start_heartbeat(conn)
+    print(f"Webhook receiver on port {args.port}, {order_mirror.count_orders(conn)} orders mirrored")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()